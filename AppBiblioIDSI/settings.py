@@ -42,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'app.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -78,9 +79,47 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        # Connexion conservée entre les requêtes (secondes), vérifiée avant réutilisation
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # BEGIN IMMEDIATE : le verrou d'écriture est pris au début de la
+            # transaction, une lecture ne peut plus échouer en devenant écriture
+            'transaction_mode': 'IMMEDIATE',
+            # Attente maximale d'un verrou (secondes) avant « database is locked »
+            'timeout': 20,
+        },
+    },
+    # Instantané lu par l'historique et les exports
+    # (voir app/reporting.py) ; peut être remplacé par un réplica PostgreSQL.
+    'reporting': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'reporting.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    },
 }
 
+DATABASE_ROUTERS = ['app.reporting.ReportingRouter']
+
+REPORTING_DATABASE = 'reporting'
+
+# « python manage.py refresh_reporting_snapshot --loop » : un instantané toutes
+# les REPORTING_SNAPSHOT_INTERVAL secondes. Au-delà de REPORTING_MAX_STALENESS,
+# les vues de reporting relisent la base principale.
+
+REPORTING_SNAPSHOT_INTERVAL = 300
+
+REPORTING_MAX_STALENESS = 3600
+
+# PRAGMA exécutés à l'ouverture de chaque connexion SQLite : valeurs dans
+# app/db.py (DEFAULT_SQLITE_PRAGMAS), SQLITE_PRAGMAS = {...} en remplace
+# certaines (None en désactive une). L'attente d'un verrou est réglée par
+# OPTIONS['timeout'] ci-dessus, pas par un PRAGMA busy_timeout.
+# Le mode WAL modifie le fichier de la base : il n'est activé que par le
+# déploiement, avec SQLITE_PRAGMAS = {"journal_mode": "wal", "synchronous": "normal"}.
+# « python manage.py sqlite_load_test » compare WAL et ces réglages aux valeurs par défaut.
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -124,6 +163,121 @@ STATICFILES_DIRS = [
 
 STATIC_ROOT = BASE_DIR / "staticfiles"  # pour collectstatic en production
 
+# Tâches en arrière-plan (imports / exports)
+# Si True, les vues d'import / export créent une tâche exécutée par
+# « python manage.py run_jobs » au lieu de travailler pendant la requête.
+
+BACKGROUND_JOBS = False
+
+JOBS_ROOT = BASE_DIR / "jobs"  # fichiers déposés et exports générés
+
+JOBS_WORKERS = 2
+
+# Listes paginées par curseur (historique, emprunts, étudiants) : au-delà de
+# cette limite le total affiché est « plus de N » (None : total exact).
+
+PAGINATION_COUNT_LIMIT = 10000
+
+# Journal d'activités : écrit par lots sur un thread (books.activity).
+# False : chaque entrée est écrite immédiatement (tests, scripts).
+
+ACTIVITY_LOG_ASYNC = True
+
+ACTIVITY_LOG_BATCH_SIZE = 100
+
+ACTIVITY_LOG_FLUSH_MS = 500
+
+# Cache des fragments de gabarits (tableau de bord, catégories...).
+# Fichiers : partagé par tous les processus WSGI, l'invalidation par signal
+# (books/fragments.py) les atteint tous. LocMemCache suffit avec un seul processus.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+    }
+}
+
+FRAGMENT_CACHE_TIMEOUT = 600
+
+# Base SQLite des commandes seed_bench et benchmark (books/bench.py) :
+# jamais la base de l'application.
+
+BENCH_DATABASE = BASE_DIR / "bench.sqlite3"
+
+# Les tests ne partagent pas de métriques entre processus (METRICS_DIR = None)
+
+TEST_RUNNER = "AppBiblioIDSI.test_runner.TestRunner"
+
+# Métriques Prometheus (app/metrics.py), exposées sur /metrics.
+# Chaque processus (workers WSGI, run_jobs) écrit ses compteurs dans
+# METRICS_DIR au plus toutes les METRICS_FLUSH_SECONDS secondes ; ce dossier
+# doit être local et partagé par tous les processus de l'application.
+# Les totaux des processus arrêtés y sont regroupés dans arretes.json.
+# None : pas de fichier, /metrics ne montre que le processus qui répond.
+
+METRICS_DIR = BASE_DIR / "metrics"
+
+METRICS_FLUSH_SECONDS = 5
+
+# Accès à /metrics : utilisateurs staff, ou collecteur envoyant l'en-tête
+# « Authorization: Bearer <METRICS_TOKEN> » (aucun jeton : staff seulement).
+# METRICS_ALLOWED_IPS n'est sûr que si l'application reçoit directement les
+# connexions : derrière un proxy inverse, toutes les requêtes viennent de
+# l'adresse du proxy.
+
+METRICS_TOKEN = None
+
+METRICS_ALLOWED_IPS = []
+
+# Profilage des requêtes (app/profiling.py) : temps, requêtes SQL répétées,
+# rendu des gabarits. Consultable sur /profiling/ (staff) ou avec
+# « python manage.py profiling_report ». PROFILING_SAMPLE_RATE : fraction des
+# requêtes exécutées sous cProfile (profils dans PROFILING_DIR).
+# PROFILING_TEMPLATE_SAMPLE_RATE : fraction des requêtes dont le rendu des
+# gabarits est chronométré (Template._render remplacé le temps de la requête).
+
+PROFILING = False
+
+PROFILING_BUFFER_SIZE = 500
+
+PROFILING_SAMPLE_RATE = 0.0
+
+PROFILING_TEMPLATE_SAMPLE_RATE = 0.1
+
+PROFILING_DIR = BASE_DIR / "profiles"
+
+PROFILING_LOG_FILE = BASE_DIR / "profiling.log"
+
+if PROFILING:
+    # En premier : les requêtes de session et d'authentification sont comptées
+    MIDDLEWARE.insert(0, "app.profiling.ProfilingMiddleware")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "json": {"format": "%(message)s"},  # une ligne JSON par requête
+    },
+    "handlers": {
+        "profiling": {
+            "class": "logging.handlers.RotatingFileHandler",
+            "filename": PROFILING_LOG_FILE,
+            "maxBytes": 10 * 1024 * 1024,
+            "backupCount": 3,
+            "formatter": "json",
+            "delay": True,  # fichier créé à la première requête profilée
+        },
+    },
+    "loggers": {
+        "app.profiling": {
+            "handlers": ["profiling"],
+            "level": "INFO",
+            "propagate": False,
+        },
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
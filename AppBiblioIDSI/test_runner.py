@@ -0,0 +1,16 @@
+"""
+Lanceur de tests du projet (TEST_RUNNER).
+"""
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """DiscoverRunner qui n'écrit aucun fichier de métriques dans BASE_DIR."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        # Non restauré au démontage : l'écriture atexit de app.metrics a lieu
+        # après la fin des tests. Les tests multiprocessus passent un dossier
+        # temporaire avec override_settings.
+        settings.METRICS_DIR = None
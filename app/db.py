@@ -0,0 +1,51 @@
+"""
+Réglages SQLite appliqués à chaque nouvelle connexion (signal connection_created).
+
+    mmap_size             lecture du fichier par mmap (octets)
+    cache_size            cache de pages par connexion (négatif : en Kio)
+    temp_store            tables temporaires (tris, GROUP BY) en mémoire
+
+settings.SQLITE_PRAGMAS remplace certaines valeurs ; None désactive une ligne.
+
+Le mode WAL (WAL_PRAGMAS) n'est pas appliqué par défaut : c'est une propriété
+du fichier, pas de la connexion. La moindre commande manage.py réécrirait
+l'en-tête de db.sqlite3 et laisserait des fichiers -wal et -shm à côté.
+Le déploiement l'active avec SQLITE_PRAGMAS = {"journal_mode": "wal",
+"synchronous": "normal"}.
+
+    journal_mode=WAL      les lectures ne bloquent plus les écritures (et inversement)
+    synchronous=NORMAL    un fsync par checkpoint au lieu d'un par transaction (sûr en WAL)
+L'attente d'un verrou n'est pas un PRAGMA : c'est DATABASES[...]['OPTIONS']['timeout']
+(gestionnaire d'attente installé par sqlite3.connect), qu'un PRAGMA busy_timeout
+écraserait.
+"""
+from django.conf import settings
+
+DEFAULT_SQLITE_PRAGMAS = {
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -20000,
+    "temp_store": "memory",
+}
+
+
+WAL_PRAGMAS = {
+    "journal_mode": "wal",
+    "synchronous": "normal",
+}
+
+
+def sqlite_pragmas():
+    return {**DEFAULT_SQLITE_PRAGMAS, **getattr(settings, "SQLITE_PRAGMAS", {})}
+
+
+def apply_pragmas(cursor, pragmas):
+    for name, value in pragmas.items():
+        if value is not None:
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, sqlite_pragmas())
@@ -0,0 +1,349 @@
+import csv
+import re
+import zipfile
+import zlib
+from datetime import datetime, timedelta
+from itertools import chain
+from xml.sax.saxutils import escape
+
+from openpyxl.utils import get_column_letter
+
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from . import metrics
+from books.models import ActivityLog, ActivityLogArchive, ArchiveRun, Etudiant, Livre
+
+# Nombre de lignes lues par aller-retour avec la base
+EXPORT_CHUNK_SIZE = 2000
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Octets compressés accumulés avant d'envoyer un morceau du classeur
+XLSX_CHUNK_BYTES = 64 * 1024
+
+# ⚠️ Les noms DOIVENT correspondre à l'import
+BOOK_HEADERS = [
+    "isbn",
+    "titre",
+    "langue",
+    "quantite",
+    "nbre_pages",
+    "annee_publication",
+    "emplacement",
+    "resume",
+    "editeur",
+    "auteur",
+    "categorie",
+]
+
+USER_HEADERS = [
+    "matricule",
+    "nom",
+    "prenoms",
+    "email",
+    "telephone",
+    "ecole",
+    "dateNaiss",
+    "actif",
+]
+
+HISTORY_HEADERS = [
+    "Date", "Action", "Titre", "Description", "Utilisateur", "Effectué par"
+]
+
+
+def book_rows():
+    livres = Livre.objects.select_related(
+        "editeur", "auteur", "categorie"
+    ).order_by("id")
+
+    for livre in livres.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [
+            livre.isbn,
+            livre.titre,
+            livre.langue,
+            livre.quantite,
+            livre.nbre_pages,
+            livre.annee_publication or "",
+            livre.emplacement or "",
+            livre.resume or "",
+            livre.editeur.nom,
+            livre.auteur.nom_complet,
+            livre.categorie.nom,
+        ]
+
+
+def user_rows():
+    users = Etudiant.objects.select_related("ecole").order_by("matricule")
+
+    for u in users.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [
+            u.matricule,
+            u.nom,
+            u.prenoms,
+            u.emailInst,
+            u.telephone,
+            u.ecole.nom if u.ecole else "",
+            u.dateNaiss.strftime("%Y-%m-%d") if u.dateNaiss else "",
+            "Oui" if u.is_active else "Non",
+        ]
+
+
+def day_start(value):
+    """« 2025-01-31 » -> début de journée (datetime aware), None si invalide"""
+    try:
+        day = parse_date(value)
+    except ValueError:
+        return None
+    if day is None:
+        return None
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def history_queryset(search="", action_type="", date_from="", date_to="", archived=False):
+    """Journal d'activités filtré comme sur la page Historique (archive si archived)."""
+    activities = (ActivityLogArchive if archived else ActivityLog).objects.all()
+
+    if search:
+        activities = activities.filter(
+            Q(title__icontains=search) |
+            Q(description__icontains=search) |
+            Q(user__icontains=search)
+        )
+
+    if action_type:
+        activities = activities.filter(action_type=action_type)
+
+    # Bornes en datetime (et non timestamp__date) pour utiliser l'index sur timestamp
+    if date_from and (start := day_start(date_from)):
+        activities = activities.filter(timestamp__gte=start)
+
+    if date_to and (end := day_start(date_to)):
+        activities = activities.filter(timestamp__lt=end + timedelta(days=1))
+
+    return activities
+
+
+def history_archive(date_from="", **filters):
+    """
+    (archive filtrée, borne) à fusionner avec l'historique, ou (None, None)
+    si rien n'a été archivé ou si la période demandée commence après.
+    """
+    before = ArchiveRun.archived_before(ActivityLogArchive)
+    if before is None:
+        return None, None
+    before = day_start(before.isoformat())
+    if date_from and (start := day_start(date_from)) and start >= before:
+        return None, None
+    return history_queryset(date_from=date_from, archived=True, **filters), before
+
+
+def history_rows(**filters):
+    # Tuples plutôt qu'instances, nom de l'utilisateur lu par jointure
+    archive, _ = history_archive(**filters)
+    # Toutes les lignes archivées sont plus anciennes : l'archive suit simplement
+    for activities in (history_queryset(**filters), archive):
+        if activities is None:
+            continue
+        activities = activities.order_by("-timestamp", "-id").values_list(
+            "timestamp", "action_type", "title", "description", "user", "performed_by__username"
+        )
+
+        for timestamp, action_type, title, description, user, username in activities.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            yield [
+                timestamp.strftime("%d/%m/%Y %H:%M"),
+                action_type,
+                title,
+                description,
+                user,
+                username or "",
+            ]
+
+
+def with_progress(rows, progress=None, every=EXPORT_CHUNK_SIZE):
+    """Appelle progress(nombre de lignes) toutes les « every » lignes."""
+    count = 0
+    for count, row in enumerate(rows, start=1):
+        if progress and count % every == 0:
+            progress(count)
+        yield row
+    if progress:
+        progress(count)
+
+
+class Echo:
+    """Pseudo-buffer : write() renvoie la ligne au lieu de la stocker."""
+
+    def write(self, value):
+        return value
+
+
+def gzipped(lines):
+    """Compresse au fil de l'eau (format gzip) un flux de lignes texte."""
+    compressor = zlib.compressobj(wbits=31)  # 16 + 15 : en-tête gzip
+    for line in lines:
+        chunk = compressor.compress(line.encode("utf-8"))
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+
+def stream_csv(filename, headers, rows, compress=False):
+    """
+    Réponse CSV produite ligne par ligne : la mémoire reste constante
+    et le premier octet part avant la fin de la lecture en base.
+    Avec compress=True, le flux est un fichier .csv.gz.
+    """
+    writer = csv.writer(Echo())
+
+    def lines():
+        yield writer.writerow(headers)
+        for row in rows:
+            yield writer.writerow(row)
+
+    timed = metrics.timed_iter(
+        gzipped(lines()) if compress else lines(),
+        "library_export_duration_seconds",
+        export=filename.rsplit(".", 1)[0],
+        format="csv.gz" if compress else "csv",
+    )
+    if compress:
+        response = StreamingHttpResponse(timed, content_type="application/gzip")
+        filename += ".gz"
+    else:
+        response = StreamingHttpResponse(timed, content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def write_csv(fileobj, headers, rows):
+    """Écrit un CSV dans un fichier texte déjà ouvert."""
+    writer = csv.writer(fileobj)
+    writer.writerow(headers)
+    writer.writerows(rows)
+
+
+# Parties fixes d'un classeur à une feuille (OOXML minimal, lu par Excel,
+# LibreOffice et openpyxl)
+_XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{title}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+# Caractères de contrôle interdits en XML (openpyxl les refuse aussi)
+_ILLEGAL_XML = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _cell(ref, value):
+    if value is None or value == "":
+        return ""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c r="{ref}"><v>{value}</v></c>'
+    text = escape(_ILLEGAL_XML.sub("", str(value)))
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+class _Pipe:
+    """Fichier en écriture seule, sans seek : ZipFile y écrit, xlsx_chunks le vide."""
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        self.size = 0
+        return data
+
+
+def xlsx_chunks(title, headers, rows):
+    """
+    Classeur XLSX produit au fil de l'eau : la feuille est écrite ligne par
+    ligne (chaînes en ligne, sans table partagée) dans une archive zip sur
+    flux non positionnable, envoyée par morceaux d'environ XLSX_CHUNK_BYTES.
+    """
+    pipe = _Pipe()
+    with zipfile.ZipFile(pipe, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_PARTS.items():
+            archive.writestr(name, content)
+        archive.writestr("xl/workbook.xml", _WORKBOOK.format(title=escape(title[:31], {'"': "&quot;"})))
+
+        columns = [get_column_letter(i) for i in range(1, len(headers) + 1)]
+        with archive.open("xl/worksheets/sheet1.xml", "w") as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            for line_no, row in enumerate(chain([headers], rows), start=1):
+                cells = "".join(_cell(f"{column}{line_no}", value) for column, value in zip(columns, row))
+                sheet.write(f'<row r="{line_no}">{cells}</row>'.encode("utf-8"))
+                if pipe.size >= XLSX_CHUNK_BYTES:
+                    yield pipe.drain()
+            sheet.write(b"</sheetData></worksheet>")
+    yield pipe.drain()
+
+
+def write_xlsx(path, title, headers, rows):
+    """Même classeur que stream_xlsx, écrit dans un fichier (exports en tâche de fond)."""
+    with open(path, "wb") as f:
+        for chunk in xlsx_chunks(title, headers, rows):
+            f.write(chunk)
+
+
+def stream_xlsx(filename, title, headers, rows):
+    """
+    Réponse XLSX diffusée pendant la lecture en base (xlsx_chunks) : le
+    premier octet part tout de suite et la mémoire reste constante.
+    """
+    timed = metrics.timed_iter(
+        xlsx_chunks(title, headers, rows),
+        "library_export_duration_seconds",
+        export=filename.rsplit(".", 1)[0],
+        format="xlsx",
+    )
+    response = StreamingHttpResponse(timed, content_type=XLSX_CONTENT_TYPE)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,387 @@
+from datetime import date, datetime
+from itertools import islice
+
+import openpyxl
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.text import slugify
+
+from . import metrics
+from books import activity, autocomplete, fragments, search
+from books.models import Auteur, Categorie, Ecole, Editeur, Etudiant, Livre
+
+# Nombre de lignes écrites par requête bulk_create / bulk_update
+IMPORT_BATCH_SIZE = getattr(settings, "IMPORT_BATCH_SIZE", 1000)
+
+BOOK_REQUIRED_COLS = {
+    "isbn",
+    "titre",
+    "langue",
+    "quantite",
+    "nbre_pages",
+    "editeur",
+    "auteur",
+    "categorie",
+}
+
+BOOK_UPDATE_FIELDS = [
+    "titre",
+    "langue",
+    "quantite",
+    "nbre_pages",
+    "annee_publication",
+    "emplacement",
+    "resume",
+    "editeur",
+    "auteur",
+    "categorie",
+]
+
+STUDENT_COLS = {
+    "matricule",
+    "nom",
+    "prenoms",
+    "email",
+    "telephone",
+    "ecole",
+    "dateNaiss",
+    "actif",
+}
+
+STUDENT_UPDATE_FIELDS = [
+    "nom",
+    "prenoms",
+    "emailInst",
+    "telephone",
+    "ecole",
+    "dateNaiss",
+    "is_active",
+]
+
+
+class ImportResult:
+    """Bilan d'un import : compteurs et erreurs ligne par ligne."""
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.errors = []  # [(numéro de ligne, message), ...]
+        self.committed = False
+
+    def add_error(self, line_no, message):
+        self.errors.append((line_no, message))
+
+    def error_summary(self, limit=10):
+        lines = [f"Ligne {line_no} : {message}" for line_no, message in self.errors[:limit]]
+        if len(self.errors) > limit:
+            lines.append(f"... et {len(self.errors) - limit} autre(s) erreur(s)")
+        return lines
+
+
+def read_sheet(excel_file):
+    """
+    Ouvre la feuille active en lecture seule (lignes lues au fil de l'eau).
+    Retourne les en-têtes et un itérateur (numéro de ligne, ligne).
+    """
+    wb = openpyxl.load_workbook(excel_file, read_only=True, data_only=True)
+    rows = wb.active.iter_rows(values_only=True)
+
+    first = next(rows, None)
+    if first is None:
+        raise ValueError("Le fichier est vide.")
+    headers = [str(h).strip() if h else "" for h in first]
+
+    def data_rows():
+        for line_no, row in enumerate(rows, start=2):
+            # Ignorer les lignes entièrement vides
+            if any(cell not in (None, "") for cell in row):
+                yield line_no, row
+
+    return headers, data_rows()
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _text(value):
+    return str(value).strip() if value is not None else ""
+
+
+def _date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(_text(value), "%Y-%m-%d").date()
+
+
+def _existing_matricules(matricules, batch_size):
+    """Matricules déjà en base, lus par lots (limite de paramètres SQLite)."""
+    existing = set()
+    for batch in batched(matricules, batch_size):
+        existing.update(Etudiant.objects.filter(matricule__in=batch).values_list("matricule", flat=True))
+    return existing
+
+
+def _unique_slug(nom, slugs):
+    base = slugify(nom) or "categorie"
+    slug, n = base, 2
+    while slug in slugs:
+        slug, n = f"{base}-{n}", n + 1
+    slugs.add(slug)
+    return slug
+
+
+@metrics.timed("library_import_duration_seconds", kind="books")
+def import_books(excel_file, batch_size=IMPORT_BATCH_SIZE, progress=None, performed_by=None):
+    """
+    Importe (ou met à jour par ISBN) les livres d'un fichier Excel.
+
+    Tout le fichier est d'abord lu et validé, hors transaction ; progress(n)
+    est appelé après chaque lot de batch_size lignes lues. Une ligne
+    invalide est signalée dans le bilan sans interrompre l'import, de même
+    qu'une mise à jour dont la quantité est inférieure aux exemplaires en
+    prêt. Éditeurs, auteurs, catégories et livres sont ensuite écrits en une
+    seule transaction (requêtes groupées par lots) : si l'écriture échoue,
+    rien n'est appliqué. L'historique reçoit une seule entrée pour tout
+    l'import.
+    """
+    headers, rows = read_sheet(excel_file)
+
+    missing = BOOK_REQUIRED_COLS - set(headers)
+    if missing:
+        raise ValueError(f"Colonnes manquantes : {', '.join(sorted(missing))}")
+
+    col = {name: index for index, name in enumerate(headers) if name}
+
+    def cell(row, name):
+        index = col.get(name)
+        if index is None or index >= len(row):
+            return None
+        return row[index]
+
+    result = ImportResult()
+
+    # Lecture et validation, hors transaction : aucun verrou n'est pris
+    parsed = []
+    for batch in batched(rows, batch_size):
+        for line_no, row in batch:
+            try:
+                isbn = _text(cell(row, "isbn"))
+                titre = _text(cell(row, "titre"))
+                editeur = _text(cell(row, "editeur"))
+                auteur = _text(cell(row, "auteur"))
+                categorie = _text(cell(row, "categorie"))
+                if not all([isbn, titre, editeur, auteur, categorie]):
+                    raise ValueError("isbn, titre, editeur, auteur et categorie sont obligatoires")
+
+                annee = cell(row, "annee_publication")
+                parsed.append((line_no, {
+                    "isbn": isbn,
+                    "titre": titre,
+                    "langue": _text(cell(row, "langue")),
+                    "quantite": int(cell(row, "quantite")),
+                    "nbre_pages": int(cell(row, "nbre_pages")),
+                    "annee_publication": int(annee) if annee not in (None, "") else None,
+                    "emplacement": _text(cell(row, "emplacement")),
+                    "resume": _text(cell(row, "resume")),
+                }, editeur, auteur, categorie))
+            except (TypeError, ValueError) as e:
+                result.add_error(line_no, e)
+
+        if progress:
+            progress(batch[-1][0] - 1)
+
+    # Écriture en une transaction : un import interrompu n'est jamais appliqué à moitié
+    with transaction.atomic():
+        # Une requête par table pour initialiser les correspondances nom -> id
+        livres = {
+            isbn: (pk, copies_out)
+            for isbn, pk, copies_out in Livre.objects.values_list("isbn", "id", "copies_out")
+        }
+
+        # Une quantité inférieure aux exemplaires en prêt rendrait la disponibilité négative
+        valid = []
+        for line_no, values, editeur, auteur, categorie in parsed:
+            copies_out = livres.get(values["isbn"], (None, 0))[1]
+            if values["quantite"] < copies_out:
+                result.add_error(
+                    line_no, f"quantité {values['quantite']} inférieure aux {copies_out} exemplaire(s) en prêt"
+                )
+            else:
+                valid.append((line_no, values, editeur, auteur, categorie))
+
+        editeurs = dict(Editeur.objects.values_list("nom", "id"))
+        auteurs = dict(Auteur.objects.values_list("nom_complet", "id"))
+        categories = dict(Categorie.objects.values_list("nom", "id"))
+        slugs = set(Categorie.objects.values_list("slug_url", flat=True))
+
+        # Création groupée des entités inconnues
+        new_editeurs = {e for _, _, e, _, _ in valid if e not in editeurs}
+        created = Editeur.objects.bulk_create([Editeur(nom=nom) for nom in new_editeurs], batch_size=batch_size)
+        for obj in created:
+            editeurs[obj.nom] = obj.id
+        if created:
+            autocomplete.editeurs.invalidate()
+
+        new_auteurs = {a for _, _, _, a, _ in valid if a not in auteurs}
+        created = Auteur.objects.bulk_create([Auteur(nom_complet=nom) for nom in new_auteurs], batch_size=batch_size)
+        for obj in created:
+            auteurs[obj.nom_complet] = obj.id
+        if created:
+            autocomplete.auteurs.invalidate()
+
+        new_categories = {c for _, _, _, _, c in valid if c not in categories}
+        for obj in Categorie.objects.bulk_create([
+            Categorie(nom=nom, is_active=True, slug_url=_unique_slug(nom, slugs))
+            for nom in new_categories
+        ], batch_size=batch_size):
+            categories[obj.nom] = obj.id
+
+        # Livres : création ou mise à jour selon l'ISBN
+        to_create = {}
+        to_update = {}
+        for line_no, values, editeur, auteur, categorie in valid:
+            livre = Livre(
+                editeur_id=editeurs[editeur],
+                auteur_id=auteurs[auteur],
+                categorie_id=categories[categorie],
+                **values,
+            )
+            if values["isbn"] in livres:
+                livre.id = livres[values["isbn"]][0]
+                to_update[livre.isbn] = livre
+            else:
+                # Un ISBN répété dans le fichier : la dernière ligne l'emporte
+                to_create[livre.isbn] = livre
+
+        Livre.objects.bulk_create(to_create.values(), batch_size=batch_size)
+        Livre.objects.bulk_update(to_update.values(), BOOK_UPDATE_FIELDS, batch_size=batch_size)
+
+        # bulk_create / bulk_update n'émettent pas de signaux
+        search.index_livres(
+            [livre.id for livre in to_create.values()] +
+            [livre.id for livre in to_update.values()]
+        )
+
+        result.created = len(to_create)
+        result.updated = len(to_update)
+        result.committed = True
+        fragments.invalidate_on_commit(Livre, Categorie)
+
+    activity.log(
+        action_type="add_book",
+        title="Import de livres",
+        description=(
+            f"{result.created} livre(s) ajouté(s), {result.updated} mis à jour, "
+            f"{len(result.errors)} ligne(s) ignorée(s)"
+        ),
+        performed_by=performed_by,
+    )
+
+    metrics.inc("library_imports_total", kind="books")
+    return result
+
+
+@metrics.timed("library_import_duration_seconds", kind="students")
+def import_students(excel_file, batch_size=IMPORT_BATCH_SIZE, dry_run=False, progress=None, performed_by=None):
+    """
+    Importe (ou met à jour par matricule) les étudiants d'un fichier Excel.
+
+    Toutes les lignes sont d'abord lues et validées, sans rien écrire ; si
+    une seule est invalide, ou en mode dry_run, rien n'est écrit et le bilan
+    liste chaque erreur. Sinon, écoles et étudiants sont écrits en une seule
+    transaction, par lots avec bulk_create(update_conflicts=True). Le bilan
+    distingue les étudiants créés des étudiants mis à jour (matricule déjà
+    en base).
+    """
+    headers, rows = read_sheet(excel_file)
+
+    missing = STUDENT_COLS - set(headers)
+    if missing:
+        raise ValueError(f"Colonnes manquantes : {', '.join(sorted(missing))}")
+
+    col = {name: index for index, name in enumerate(headers) if name}
+    result = ImportResult()
+
+    # Lecture et validation de tout le fichier, hors transaction : progress
+    # est visible des autres connexions et aucun verrou n'est pris
+    etudiants = {}
+    ecole_noms = {}
+    for batch in batched(rows, batch_size):
+        for line_no, row in batch:
+            values = {name: row[index] if index < len(row) else None for name, index in col.items()}
+            try:
+                matricule = _text(values["matricule"])
+                if not matricule or len(matricule) > 12:
+                    raise ValueError("matricule manquant ou trop long (12 caractères max)")
+                if not _text(values["nom"]) or not _text(values["prenoms"]):
+                    raise ValueError("nom et prénoms sont obligatoires")
+                if not _text(values["ecole"]):
+                    raise ValueError("école manquante")
+                if not values["dateNaiss"]:
+                    raise ValueError("date de naissance manquante")
+                try:
+                    date_naiss = _date(values["dateNaiss"])
+                except ValueError:
+                    raise ValueError("date de naissance invalide (format AAAA-MM-JJ)")
+            except ValueError as e:
+                result.add_error(line_no, e)
+                continue
+
+            # Un matricule répété dans le fichier : la dernière ligne l'emporte
+            etudiants[matricule] = Etudiant(
+                matricule=matricule,
+                nom=_text(values["nom"]),
+                prenoms=_text(values["prenoms"]),
+                emailInst=_text(values["email"]),
+                telephone=_text(values["telephone"]),
+                dateNaiss=date_naiss,
+                is_active=values["actif"] == "Oui",
+            )
+            ecole_noms[matricule] = _text(values["ecole"])
+
+        if progress:
+            progress(batch[-1][0] - 1)
+
+    # Rien n'est écrit dès qu'une erreur a été rencontrée
+    if result.errors or dry_run:
+        result.updated = len(_existing_matricules(etudiants, batch_size))
+        result.created = len(etudiants) - result.updated
+        return result
+
+    # Écriture seule, en une transaction : le verrou n'est tenu que le temps des INSERT
+    ecoles = dict(Ecole.objects.values_list("nom", "id"))
+    with transaction.atomic():
+        # Compté dans la transaction : l'upsert ne dit pas quelles lignes existaient
+        result.updated = len(_existing_matricules(etudiants, batch_size))
+        result.created = len(etudiants) - result.updated
+
+        new_ecoles = set(ecole_noms.values()) - ecoles.keys()
+        for obj in Ecole.objects.bulk_create([Ecole(nom=nom) for nom in new_ecoles]):
+            ecoles[obj.nom] = obj.id
+        for matricule, etudiant in etudiants.items():
+            etudiant.ecole_id = ecoles[ecole_noms[matricule]]
+
+        Etudiant.objects.bulk_create(
+            etudiants.values(),
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["matricule"],
+            update_fields=STUDENT_UPDATE_FIELDS,
+        )
+        result.committed = True
+        fragments.invalidate_on_commit(Etudiant)
+        transaction.on_commit(lambda: metrics.inc("library_imports_total", kind="students"))
+        activity.log(
+            action_type="add_user",
+            title="Import d'étudiants",
+            description=f"{result.created} étudiant(s) ajouté(s), {result.updated} mis à jour",
+            performed_by=performed_by,
+        )
+
+    return result
@@ -0,0 +1,147 @@
+import logging
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from . import metrics
+from .exports import (
+    BOOK_HEADERS, HISTORY_HEADERS, USER_HEADERS,
+    book_rows, history_rows, user_rows, with_progress, write_csv, write_xlsx,
+)
+from .imports import import_books, import_students
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Dossier local des fichiers déposés et des exports générés
+JOBS_ROOT = Path(getattr(settings, "JOBS_ROOT", settings.BASE_DIR / "jobs"))
+
+
+def _job_path(folder, filename):
+    path = JOBS_ROOT / folder
+    path.mkdir(parents=True, exist_ok=True)
+    return path / f"{uuid.uuid4().hex}_{Path(filename).name}"
+
+
+def enqueue(kind, user=None, upload=None, **params):
+    """
+    Enregistre une tâche « pending » ; le fichier éventuellement déposé
+    est copié sur disque pour être relu par le worker.
+    """
+    input_file = ""
+    if upload is not None:
+        path = _job_path("uploads", upload.name)
+        with open(path, "wb") as f:
+            for chunk in upload.chunks():
+                f.write(chunk)
+        input_file = str(path)
+
+    return Job.objects.create(
+        kind=kind,
+        created_by=user if user and user.is_authenticated else None,
+        input_file=input_file,
+        params=params,
+    )
+
+
+# --- Traitements ---
+
+def _import_books(job, progress):
+    result = import_books(job.input_file, progress=progress, performed_by=job.created_by)
+    lines = [f"{result.created} ajouté(s), {result.updated} mis à jour."]
+    if result.errors:
+        lines.append(f"{len(result.errors)} ligne(s) ignorée(s) :")
+        lines += result.error_summary(limit=100)
+    return "", "\n".join(lines)
+
+
+def _import_students(job, progress):
+    result = import_students(
+        job.input_file,
+        dry_run=job.params.get("dry_run", False),
+        progress=progress,
+        performed_by=job.created_by,
+    )
+    if result.errors:
+        lines = [f"Import annulé, {len(result.errors)} ligne(s) invalide(s) :"]
+        lines += result.error_summary(limit=100)
+        raise ValueError("\n".join(lines))
+    if not result.committed:
+        return "", f"Vérification réussie : {result.created} à ajouter, {result.updated} à mettre à jour."
+    return "", f"{result.created} étudiant(s) ajouté(s), {result.updated} mis à jour."
+
+
+def _export(filename, title, headers, rows):
+    def run(job, progress):
+        path = _job_path("exports", filename)
+        # Les paramètres de la tâche sont les filtres de l'export
+        rows_ = with_progress(rows(**job.params), progress)
+        start = time.perf_counter()
+        if path.suffix == ".csv":
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                write_csv(f, headers, rows_)
+        else:
+            write_xlsx(path, title, headers, rows_)
+        metrics.observe(
+            "library_export_duration_seconds", time.perf_counter() - start,
+            export=path.stem.split("_", 1)[-1], format=path.suffix[1:],
+        )
+        return str(path), ""
+    return run
+
+
+HANDLERS = {
+    "import_books": _import_books,
+    "import_students": _import_students,
+    "export_books": _export("livres.xlsx", "Livres", BOOK_HEADERS, book_rows),
+    "export_users": _export("utilisateurs.xlsx", "Utilisateurs", USER_HEADERS, user_rows),
+    "export_history": _export("historique.csv", "Historique", HISTORY_HEADERS, history_rows),
+}
+
+
+def visible_jobs(user):
+    """Tâches que user peut suivre et télécharger : les siennes, toutes pour le staff."""
+    jobs = Job.objects.all()
+    return jobs if user.is_staff else jobs.filter(created_by=user)
+
+
+# --- Exécution ---
+
+def claim_next():
+    """Passe la plus ancienne tâche « pending » à « running » (une seule fois)."""
+    for pk in Job.objects.filter(status="pending").order_by("created_at").values_list("pk", flat=True)[:5]:
+        claimed = Job.objects.filter(pk=pk, status="pending").update(
+            status="running", started_at=timezone.now()
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def run_job(job):
+    def progress(count):
+        Job.objects.filter(pk=job.pk).update(progress=count)
+
+    close_old_connections()
+    try:
+        result_file, message = HANDLERS[job.kind](job, progress)
+        job.status = "done"
+        job.result_file = result_file
+        job.message = message
+    except Exception as e:
+        logger.exception("Échec de la tâche %s", job.pk)
+        job.status = "failed"
+        job.message = str(e)
+    finally:
+        job.finished_at = timezone.now()
+        job.save(update_fields=["status", "result_file", "message", "finished_at"])
+        close_old_connections()
+    # Le fichier déposé n'est plus utile une fois traité ; gardé après un
+    # échec pour être examiné ou relancé
+    if job.status == "done" and job.input_file:
+        Path(job.input_file).unlink(missing_ok=True)
+    return job
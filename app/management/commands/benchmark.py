@@ -0,0 +1,281 @@
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from app import urls as app_urls
+from app.models import Job
+from app.reporting import REPORTING_DATABASE, refresh_snapshot
+from books import bench
+from books.models import ActivityLog, Categorie, Emprunter, Etudiant, Livre
+
+# Paramètres GET de chaque route (recherches, exports CSV diffusés)
+QUERY_STRINGS = {
+    "search_authors": "q=auteur",
+    "search_publishers": "q=editeur",
+    "search_available_books": "q=manuel",
+    "search_students": "q=nom1",
+    "search_open_loans": "q=nom1",
+    "books_export_excel": "format=csv",
+    "users_export_excel": "format=csv",
+}
+
+# Objet utilisé pour les routes avec <pk> : modèle et champ de l'URL
+ROUTE_OBJECTS = {
+    "books_edit": Livre,
+    "books_delete": Livre,
+    "loans_edit": Emprunter,
+    "loans_delete": Emprunter,
+    "users_edit": Etudiant,
+    "users_delete": Etudiant,
+    "categories_edit": Categorie,
+    "categories_delete": Categorie,
+    "job_status": Job,
+    "job_download": Job,
+}
+
+SKIPPED_ROUTES = {
+    "change_password": "vue non implémentée",
+}
+
+# Budgets par route : nombre de requêtes SQL (premier affichage, cache vide)
+# et médiane du temps de réponse en ms (None : pas de limite). Le nombre de
+# requêtes ne doit pas dépendre du volume de données : un dépassement
+# signale un N+1.
+DEFAULT_BUDGET = {"queries": 10, "ms": 500}
+BUDGETS = {
+    # Cascade : une suppression par table (index, archive, emprunts, livres,
+    # catégorie), indépendante du nombre de livres (books.cascade)
+    "categories_delete": {"queries": 13},
+    "books_export_excel": {"ms": 5000},
+    "users_export_excel": {"ms": 5000},
+    "history_export": {"ms": 5000},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Appelle chaque route de app.urls avec le client de test et mesure "
+        "requêtes SQL, temps de réponse et pic mémoire ; échoue si un budget "
+        "est dépassé. Mesure une copie jetable de la base de seed_bench."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            default=str(bench.BENCH_DATABASE),
+            help="Base SQLite générée par seed_bench (BENCH_DATABASE par défaut).",
+        )
+        parser.add_argument("--repeat", type=int, default=5, help="Appels par route pour la médiane.")
+        parser.add_argument("--route", action="append", default=[], help="Limiter à ces noms de route.")
+        parser.add_argument("--output", help="Écrit les résultats au format JSON dans ce fichier.")
+        parser.add_argument("--budgets", help="Fichier JSON {route: {queries, ms}} remplaçant les budgets.")
+        parser.add_argument("--baseline", help="Résultats JSON d'une exécution précédente à comparer.")
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.5,
+            help="Hausse tolérée du temps médian par rapport à --baseline (0.5 = +50 %%).",
+        )
+        parser.add_argument("--no-fail", action="store_true", help="Signale les dépassements sans échouer.")
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat doit être positif.")
+        if connection.vendor != "sqlite":
+            raise CommandError("La base de benchmark est un fichier SQLite.")
+        source = Path(options["database"])
+        if not source.exists():
+            raise CommandError(f"{source} introuvable : lancer d'abord seed_bench.")
+
+        budgets = {name: {**DEFAULT_BUDGET, **budget} for name, budget in BUDGETS.items()}
+        if options["budgets"]:
+            with open(options["budgets"], encoding="utf-8") as f:
+                for name, budget in json.load(f).items():
+                    budgets[name] = {**budgets.get(name, DEFAULT_BUDGET), **budget}
+
+        baseline = {}
+        if options["baseline"]:
+            with open(options["baseline"], encoding="utf-8") as f:
+                baseline = {result["name"]: result for result in json.load(f)["results"]}
+
+        routes = [
+            pattern for pattern in app_urls.urlpatterns
+            if isinstance(pattern, URLPattern) and (not options["route"] or pattern.name in options["route"])
+        ]
+        if not routes:
+            raise CommandError("Aucune route sélectionnée.")
+
+        # Les 404 attendus (téléchargement sans fichier...) ne polluent pas la sortie
+        request_logger = logging.getLogger("django.request")
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            # Copie jetable : aucune écriture, ni transaction longue, sur la base
+            # de l'application ou sur celle de seed_bench
+            with tempfile.TemporaryDirectory() as tmp, ExitStack() as stack:
+                copy = Path(tmp) / "bench.sqlite3"
+                bench.copy(source, copy)
+                stack.enter_context(bench.sqlite_file(copy))
+                if REPORTING_DATABASE in settings.DATABASES:
+                    # Les vues de reporting lisent un instantané de la copie
+                    stack.enter_context(bench.sqlite_file(Path(tmp) / "reporting.sqlite3", REPORTING_DATABASE))
+                    refresh_snapshot()
+                results, dataset = self.run(routes, budgets, baseline, options)
+        finally:
+            request_logger.setLevel(level)
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump({
+                    "generated_at": timezone.now().isoformat(),
+                    "database": str(source),
+                    "dataset": dataset,
+                    "repeat": options["repeat"],
+                    "results": results,
+                }, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Résultats écrits dans {options['output']}.")
+
+        failures = [f"{r['name']} : {failure}" for r in results for failure in r["failures"]]
+        if failures and not options["no_fail"]:
+            raise CommandError("Budgets dépassés :\n  " + "\n  ".join(failures))
+        if failures:
+            self.stdout.write(self.style.WARNING(f"{len(failures)} dépassement(s) de budget."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{len(results)} route(s) dans les budgets."))
+
+    def run(self, routes, budgets, baseline, options):
+        # Cache vide en mémoire : le premier appel de chaque route est « à froid »,
+        # les suivants profitent des fragments en cache comme en production
+        cache_settings = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "benchmark"}}
+        results = []
+        with override_settings(CACHES=cache_settings, ACTIVITY_LOG_ASYNC=False):
+            client = Client(raise_request_exception=False)
+            user = User.objects.create_superuser("benchmark", "benchmark@example.com", None)
+            job = Job.objects.create(kind="export_books", status="done", created_by=user)
+            dataset = self.dataset()
+
+            for pattern in routes:
+                if pattern.name in SKIPPED_ROUTES:
+                    self.stdout.write(f"{pattern.name:<24} ignorée : {SKIPPED_ROUTES[pattern.name]}")
+                    continue
+                url = self.url(pattern, job)
+                result = self.measure(client, user, pattern.name, url, options["repeat"])
+                result["budget"] = budgets.get(pattern.name, DEFAULT_BUDGET)
+                result["failures"] = self.compare(result, baseline.get(pattern.name), options["tolerance"])
+                results.append(result)
+                self.report(result)
+
+        return results, dataset
+
+    def dataset(self):
+        return {
+            "livres": Livre.objects.count(),
+            "etudiants": Etudiant.objects.count(),
+            "emprunts": Emprunter.objects.count(),
+            "journal": ActivityLog.objects.count(),
+        }
+
+    def url(self, pattern, job):
+        kwargs = {}
+        if pattern.pattern.converters:
+            model = ROUTE_OBJECTS[pattern.name]
+            obj = job if model is Job else model.objects.order_by("pk").first()
+            if obj is None:
+                raise CommandError(f"{pattern.name} : aucun objet {model.__name__} (lancer seed_bench).")
+            kwargs = {name: obj.pk for name in pattern.pattern.converters}
+        url = reverse(pattern.name, kwargs=kwargs)
+        query = QUERY_STRINGS.get(pattern.name)
+        return f"{url}?{query}" if query else url
+
+    def measure(self, client, user, name, url, repeat):
+        def call(trace=False):
+            # Chaque appel dans un point de sauvegarde annulé : les vues de
+            # suppression ou d'écriture retrouvent les mêmes données
+            with transaction.atomic():
+                client.force_login(user)
+                with ExitStack() as stack:
+                    # Toutes les bases : les vues de reporting lisent l'instantané
+                    captured = [
+                        stack.enter_context(CaptureQueriesContext(conn))
+                        for conn in connections.all()
+                        # Sans créer de fichier vide pour un instantané jamais pris
+                        if conn.vendor != "sqlite" or conn is connection or os.path.exists(conn.settings_dict["NAME"])
+                    ]
+                    if trace:
+                        tracemalloc.start()
+                    start = time.perf_counter()
+                    response = client.get(url)
+                    # Réponses diffusées : le coût est dans la lecture du contenu
+                    if response.streaming:
+                        for _ in response.streaming_content:
+                            pass
+                    elapsed = (time.perf_counter() - start) * 1000
+                    peak = tracemalloc.get_traced_memory()[1] if trace else None
+                    if trace:
+                        tracemalloc.stop()
+                transaction.set_rollback(True)
+            return response.status_code, sum(len(c) for c in captured), elapsed, peak
+
+        status, queries, cold_ms, _ = call()
+        timings = [cold_ms]
+        warm_queries = queries
+        for _ in range(repeat - 1):
+            _, warm_queries, elapsed, _ = call()
+            timings.append(elapsed)
+        # Mesure mémoire à part : tracemalloc ralentit l'exécution
+        _, _, _, peak = call(trace=True)
+
+        timings.sort()
+        return {
+            "name": name,
+            "url": url,
+            "status": status,
+            "queries": queries,
+            "queries_warm": warm_queries,
+            "ms_cold": round(cold_ms, 2),
+            "ms_median": round(statistics.median(timings), 2),
+            "ms_max": round(timings[-1], 2),
+            "peak_kb": round(peak / 1024, 1),
+        }
+
+    def compare(self, result, previous, tolerance):
+        failures = []
+        budget = result["budget"]
+        if result["status"] >= 500:
+            failures.append(f"erreur HTTP {result['status']}")
+        if budget["queries"] is not None and result["queries"] > budget["queries"]:
+            failures.append(f"{result['queries']} requêtes (budget {budget['queries']})")
+        if budget["ms"] is not None and result["ms_median"] > budget["ms"]:
+            failures.append(f"{result['ms_median']} ms (budget {budget['ms']} ms)")
+        if previous:
+            if result["queries"] > previous["queries"]:
+                failures.append(f"{result['queries']} requêtes (référence {previous['queries']})")
+            if result["ms_median"] > previous["ms_median"] * (1 + tolerance):
+                failures.append(f"{result['ms_median']} ms (référence {previous['ms_median']} ms)")
+        return failures
+
+    def report(self, result):
+        line = (
+            f"{result['name']:<24} {result['status']}  {result['queries']:>3} req. "
+            f"({result['queries_warm']} en cache)  {result['ms_median']:>8.1f} ms  "
+            f"{result['peak_kb']:>9.1f} Kio"
+        )
+        if result["failures"]:
+            self.stdout.write(self.style.ERROR(f"{line}  ✗ {'; '.join(result['failures'])}"))
+        else:
+            self.stdout.write(line)
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.profiling import PROFILING_LOG_FILE, chattiest, read_log, summarize
+
+
+class Command(BaseCommand):
+    help = (
+        "Résume le journal de profilage (PROFILING_LOG_FILE) : pages les plus "
+        "lentes et pages qui exécutent le plus de requêtes SQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--log", default=PROFILING_LOG_FILE, help="Journal JSON à lire.")
+        parser.add_argument("--limit", type=int, default=10, help="Nombre de vues par classement.")
+
+    def handle(self, *args, **options):
+        records = read_log(options["log"])
+        if not records:
+            raise CommandError(f"Aucune mesure dans {options['log']} (PROFILING = True ?).")
+
+        summary = summarize(records)
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Pages les plus lentes ({len(records)} requête(s))"))
+        for row in summary[:options["limit"]]:
+            self.stdout.write(
+                f"  {row['view']:<28} {row['requests']:>5} req.  p95 {row['p95_ms']:>8.1f} ms  "
+                f"médiane {row['median_ms']:>8.1f} ms  base {row['db_ms']:>7.1f} ms"
+                + (f"  gabarits {row['template_ms']:>7.1f} ms" if row["template_ms"] is not None else "")
+            )
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Pages les plus bavardes en SQL"))
+        for row in chattiest(summary)[:options["limit"]]:
+            self.stdout.write(
+                f"  {row['view']:<28} {row['queries']:>6.1f} requêtes en moyenne, {row['max_queries']} au plus"
+            )
+            if row["duplicate_sql"]:
+                self.stdout.write(f"      ×{row['duplicate_count']} {row['duplicate_sql'][:150]}")
+
+        profiles = [record["profile"] for record in records if record.get("profile")]
+        if profiles:
+            self.stdout.write(self.style.MIGRATE_HEADING("Profils cProfile (python -m pstats <fichier>)"))
+            for path in profiles[-options["limit"]:]:
+                self.stdout.write(f"  {path}")
@@ -0,0 +1,48 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from app.reporting import REPORTING_DATABASE, REPORTING_SNAPSHOT_INTERVAL, refresh_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Met à jour l'instantané SQLite lu par l'historique et les exports "
+        "(API de sauvegarde en ligne)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Recommence toutes les --interval secondes (sans cron).",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=REPORTING_SNAPSHOT_INTERVAL,
+            help="Intervalle entre deux instantanés en secondes.",
+        )
+
+    def handle(self, *args, **options):
+        if REPORTING_DATABASE not in settings.DATABASES:
+            raise CommandError(f"Aucune base « {REPORTING_DATABASE} » dans DATABASES.")
+        if connections[REPORTING_DATABASE].vendor != "sqlite":
+            self.stdout.write("La base de reporting est un réplica : rien à copier.")
+            return
+
+        while True:
+            start = time.monotonic()
+            taken_at = refresh_snapshot()
+            self.stdout.write(self.style.SUCCESS(
+                f"Instantané du {taken_at:%d/%m/%Y %H:%M:%S} UTC "
+                f"({time.monotonic() - start:.1f} s)."
+            ))
+            if not options["loop"]:
+                break
+            try:
+                time.sleep(options["interval"])
+            except KeyboardInterrupt:
+                break
@@ -0,0 +1,58 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.jobs import claim_next, run_job
+from app.models import Job
+
+
+class Command(BaseCommand):
+    help = "Exécute les tâches d'import / export en attente (worker sans broker externe)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=getattr(settings, "JOBS_WORKERS", 2),
+            help="Nombre de tâches exécutées en parallèle (threads).",
+        )
+        parser.add_argument(
+            "--poll",
+            type=float,
+            default=2.0,
+            help="Intervalle en secondes entre deux recherches de tâches.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Traite les tâches en attente puis s'arrête.",
+        )
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+
+        # Tâches interrompues par l'arrêt d'un worker précédent
+        requeued = Job.objects.filter(status="running").update(status="pending", started_at=None)
+        if requeued:
+            self.stdout.write(f"{requeued} tâche(s) interrompue(s) remise(s) en attente.")
+
+        self.stdout.write(f"Worker démarré ({workers} thread(s)).")
+        running = set()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            try:
+                while True:
+                    running = {f for f in running if not f.done()}
+
+                    while len(running) < workers and (job := claim_next()):
+                        self.stdout.write(f"-> {job}")
+                        running.add(pool.submit(run_job, job))
+
+                    if options["once"] and not running and not Job.objects.filter(status="pending").exists():
+                        break
+                    time.sleep(options["poll"])
+            except KeyboardInterrupt:
+                self.stdout.write("Arrêt demandé, fin des tâches en cours...")
+
+        self.stdout.write(self.style.SUCCESS("Worker arrêté."))
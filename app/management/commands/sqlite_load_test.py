@@ -0,0 +1,128 @@
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from app.db import WAL_PRAGMAS, apply_pragmas, sqlite_pragmas
+
+# Réglages SQLite par défaut (journal rollback), ceux d'avant app/db.py
+BASELINE_PRAGMAS = {
+    "journal_mode": "delete",
+    "synchronous": "full",
+}
+
+# Lecture type tableau de bord et écriture type emprunt (journal + compteur)
+READ_SQL = "SELECT status, COUNT(*) FROM books_emprunter GROUP BY status"
+WRITE_SQL = [
+    (
+        "INSERT INTO books_activitylog (action_type, title, description, user, timestamp) "
+        "VALUES ('loan', 'Test de charge', '', NULL, datetime('now'))"
+    ),
+    "UPDATE books_livre SET copies_out = copies_out WHERE id = (SELECT MIN(id) FROM books_livre)",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure lectures / écritures concurrentes sur une copie de la base, "
+        "avec les réglages SQLite par défaut puis en WAL avec SQLITE_PRAGMAS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, default=8, help="Threads de lecture.")
+        parser.add_argument("--writers", type=int, default=4, help="Threads d'écriture.")
+        parser.add_argument("--duration", type=float, default=5.0, help="Durée de chaque scénario (s).")
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=connection.settings_dict["OPTIONS"].get("timeout", 5.0),
+            help=(
+                "Attente maximale d'un verrou (s), identique dans les deux scénarios "
+                "(par défaut OPTIONS['timeout'] de la base)."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("Ce test de charge ne concerne que SQLite.")
+
+        source = Path(connection.settings_dict["NAME"])
+        with tempfile.TemporaryDirectory() as tmp:
+            for n, (label, pragmas) in enumerate((
+                ("Par défaut", BASELINE_PRAGMAS),
+                ("WAL + SQLITE_PRAGMAS", {**WAL_PRAGMAS, **sqlite_pragmas()}),
+            )):
+                # Copie fraîche par scénario : la production n'est jamais écrite
+                path = Path(tmp) / f"charge_{n}.sqlite3"
+                with closing(sqlite3.connect(source)) as src, closing(sqlite3.connect(path)) as dst:
+                    src.backup(dst)
+                self.report(label, self.run(path, pragmas, options))
+                for suffix in ("", "-wal", "-shm"):
+                    Path(f"{path}{suffix}").unlink(missing_ok=True)
+
+    def run(self, path, pragmas, options):
+        stop = threading.Event()
+        stats = {"read": [], "write": [], "locked": 0}
+        lock = threading.Lock()
+
+        # Même attente de verrou dans les deux scénarios : seul le journal et
+        # les réglages d'E/S diffèrent (un busy_timeout écraserait --timeout)
+        pragmas = {name: value for name, value in pragmas.items() if name != "busy_timeout"}
+
+        def worker(statements, kind):
+            conn = sqlite3.connect(path, timeout=options["timeout"], isolation_level=None)
+            apply_pragmas(conn.cursor(), pragmas)
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    if kind == "write":
+                        conn.execute("BEGIN IMMEDIATE")
+                    for sql in statements:
+                        conn.execute(sql).fetchall()
+                    if kind == "write":
+                        conn.execute("COMMIT")
+                except sqlite3.OperationalError as e:
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                    if "locked" not in str(e):
+                        raise
+                    with lock:
+                        stats["locked"] += 1
+                    continue
+                with lock:
+                    stats[kind].append(time.perf_counter() - start)
+            conn.close()
+
+        threads = [threading.Thread(target=worker, args=([READ_SQL], "read")) for _ in range(options["readers"])]
+        threads += [threading.Thread(target=worker, args=(WRITE_SQL, "write")) for _ in range(options["writers"])]
+        for thread in threads:
+            thread.start()
+        time.sleep(options["duration"])
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        stats["duration"] = options["duration"]
+        stats["timeout"] = options["timeout"]
+        return stats
+
+    def report(self, label, stats):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{label} (attente de verrou : {stats['timeout']} s)"))
+        for kind, name in (("read", "Lectures"), ("write", "Écritures")):
+            latencies = sorted(stats[kind])
+            if not latencies:
+                self.stdout.write(f"  {name} : aucune")
+                continue
+            p95 = latencies[int(len(latencies) * 0.95) - 1 if len(latencies) > 1 else 0]
+            self.stdout.write(
+                f"  {name} : {len(latencies) / stats['duration']:.0f}/s, "
+                f"médiane {statistics.median(latencies) * 1000:.2f} ms, "
+                f"p95 {p95 * 1000:.2f} ms"
+            )
+        self.stdout.write(f"  « database is locked » : {stats['locked']}")
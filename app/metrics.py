@@ -0,0 +1,382 @@
+"""
+Métriques au format texte Prometheus (endpoint /metrics).
+
+Compteurs et histogrammes sont agrégés sans verrou dans une zone propre à
+chaque thread ; au plus toutes les METRICS_FLUSH_SECONDS, le processus
+écrit la somme de ses zones dans METRICS_DIR/<pid>-<démarrage>.json. /metrics
+additionne les fichiers de tous les processus (plusieurs workers WSGI,
+run_jobs) et ajoute les jauges de l'état de la bibliothèque, lues en base
+au moment de la collecte.
+
+Les totaux des processus arrêtés sont conservés : les compteurs ne
+redescendent pas quand un worker est recyclé. Le nom de fichier porte
+l'instant de démarrage, un pid réutilisé n'écrase donc pas les totaux d'un
+processus mort ; à chaque collecte, les fichiers des processus arrêtés sont
+additionnés dans METRICS_DIR/arretes.json puis supprimés (sous verrou
+fcntl, absent sous Windows : les fichiers y sont seulement conservés).
+
+METRICS_DIR = None : pas de fichier, /metrics ne montre que le processus
+courant (tests).
+"""
+import atexit
+import bisect
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+
+from books.models import ActivityLog, Emprunter, Livre, OPEN_LOAN_STATUSES
+
+METRICS_FLUSH_SECONDS = getattr(settings, "METRICS_FLUSH_SECONDS", 5)
+
+# Bornes des histogrammes (secondes)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DURATION_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+
+# Nom : (type, aide, bornes pour les histogrammes)
+METRICS = {
+    "http_requests_total": ("counter", "Requêtes HTTP traitées, par vue et code de statut.", None),
+    "http_request_duration_seconds": ("histogram", "Temps de réponse par vue.", LATENCY_BUCKETS),
+    "library_loans_total": ("counter", "Emprunts enregistrés.", None),
+    "library_returns_total": ("counter", "Retours enregistrés.", None),
+    "library_imports_total": ("counter", "Imports Excel terminés, par type.", None),
+    "library_import_duration_seconds": ("histogram", "Durée des imports Excel.", DURATION_BUCKETS),
+    "library_export_duration_seconds": ("histogram", "Durée des exports, par fichier et format.", DURATION_BUCKETS),
+}
+
+GAUGES = {
+    "library_active_loans": "Emprunts en cours (non rendus, dans les délais).",
+    "library_late_loans": "Emprunts en retard.",
+    "library_available_copies": "Exemplaires disponibles (quantité - exemplaires empruntés).",
+    "library_activity_log_rows": "Lignes du journal d'activité (hors archive).",
+}
+
+
+# --- Agrégation par thread ---
+
+_local = threading.local()
+_zones = []  # zones de tous les threads de ce processus
+_zones_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_next_flush = 0.0
+_process = None  # (pid, nom du fichier de ce processus)
+
+STOPPED_FILE = "arretes.json"
+
+
+def _zone():
+    try:
+        return _local.zone
+    except AttributeError:
+        # {(nom, labels): valeur} ; histogrammes : [compte par borne..., +Inf, somme]
+        zone = _local.zone = {}
+        with _zones_lock:
+            _zones.append(zone)
+        return zone
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    zone = _zone()
+    key = _key(name, labels)
+    zone[key] = zone.get(key, 0) + amount
+    _maybe_flush()
+
+
+def observe(name, seconds, **labels):
+    buckets = METRICS[name][2]
+    zone = _zone()
+    key = _key(name, labels)
+    values = zone.get(key)
+    if values is None:
+        values = zone[key] = [0] * (len(buckets) + 2)
+    values[bisect.bisect_left(buckets, seconds)] += 1
+    values[-1] += seconds
+    _maybe_flush()
+
+
+def timed(name, **labels):
+    """Décorateur : observe la durée de chaque appel dans l'histogramme name."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - start, **labels)
+        return wrapper
+    return decorator
+
+
+def timed_iter(iterable, name, **labels):
+    """Réponse diffusée : la durée court jusqu'au dernier morceau envoyé."""
+    start = time.perf_counter()
+    try:
+        yield from iterable
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+# --- Partage entre processus ---
+
+def metrics_dir():
+    """Lu à chaque appel : les tests remplacent METRICS_DIR (voir AppBiblioIDSI.test_runner)."""
+    path = getattr(settings, "METRICS_DIR", settings.BASE_DIR / "metrics")
+    return Path(path) if path else None
+
+
+def _process_file():
+    global _process
+    pid = os.getpid()
+    if _process is None or _process[0] != pid:
+        # Recalculé après un fork (workers préchargés)
+        _process = (pid, f"{pid}-{time.time_ns()}.json")
+    return _process[1]
+
+
+def _add(total, key, value):
+    if isinstance(value, list):
+        current = total.setdefault(key, [0] * len(value))
+        if len(current) != len(value):
+            return  # bornes modifiées depuis l'écriture du fichier
+        for i, v in enumerate(value):
+            current[i] += v
+    else:
+        total[key] = total.get(key, 0) + value
+
+
+def _read(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write(directory, name, total):
+    directory.mkdir(parents=True, exist_ok=True)
+    data = [[metric, dict(labels), value] for (metric, labels), value in total.items()]
+    # Écriture atomique : /metrics ne lit jamais un fichier à moitié écrit
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, directory / name)
+
+
+@contextmanager
+def _locked(directory, exclusive):
+    """Verrou partagé (collecte) ou exclusif (regroupement des processus arrêtés)."""
+    if fcntl is None:
+        yield
+        return
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / ".lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _stopped(path):
+    """Processus arrêté : pid absent (noms <pid>-<démarrage>.json ou, anciens, <pid>.json)."""
+    try:
+        pid = int(path.stem.split("-")[0])
+    except ValueError:
+        return False
+    if pid == os.getpid():
+        return path.name != _process_file()
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        return False  # existe, mais appartient à un autre utilisateur
+    return False
+
+
+def compact():
+    """Additionne les fichiers des processus arrêtés dans STOPPED_FILE."""
+    directory = metrics_dir()
+    if directory is None or fcntl is None or not directory.is_dir():
+        return
+    with _locked(directory, exclusive=True):
+        stopped = [
+            path for path in directory.glob("*.json")
+            if path.name != STOPPED_FILE and _stopped(path)
+        ]
+        if not stopped:
+            return
+        total = {}
+        for path in [directory / STOPPED_FILE, *stopped]:
+            for name, labels, value in _read(path) or ():
+                _add(total, _key(name, labels), value)
+        # Les lecteurs attendent le verrou : ils ne voient jamais un
+        # processus compté deux fois (arretes.json écrit, fichier pas encore supprimé)
+        _write(directory, STOPPED_FILE, total)
+        for path in stopped:
+            path.unlink(missing_ok=True)
+
+
+def _snapshot():
+    total = {}
+    with _zones_lock:
+        zones = list(_zones)
+    for zone in zones:
+        # list(dict.items()) est atomique sous le GIL : pas de verrou côté écriture
+        for key, value in list(zone.items()):
+            if isinstance(value, list):
+                current = total.setdefault(key, [0] * len(value))
+                for i, v in enumerate(value):
+                    current[i] += v
+            else:
+                total[key] = total.get(key, 0) + value
+    return total
+
+
+def flush():
+    if not _flush_lock.acquire(blocking=False):
+        return  # un autre thread écrit déjà
+    try:
+        directory = metrics_dir()
+        snapshot = _snapshot()
+        if directory is None or not snapshot:
+            return  # rien mesuré dans ce processus (commandes de gestion...)
+        _write(directory, _process_file(), snapshot)
+    finally:
+        _flush_lock.release()
+
+
+def _maybe_flush():
+    global _next_flush
+    now = time.monotonic()
+    if now >= _next_flush:
+        _next_flush = now + METRICS_FLUSH_SECONDS
+        flush()
+
+
+atexit.register(flush)
+
+
+def collect():
+    """Somme des métriques écrites par tous les processus."""
+    directory = metrics_dir()
+    if directory is None:
+        return _snapshot()
+    total = {}
+    if not directory.is_dir():
+        return total
+    with _locked(directory, exclusive=False):
+        for path in directory.glob("*.json"):
+            for name, labels, value in _read(path) or ():
+                if name in METRICS:
+                    _add(total, _key(name, labels), value)
+    return total
+
+
+# --- Jauges et format texte ---
+
+def library_gauges():
+    # Filtre sur status : lecture de l'index emprunt_status_dates_idx seulement
+    emprunts = Emprunter.objects.filter(status__in=OPEN_LOAN_STATUSES).aggregate(
+        active=Count("id", filter=Q(status="active")),
+        late=Count("id", filter=Q(status="late")),
+    )
+    exemplaires = Livre.objects.aggregate(
+        quantite=Coalesce(Sum("quantite"), 0),
+        copies_out=Coalesce(Sum("copies_out"), 0),
+    )
+    return {
+        "library_active_loans": emprunts["active"],
+        "library_late_loans": emprunts["late"],
+        "library_available_copies": exemplaires["quantite"] - exemplaires["copies_out"],
+        "library_activity_log_rows": ActivityLog.objects.count(),
+    }
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in items) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def authorized(request):
+    """
+    Accès à /metrics : utilisateur staff, en-tête « Authorization: Bearer
+    <METRICS_TOKEN> », ou adresse listée dans METRICS_ALLOWED_IPS (vide par
+    défaut : derrière un proxy inverse, REMOTE_ADDR est celle du proxy).
+    """
+    if request.user.is_staff:
+        return True
+    token = getattr(settings, "METRICS_TOKEN", None)
+    scheme, _, value = request.META.get("HTTP_AUTHORIZATION", "").partition(" ")
+    if token and scheme.lower() == "bearer" and hmac.compare_digest(value.strip().encode(), token.encode()):
+        return True
+    return request.META.get("REMOTE_ADDR") in getattr(settings, "METRICS_ALLOWED_IPS", ())
+
+
+def render(gauges):
+    flush()
+    compact()
+    values = collect()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for (metric, labels), value in sorted(values.items(), key=lambda item: item[0]):
+            if metric != name:
+                continue
+            if kind != "histogram":
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + ("+Inf",), value[:-1]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels, le=bound)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(value[-1])}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+    for name, value in gauges.items():
+        lines += [f"# HELP {name} {GAUGES[name]}", f"# TYPE {name} gauge", f"{name} {_number(value)}"]
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Compte les requêtes et mesure leur durée par vue."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "(aucune vue)"
+        observe("http_request_duration_seconds", time.perf_counter() - start, view=view)
+        inc("http_requests_total", view=view, status=response.status_code)
+        return response
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('import_books', 'Import des livres'), ('import_students', 'Import des étudiants'), ('export_books', 'Export des livres'), ('export_users', 'Export des utilisateurs'), ('export_history', "Export de l'historique")], max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('running', 'En cours'), ('done', 'Terminée'), ('failed', 'Échec')], db_index=True, default='pending', max_length=10)),
+                ('progress', models.PositiveIntegerField(default=0)),
+                ('params', models.JSONField(blank=True, default=dict)),
+                ('input_file', models.CharField(blank=True, max_length=255)),
+                ('result_file', models.CharField(blank=True, max_length=255)),
+                ('message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -1,3 +1,41 @@
 from django.db import models
 
 # Create your models here.
+class Job(models.Model):
+    """Tâche d'import / export exécutée en arrière-plan par « manage.py run_jobs »."""
+
+    KIND_CHOICES = [
+        ("import_books", "Import des livres"),
+        ("import_students", "Import des étudiants"),
+        ("export_books", "Export des livres"),
+        ("export_users", "Export des utilisateurs"),
+        ("export_history", "Export de l'historique"),
+    ]
+
+    STATUS_CHOICES = [
+        ("pending", "En attente"),
+        ("running", "En cours"),
+        ("done", "Terminée"),
+        ("failed", "Échec"),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending", db_index=True)
+    progress = models.PositiveIntegerField(default=0)  # lignes traitées
+    params = models.JSONField(default=dict, blank=True)
+    input_file = models.CharField(max_length=255, blank=True)
+    result_file = models.CharField(max_length=255, blank=True)
+    message = models.TextField(blank=True)
+
+    created_by = models.ForeignKey(
+        "auth.User", on_delete=models.SET_NULL, null=True, blank=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def is_finished(self):
+        return self.status in ("done", "failed")
+
+    def __str__(self):
+        return f"Tâche n°{self.id} - {self.get_kind_display()} ({self.status})"
@@ -0,0 +1,180 @@
+"""
+Pagination par curseur (keyset) des listes qui grossissent sans limite.
+
+Au lieu de OFFSET, la page suivante est lue à partir de la dernière ligne
+affichée : WHERE (timestamp, id) < (dernière valeur) ORDER BY timestamp DESC,
+id DESC LIMIT n. Le coût d'une page ne dépend plus de sa profondeur et
+l'index de tri sert aussi au filtre.
+
+Le curseur transmis dans l'URL est signé (django.core.signing) : il est
+opaque pour l'utilisateur et un curseur modifié ramène à la première page.
+
+Une table d'archive (mêmes colonnes) peut être fusionnée à la liste : elle
+n'est interrogée que si la page atteint la période archivée.
+"""
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+
+CURSOR_SALT = "app.pagination"
+
+# Au-delà, le nombre total de résultats est affiché comme « plus de N »
+# (COUNT borné par un LIMIT). None : COUNT(*) exact.
+PAGINATION_COUNT_LIMIT = getattr(settings, "PAGINATION_COUNT_LIMIT", 10000)
+
+
+def _encode(values, direction):
+    values = [v.isoformat() if isinstance(v, (date, datetime)) else v for v in values]
+    return signing.dumps({"v": values, "d": direction}, salt=CURSOR_SALT, compress=True)
+
+
+def _decode(cursor):
+    if not cursor:
+        return None
+    try:
+        position = signing.loads(cursor, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        return None
+    if position.get("d") not in ("next", "prev") or not isinstance(position.get("v"), list):
+        return None
+    return position
+
+
+def _flip(field):
+    return field[1:] if field.startswith("-") else f"-{field}"
+
+
+def _after(ordering, values, backwards):
+    """
+    Lignes situées après « values » dans l'ordre de tri (avant si backwards).
+
+    La première colonne est bornée seule (colonne <= v) pour que SQLite
+    parcoure l'index par plage, le OU ne départage que les ex aequo.
+    """
+    def lookup(field, strict):
+        descending = field.startswith("-") != backwards
+        op = ("lt" if strict else "lte") if descending else ("gt" if strict else "gte")
+        return f"{field.lstrip('-')}__{op}"
+
+    first = ordering[0]
+    condition = Q(**{lookup(first, strict=len(ordering) == 1): values[0]})
+
+    ties = Q()
+    for i, field in enumerate(ordering[1:], start=1):
+        equal = {name.lstrip("-"): value for name, value in zip(ordering[:i], values[:i])}
+        ties |= Q(**{lookup(field, strict=True): values[i]}, **equal)
+    if ties:
+        condition &= Q(**{lookup(first, strict=True): values[0]}) | ties
+
+    return condition
+
+
+def count_upto(queryset, limit=PAGINATION_COUNT_LIMIT):
+    """
+    (nombre de lignes, exact ?) : COUNT limité à limit + 1 lignes pour ne
+    jamais parcourir toute une grande table juste pour afficher un total.
+    """
+    if limit is None:
+        return queryset.count(), True
+    count = queryset.order_by()[:limit + 1].count()
+    return min(count, limit), count <= limit
+
+
+class CursorPage:
+    """Une page de résultats : itérable comme un Page de Paginator."""
+
+    def __init__(self, object_list, next_cursor, previous_cursor, count, count_exact):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+        self.count_exact = count_exact
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def _sort(rows, ordering, backwards):
+    # Tris stables successifs, de la dernière colonne à la première
+    for field in reversed(ordering):
+        rows.sort(
+            key=lambda obj: getattr(obj, field.lstrip("-")),
+            reverse=field.startswith("-") != backwards,
+        )
+    return rows
+
+
+def keyset_paginate(queryset, ordering, cursor=None, per_page=10, count_limit=PAGINATION_COUNT_LIMIT,
+                    archive=None, archive_before=None, count_queryset=None):
+    """
+    Page de queryset triée par ordering, qui doit se terminer par une
+    colonne unique (id, matricule...) pour que l'ordre soit total.
+
+    archive : queryset d'archive fusionné à la liste ; archive_before, si
+    connu, est une borne stricte de la première colonne (tri décroissant)
+    pour toutes les lignes archivées : tant que la page s'arrête au-dessus,
+    l'archive n'est pas lue.
+
+    count_queryset : mêmes lignes que queryset sans les annotations coûteuses,
+    utilisé pour le total (par défaut queryset lui-même).
+    """
+    position = _decode(cursor)
+    if position and len(position["v"]) != len(ordering):
+        position = None
+    backwards = position is not None and position["d"] == "prev"
+
+    def window(qs):
+        qs = qs.order_by(*(_flip(f) if backwards else f for f in ordering))
+        if position:
+            qs = qs.filter(_after(ordering, position["v"], backwards))
+        return list(qs[:per_page + 1])
+
+    rows = window(queryset)
+
+    first = ordering[0].lstrip("-")
+    use_archive = archive is not None and (
+        archive_before is None
+        or backwards
+        or len(rows) <= per_page
+        or getattr(rows[-1], first) < archive_before
+    )
+    if use_archive:
+        rows = _sort(rows + window(archive), ordering, backwards)[:per_page + 1]
+
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    has_next = True if backwards else more
+    has_previous = more if backwards else position is not None
+
+    def key(obj):
+        return [getattr(obj, field.lstrip("-")) for field in ordering]
+
+    count, count_exact = count_upto(queryset if count_queryset is None else count_queryset, count_limit)
+    if archive is not None and count_exact:
+        archived, count_exact = count_upto(archive, None if count_limit is None else count_limit - count)
+        count += archived
+
+    return CursorPage(
+        rows,
+        _encode(key(rows[-1]), "next") if rows and has_next else None,
+        _encode(key(rows[0]), "prev") if rows and has_previous else None,
+        count,
+        count_exact,
+    )
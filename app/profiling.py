@@ -0,0 +1,219 @@
+"""
+Profilage des requêtes (opt-in : PROFILING = True dans settings).
+
+ProfilingMiddleware mesure pour chaque requête la vue appelée, le temps
+total, le temps passé en base, le nombre de requêtes SQL, les requêtes
+répétées (même SQL aux paramètres près : signe d'un N+1) et, pour une
+fraction PROFILING_TEMPLATE_SAMPLE_RATE des requêtes, le temps de rendu
+des gabarits. Chaque mesure est gardée dans un tampon circulaire en
+mémoire (page /profiling/, réservée au staff) et écrite en JSON sur le
+logger « app.profiling » (commande profiling_report).
+
+Une fraction PROFILING_SAMPLE_RATE des requêtes est en plus exécutée sous
+cProfile ; le profil est écrit dans PROFILING_DIR (python -m pstats).
+"""
+import cProfile
+import json
+import logging
+import random
+import re
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.template import base as template_base
+from django.utils import timezone
+from django.utils.text import slugify
+
+logger = logging.getLogger(__name__)
+
+PROFILING_BUFFER_SIZE = getattr(settings, "PROFILING_BUFFER_SIZE", 500)
+PROFILING_SAMPLE_RATE = getattr(settings, "PROFILING_SAMPLE_RATE", 0.0)
+PROFILING_TEMPLATE_SAMPLE_RATE = getattr(settings, "PROFILING_TEMPLATE_SAMPLE_RATE", 0.1)
+PROFILING_DIR = Path(getattr(settings, "PROFILING_DIR", settings.BASE_DIR / "profiles"))
+PROFILING_LOG_FILE = Path(getattr(settings, "PROFILING_LOG_FILE", settings.BASE_DIR / "profiling.log"))
+
+# Dernières requêtes de ce processus (le journal structuré garde tout)
+recent = deque(maxlen=PROFILING_BUFFER_SIZE)
+
+# Listes IN de longueur variable : une seule empreinte quel que soit le nombre d'éléments
+_IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+
+
+def fingerprint(sql):
+    # Les paramètres sont passés à part (%s) : seul le texte SQL compte
+    return _IN_LIST.sub("IN (...)", sql)
+
+
+class _QueryRecorder:
+    """connection.execute_wrapper : compte et chronomètre chaque requête."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+
+# {"seconds": ..., "depth": ...} de la requête en cours, None hors mesure
+_templates = ContextVar("profiling_templates", default=None)
+
+# Template._render n'est remplacé que pendant les requêtes échantillonnées :
+# compteur des requêtes en cours et méthode remplacée (celle de Django ou
+# l'instrumentation des tests), remise en place par la dernière requête.
+_patch_lock = threading.Lock()
+_patch_users = 0
+_replaced_render = None
+
+
+def _timed_render(self, context):
+    state = _templates.get()
+    # Autres threads, gabarits inclus ({% include %}, {% extends %}) : déjà comptés dans le parent
+    if state is None or state["depth"]:
+        return _replaced_render(self, context)
+    state["depth"] = 1
+    start = time.perf_counter()
+    try:
+        return _replaced_render(self, context)
+    finally:
+        state["seconds"] += time.perf_counter() - start
+        state["depth"] = 0
+
+
+@contextmanager
+def _timing_templates(state):
+    global _patch_users, _replaced_render
+    with _patch_lock:
+        if not _patch_users:
+            _replaced_render = template_base.Template._render
+            template_base.Template._render = _timed_render
+        _patch_users += 1
+    token = _templates.set(state)
+    try:
+        yield
+    finally:
+        _templates.reset(token)
+        with _patch_lock:
+            _patch_users -= 1
+            if not _patch_users:
+                template_base.Template._render = _replaced_render
+
+
+class ProfilingMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = _QueryRecorder()
+        templates = {"seconds": 0.0, "depth": 0} if random.random() < PROFILING_TEMPLATE_SAMPLE_RATE else None
+        profiler = cProfile.Profile() if random.random() < PROFILING_SAMPLE_RATE else None
+
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            if templates is not None:
+                stack.enter_context(_timing_templates(templates))
+            if profiler:
+                profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler:
+                    profiler.disable()
+        elapsed = time.perf_counter() - start
+
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "(aucune vue)"
+        record = {
+            "timestamp": timezone.now().isoformat(),
+            "method": request.method,
+            "path": request.path,
+            "view": view,
+            "status": response.status_code,
+            "total_ms": round(elapsed * 1000, 2),
+            "db_ms": round(queries.seconds * 1000, 2),
+            "queries": queries.count,
+            # None : rendu des gabarits non mesuré pour cette requête
+            "template_ms": round(templates["seconds"] * 1000, 2) if templates is not None else None,
+            # Même SQL exécuté plusieurs fois pendant la requête
+            "duplicates": [
+                {"sql": sql, "count": count}
+                for sql, count in queries.fingerprints.most_common(5)
+                if count > 1
+            ],
+            "profile": self.dump(profiler, view) if profiler else None,
+        }
+        recent.append(record)
+        logger.info(json.dumps(record, ensure_ascii=False))
+        return response
+
+    def dump(self, profiler, view):
+        PROFILING_DIR.mkdir(parents=True, exist_ok=True)
+        path = PROFILING_DIR / f"{timezone.now():%Y%m%d-%H%M%S-%f}-{slugify(view) or 'requete'}.prof"
+        profiler.dump_stats(path)
+        return str(path)
+
+
+def read_log(path=PROFILING_LOG_FILE):
+    """Enregistrements du journal structuré (tous les processus)."""
+    if not Path(path).exists():
+        return []
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+
+def summarize(records):
+    """Statistiques par vue, triées de la plus lente (p95) à la plus rapide."""
+    by_view = defaultdict(list)
+    for record in records:
+        by_view[record["view"]].append(record)
+
+    summary = []
+    for view, rows in by_view.items():
+        totals = sorted(row["total_ms"] for row in rows)
+        duplicates = Counter()
+        for row in rows:
+            for duplicate in row["duplicates"]:
+                duplicates[duplicate["sql"]] = max(duplicates[duplicate["sql"]], duplicate["count"])
+        worst = duplicates.most_common(1)
+        template_ms = [row["template_ms"] for row in rows if row.get("template_ms") is not None]
+        summary.append({
+            "view": view,
+            "requests": len(rows),
+            "median_ms": round(statistics.median(totals), 2),
+            "p95_ms": totals[max(int(len(totals) * 0.95) - 1, 0)],
+            "max_ms": totals[-1],
+            "db_ms": round(statistics.mean(row["db_ms"] for row in rows), 2),
+            "template_ms": round(statistics.mean(template_ms), 2) if template_ms else None,
+            "queries": round(statistics.mean(row["queries"] for row in rows), 1),
+            "max_queries": max(row["queries"] for row in rows),
+            "duplicate_sql": worst[0][0] if worst else None,
+            "duplicate_count": worst[0][1] if worst else 0,
+        })
+    return sorted(summary, key=lambda row: row["p95_ms"], reverse=True)
+
+
+def chattiest(summary):
+    return sorted(summary, key=lambda row: (row["max_queries"], row["queries"]), reverse=True)
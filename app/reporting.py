@@ -0,0 +1,139 @@
+"""
+Lectures de reporting sur une copie de la base.
+
+Les vues décorées par @reporting_view (historique, exports) lisent les
+modèles de « books » et « app » sur l'alias REPORTING_DATABASE au lieu de
+« default » : elles ne concurrencent plus les emprunts et retours. Le
+tableau de bord n'en fait pas partie : ses indicateurs (disponibilités,
+emprunts en cours) doivent suivre chaque écriture et sont lus sur
+« default », en cache jusqu'à la prochaine écriture (books.fragments).
+
+En SQLite, cet alias est un instantané produit par l'API de sauvegarde en
+ligne (refresh_snapshot, commande refresh_reporting_snapshot) ; en
+PostgreSQL, un réplica en lecture. Si l'alias n'est pas configuré, si
+l'instantané n'existe pas encore ou s'il est plus vieux que
+REPORTING_MAX_STALENESS, les vues lisent simplement « default ».
+"""
+import sqlite3
+from contextlib import closing
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import wraps
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.http import FileResponse
+from django.utils import timezone
+
+REPORTING_DATABASE = getattr(settings, "REPORTING_DATABASE", "reporting")
+REPORTING_SNAPSHOT_INTERVAL = getattr(settings, "REPORTING_SNAPSHOT_INTERVAL", 300)
+REPORTING_MAX_STALENESS = getattr(settings, "REPORTING_MAX_STALENESS", 3600)
+
+# Applications dont les lectures sont redirigées (pas les sessions ni l'authentification)
+REPORTING_APPS = {"books", "app"}
+
+SNAPSHOT_TABLE = "reporting_snapshot"
+
+_reporting = ContextVar("reporting_alias", default=None)
+
+
+class ReportingRouter:
+
+    def db_for_read(self, model, **hints):
+        alias = _reporting.get()
+        if alias and model._meta.app_label in REPORTING_APPS:
+            return alias
+        return None
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # La copie est produite par sauvegarde ou réplication, jamais migrée
+        if db == REPORTING_DATABASE:
+            return False
+        return None
+
+
+def _sqlite_path(alias):
+    return Path(settings.DATABASES[alias]["NAME"])
+
+
+def snapshot_taken_at(alias=REPORTING_DATABASE):
+    """Date des données lues sur alias, None si elles ne sont pas disponibles."""
+    if alias not in settings.DATABASES:
+        return None
+    connection = connections[alias]
+    try:
+        if connection.vendor == "sqlite":
+            # Ne pas créer un fichier vide en s'y connectant
+            if not _sqlite_path(alias).exists():
+                return None
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT taken_at FROM {SNAPSHOT_TABLE}")
+                row = cursor.fetchone()
+            return datetime.fromisoformat(row[0]) if row else None
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_last_xact_replay_timestamp()")
+                # NULL : ce n'est pas un réplica, les données sont à jour
+                return cursor.fetchone()[0] or timezone.now()
+    except DatabaseError:
+        return None
+    return timezone.now()
+
+
+def refresh_snapshot(alias=REPORTING_DATABASE, source="default"):
+    """Copie source dans l'alias SQLite avec l'API de sauvegarde en ligne."""
+    if connections[alias].vendor != "sqlite" or connections[source].vendor != "sqlite":
+        return None
+    taken_at = datetime.now(dt_timezone.utc)
+    # closing() : « with connexion » ne fait que valider la transaction, sans
+    # fermer (refresh_reporting_snapshot --loop ouvrirait deux connexions par cycle)
+    with closing(sqlite3.connect(_sqlite_path(source))) as src, closing(sqlite3.connect(_sqlite_path(alias))) as dst:
+        # Page par page : les écritures sur source ne sont pas bloquées pendant la copie
+        src.backup(dst, pages=1024)
+        with dst:
+            dst.execute(f"CREATE TABLE IF NOT EXISTS {SNAPSHOT_TABLE} (taken_at TEXT NOT NULL)")
+            dst.execute(f"DELETE FROM {SNAPSHOT_TABLE}")
+            dst.execute(f"INSERT INTO {SNAPSHOT_TABLE} (taken_at) VALUES (?)", [taken_at.isoformat()])
+    return taken_at
+
+
+def _iter_using(alias, iterable):
+    # Réponse diffusée : les lignes sont lues après le retour de la vue
+    iterator = iter(iterable)
+    while True:
+        token = _reporting.set(alias)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _reporting.reset(token)
+        yield chunk
+
+
+def reporting_view(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        taken_at = snapshot_taken_at()
+        if taken_at is None or timezone.now() - taken_at > timedelta(seconds=REPORTING_MAX_STALENESS):
+            return view(request, *args, **kwargs)
+
+        # Affiché par base.html (« Données du ... »)
+        request.snapshot_taken_at = taken_at
+        token = _reporting.set(REPORTING_DATABASE)
+        try:
+            response = view(request, *args, **kwargs)
+        finally:
+            _reporting.reset(token)
+
+        if response.streaming and not isinstance(response, FileResponse):
+            response.streaming_content = _iter_using(REPORTING_DATABASE, response.streaming_content)
+        return response
+    return wrapper
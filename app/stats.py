@@ -0,0 +1,109 @@
+from django.db.models import Q, F, Count, Sum
+from django.db.models.functions import Coalesce
+from django.utils.timezone import now, timedelta
+
+from books.models import Categorie, Emprunter, EmprunterArchive, Etudiant, Livre, OPEN_LOAN_STATUSES
+
+
+def dashboard_stats(today=None):
+    """
+    Calcule tous les indicateurs du tableau de bord en quelques requêtes
+    agrégées (le nombre de requêtes ne dépend pas de la taille du catalogue).
+    """
+    today = today or now().date()
+    last_week = today - timedelta(days=6)  # pour les 7 derniers jours
+
+    # Équivalent SQL de Emprunter.is_overdue()
+    overdue = Count("id", filter=(
+        Q(dateRetourEffectif__isnull=False, dateRetourEffectif__gt=F("dateRetourPrevu")) |
+        Q(dateRetourEffectif__isnull=True, dateRetourPrevu__lt=today)
+    ))
+
+    # --- Emprunts : COUNT conditionnels, une requête par plage de l'index
+    # emprunt_status_dates_idx (jamais de parcours complet de la table) ---
+    emprunts = Emprunter.objects.filter(status__in=OPEN_LOAN_STATUSES).aggregate(
+        active=Count("id", filter=Q(status="active")),
+        late=Count("id", filter=Q(status="late")),
+        overdue=overdue,
+    )
+    # Retours encore dans la table chaude : la commande « archive » en borne le nombre
+    rendus = Emprunter.objects.filter(status="returned").aggregate(
+        returned=Count("id"),
+        # Retours rendus après la date prévue (carte « Retours en retard »)
+        late_returns=Count("id", filter=(
+            Q(dateRetourEffectif__gt=F("dateRetourPrevu")) |
+            Q(dateRetourPrevu__lt=today, dateRetourEffectif__isnull=True)
+        )),
+        overdue=overdue,
+    )
+    emprunts["returned"] = rendus["returned"]
+    emprunts["late_returns"] = rendus["late_returns"]
+    emprunts["overdue"] += rendus["overdue"]
+
+    # Emprunts archivés (tous rendus) : ils comptent toujours dans l'historique des retours
+    archives = EmprunterArchive.objects.aggregate(
+        returned=Count("id"),
+        late_returns=Count("id", filter=Q(dateRetourEffectif__gt=F("dateRetourPrevu"))),
+    )
+    emprunts["returned"] += archives["returned"]
+    emprunts["late_returns"] += archives["late_returns"]
+    emprunts["overdue"] += archives["late_returns"]
+
+    # Somme des exemplaires - emprunts ouverts = somme des available_quantity()
+    total_exemplaires = Livre.objects.aggregate(
+        total=Coalesce(Sum("quantite"), 0)
+    )["total"]
+    total_disponibles = total_exemplaires - emprunts["active"] - emprunts["late"]
+
+    total_users = Etudiant.objects.filter(is_active=True).count()
+
+    # --- Emprunts par jour : un GROUP BY dateEmprunt sur la fenêtre ---
+    par_jour = dict(
+        Emprunter.objects
+        .filter(dateEmprunt__gte=last_week, dateEmprunt__lte=today)
+        .values_list("dateEmprunt")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    labels_last_7_days = []
+    loans_last_7_days = []
+    for i in range(7):
+        day = last_week + timedelta(days=i)
+        labels_last_7_days.append(day.strftime("%a"))  # Lun, Mar, ...
+        loans_last_7_days.append(par_jour.get(day, 0))
+
+    return {
+        "total_books": total_disponibles,
+        "active_loans": emprunts["active"],
+        "late_returns": emprunts["late_returns"],
+        "total_users": total_users,
+        "labels_last_7_days": labels_last_7_days,
+        "loans_last_7_days": loans_last_7_days,
+        "total_disponibles": total_disponibles,
+        # Exemplaires sortis : emprunts en cours et en retard (complément de total_disponibles)
+        "total_empruntes": emprunts["active"] + emprunts["late"],
+        "total_en_retard": emprunts["overdue"],
+        "loans_status": {
+            "late": emprunts["late"],
+            "returned": emprunts["returned"],
+            "active": emprunts["active"],
+        },
+    }
+
+
+def category_stats():
+    """Livres, exemplaires et emprunts en cours par catégorie (une requête)."""
+    categories = Categorie.objects.avec_statistiques().order_by("nom")
+    return [
+        {
+            "id": category.id,
+            "nom": category.nom,
+            "couleur": category.couleur,
+            "is_active": category.is_active,
+            "livres": category.nb_livres,
+            "exemplaires": category.nb_exemplaires,
+            "empruntes": category.nb_empruntes,
+            "disponibles": category.nb_exemplaires - category.nb_empruntes,
+        }
+        for category in categories
+    ]
@@ -1,3 +1,962 @@
-from django.test import TestCase
+import datetime
+import gzip
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from unittest import mock, skipIf
 
-# Create your tests here.
+import openpyxl
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, router
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template import Context, Template
+from django.template import base as template_base
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from books import archive, search
+from books.models import ActivityLog, ArchiveRun, Categorie, Ecole, Emprunter, EmprunterArchive, Etudiant, Livre
+from books.tests import Catalogue, test_settings
+
+from . import exports, metrics, profiling, reporting
+from .db import WAL_PRAGMAS, sqlite_pragmas
+from .imports import import_books, import_students
+from .jobs import run_job
+from .models import Job
+from .pagination import keyset_paginate
+from .stats import dashboard_stats
+
+BOOK_COLUMNS = ["isbn", "titre", "langue", "quantite", "nbre_pages", "editeur", "auteur", "categorie"]
+STUDENT_COLUMNS = ["matricule", "nom", "prenoms", "email", "telephone", "ecole", "dateNaiss", "actif"]
+
+
+def classeur(headers, rows):
+    """Fichier Excel en mémoire, comme un fichier déposé."""
+    wb = openpyxl.Workbook()
+    wb.active.append(headers)
+    for row in rows:
+        wb.active.append(row)
+    f = io.BytesIO()
+    wb.save(f)
+    f.seek(0)
+    return f
+
+
+def livre_row(i, **values):
+    row = dict(zip(BOOK_COLUMNS, [f"I{i:09d}", f"Livre {i}", "fr", 1, 100, "Éditeur", "Auteur", "Roman"]))
+    row.update(values)
+    return list(row.values())
+
+
+def etudiant_row(i, **values):
+    row = dict(zip(STUDENT_COLUMNS, [f"S{i:05d}", "Nom", "Prénom", "e@example.com", "0102030405", "ESATIC", "2001-02-03", "Oui"]))
+    row.update(values)
+    return list(row.values())
+
+
+# Tables qui grossissent sans limite : aucun parcours complet, même d'un index
+HOT_TABLES = ("books_emprunter", "books_activitylog")
+
+# « SCAN t », « SCAN t USING INDEX i », « SCAN t USING COVERING INDEX i »
+FULL_SCAN = re.compile(r"^SCAN (\w+)\b")
+
+
+class ReportingOnDefault:
+    """Les vues @reporting_view lisent la base de test, jamais un instantané réel."""
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch("app.reporting.snapshot_taken_at", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_login(self.admin)
+
+
+@test_settings
+class QueryPlanTests(ReportingOnDefault, Catalogue, TestCase):
+    """EXPLAIN QUERY PLAN des pages critiques : les tables chaudes passent par un index."""
+
+    URLS = [
+        "/dashboard/",
+        "/loans/",
+        "/loans/?status=active",
+        "/loans/?status=late",
+        "/users/",
+        "/users/?sort=late",
+        "/users/?loans=open",
+        "/returns_form/",
+        "/api/loans/open/?q=a",
+        "/history/",
+        "/history/?action_type=loan",
+        "/history/?date_from=2024-01-01&date_to=2024-12-31",
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        livre, etudiant = cls.livres[0], cls.etudiants[0]
+        cls.emprunter(cls, livre, etudiant, days_ago=10, status="late")
+        cls.emprunter(cls, livre, etudiant, days_ago=1)
+        cls.emprunter(cls, cls.livres[1], etudiant, days_ago=20, status="returned", dateRetourEffectif=cls.today)
+
+    def full_scans(self, sql):
+        # Tables chaudes et leurs alias de sous-requête (« books_emprunter" U0 »)
+        names = set(HOT_TABLES) | {
+            alias for table, alias in re.findall(r'"(\w+)" (?:AS )?"?([A-Z]\d+)\b', sql) if table in HOT_TABLES
+        }
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql)
+            plan = [row[3] for row in cursor.fetchall()]
+        # Seule exception : première page d'une liste sans filtre, lue dans
+        # l'ordre d'un index et arrêtée après LIMIT lignes
+        if " WHERE " not in sql and " LIMIT " in sql and not any("TEMP B-TREE" in line for line in plan):
+            plan = [line for line in plan if " USING " not in line]
+        return [line for line in plan if (scan := FULL_SCAN.match(line)) and scan.group(1) in names]
+
+    def test_no_full_scan_of_hot_tables(self):
+        for url in self.URLS:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                for query in queries.captured_queries:
+                    if query["sql"].startswith("SELECT"):
+                        self.assertEqual(self.full_scans(query["sql"]), [], query["sql"])
+
+    def test_full_scan_pattern(self):
+        self.assertTrue(FULL_SCAN.match("SCAN books_emprunter"))
+        self.assertTrue(FULL_SCAN.match("SCAN books_emprunter USING COVERING INDEX emprunt_status_dates_idx"))
+        self.assertFalse(FULL_SCAN.match("SEARCH books_emprunter USING INDEX emprunt_date_idx (dateEmprunt>?)"))
+
+
+@test_settings
+class DashboardStatsTests(Catalogue, TestCase):
+
+    def test_donut_slices_add_up_to_copies(self):
+        livre, etudiant = self.livres[0], self.etudiants[0]
+        self.emprunter(livre, etudiant, days_ago=1)
+        self.emprunter(livre, etudiant, days_ago=10, status="late")
+        self.emprunter(self.livres[1], etudiant, days_ago=3, status="returned", dateRetourEffectif=self.today)
+
+        stats = dashboard_stats()
+        self.assertEqual(stats["total_empruntes"], 2)
+        self.assertEqual(stats["total_disponibles"] + stats["total_empruntes"], sum(l.quantite for l in self.livres))
+        self.assertEqual(stats["loans_status"], {"active": 1, "late": 1, "returned": 1})
+
+    def test_matches_per_loan_computation(self):
+        self.emprunter(self.livres[0], self.etudiants[0], days_ago=2)
+        self.emprunter(self.livres[0], self.etudiants[1], days_ago=10, status="late")
+        # Rendus : l'un après la date prévue, l'autre à temps
+        self.emprunter(self.livres[1], self.etudiants[0], days_ago=12, status="returned", dateRetourEffectif=self.today)
+        self.emprunter(self.livres[2], self.etudiants[2], days_ago=3, status="returned", dateRetourEffectif=self.today)
+        Etudiant.objects.filter(pk=self.etudiants[2].pk).update(is_active=False)
+
+        stats = dashboard_stats()
+        loans = list(Emprunter.objects.all())
+        self.assertEqual(stats["total_books"], sum(l.quantite for l in self.livres) - 2)
+        self.assertEqual(stats["active_loans"], 1)
+        self.assertEqual(stats["late_returns"], 1)
+        self.assertEqual(stats["total_users"], 2)
+        self.assertEqual(stats["total_en_retard"], sum(loan.is_overdue() for loan in loans))
+        # Fenêtre de 7 jours se terminant aujourd'hui ; l'emprunt d'il y a 10 et 12 jours n'y est pas
+        self.assertEqual(stats["loans_last_7_days"], [0, 0, 0, 1, 1, 0, 0])
+        self.assertEqual(len(stats["labels_last_7_days"]), 7)
+
+    def test_query_count_independent_of_size(self):
+        with self.assertNumQueries(6):
+            dashboard_stats()
+        for i in range(3, 20):
+            livre = self.creer_livre(f"{i:010d}", f"Livre {i}")
+            self.emprunter(livre, self.etudiants[i % 3], days_ago=i, status="late" if i > 7 else "active")
+        with self.assertNumQueries(6):
+            dashboard_stats()
+
+    def test_dashboard_follows_writes_despite_fresh_snapshot(self):
+        """Les indicateurs sont lus sur « default », même si un instantané récent existe."""
+        self.client.force_login(self.admin)
+        livre = self.livres[0]
+        loan = self.emprunter(livre, self.etudiants[0])
+        Livre.objects.filter(pk=livre.pk).update(copies_out=1)
+        with mock.patch("app.reporting.snapshot_taken_at", return_value=timezone.now()):
+            response = self.client.get("/dashboard/")
+            self.assertEqual(response.context["active_loans"], 1)
+            self.assertEqual(response.context["total_empruntes"], 1)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post("/returns_form/", {
+                    "loan": loan.pk, "return_date": self.today, "condition": "bon", "notes": "",
+                })
+            response = self.client.get("/dashboard/")
+            self.assertEqual(response.context["active_loans"], 0)
+            self.assertEqual(response.context["total_empruntes"], 0)
+            categories = self.client.get("/api/categories/stats/").json()
+        self.assertEqual(sum(c["empruntes"] for c in categories["results"]), 0)
+
+
+@test_settings
+class CategoryStatsTests(Catalogue, TestCase):
+    """Catégories : livres, exemplaires et emprunts en cours annotés en un GROUP BY."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.vide = Categorie.objects.create(nom="Vide", description="-", icone="book", couleur="#000000")
+        cls.roman = Categorie.objects.create(nom="Roman", description="-", icone="book", couleur="#654321")
+        cls.creer_livre("9999999999", "Roman", quantite=4, categorie=cls.roman)
+        Livre.objects.filter(pk=cls.livres[0].pk).update(copies_out=2)
+        Livre.objects.filter(isbn="9999999999").update(copies_out=1)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_annotations(self):
+        for categorie in Categorie.objects.avec_statistiques():
+            livres = Livre.objects.filter(categorie=categorie)
+            with self.subTest(categorie=categorie.nom):
+                self.assertEqual(categorie.nb_livres, categorie.livres())
+                self.assertEqual(categorie.nb_exemplaires, sum(l.quantite for l in livres))
+                self.assertEqual(categorie.nb_empruntes, sum(l.copies_out for l in livres))
+        vide = Categorie.objects.avec_statistiques().get(pk=self.vide.pk)
+        self.assertEqual((vide.nb_livres, vide.nb_exemplaires, vide.nb_empruntes), (0, 0, 0))
+
+    def test_list_query_count(self):
+        def queries():
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(self.client.get("/categories/").status_code, 200)
+            return len(captured)
+
+        before = queries()
+        # Nouvelle version des catégories : le fragment en cache est recalculé
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(5):
+                Categorie.objects.create(nom=f"Autre {i}", description="-", icone="book", couleur="#000000")
+        self.assertEqual(queries(), before)
+
+    def test_api_follows_writes(self):
+        def poesie():
+            results = self.client.get("/api/categories/stats/").json()["results"]
+            return next(r for r in results if r["id"] == self.categorie.pk)
+
+        self.assertEqual((poesie()["exemplaires"], poesie()["disponibles"]), (6, 4))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.creer_livre("8888888888", "Nouveau", quantite=3)
+        self.assertEqual((poesie()["livres"], poesie()["disponibles"]), (4, 7))
+
+
+@test_settings
+class UsersListCountTests(ReportingOnDefault, Catalogue, TestCase):
+    """Le total de /users/ est compté sans les sous-requêtes des compteurs d'emprunts."""
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, [q["sql"] for q in queries.captured_queries if q["sql"].startswith("SELECT COUNT(")]
+
+    def test_count_without_loan_counters(self):
+        response, counts = self.count_queries("/users/?search=Nom")
+        self.assertEqual(response.context["page_obj"].count, len(self.etudiants))
+        self.assertEqual(len(counts), 1)
+        self.assertNotIn("books_emprunter", counts[0])
+
+    def test_loans_filter(self):
+        self.emprunter(self.livres[0], self.etudiants[0], days_ago=10, status="late")
+        self.emprunter(self.livres[1], self.etudiants[1])
+        for loans, expected in (("open", 2), ("late", 1), ("none", 1)):
+            with self.subTest(loans=loans):
+                response, counts = self.count_queries(f"/users/?loans={loans}")
+                self.assertEqual(response.context["page_obj"].count, expected)
+                self.assertEqual(len(response.context["page_obj"]), expected)
+                # Un EXISTS pour le filtre, jamais le total des emprunts archivés
+                self.assertNotIn("books_emprunterarchive", counts[0])
+
+
+@test_settings
+class LoanViewsCopiesOutTests(Catalogue, TestCase):
+    """copies_out suit les emprunts, retours et suppressions faits depuis les vues."""
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.livre = self.livres[0]
+
+    def copies_out(self):
+        return Livre.objects.get(pk=self.livre.pk).copies_out
+
+    def emprunter_via_vue(self, etudiant):
+        self.client.post("/loans/add/", {
+            "user": etudiant.matricule, "book": self.livre.isbn, "borrow_date": self.today,
+            "due_date": self.today + datetime.timedelta(days=7), "notes": "",
+        })
+        return Emprunter.objects.filter(etudiant=etudiant, livre=self.livre).latest("id")
+
+    def rendre(self, loan):
+        return self.client.post("/returns_form/", {
+            "loan": loan.id, "return_date": self.today, "condition": "good", "notes": "",
+        })
+
+    def test_loan_and_return(self):
+        loans = [self.emprunter_via_vue(etudiant) for etudiant in self.etudiants[:2]]
+        self.assertEqual(self.copies_out(), 2)
+        self.rendre(loans[0])
+        self.assertEqual(self.copies_out(), 1)
+        # Un second retour du même emprunt ne libère rien
+        self.rendre(loans[0])
+        self.assertEqual(self.copies_out(), 1)
+
+    def test_stale_return_changes_nothing(self):
+        loan = self.emprunter_via_vue(self.etudiants[0])
+        self.rendre(loan)
+        # Second retour concurrent : l'emprunt lu avant le premier commit était encore ouvert
+        with mock.patch("app.views.get_object_or_404", return_value=loan):
+            response = self.client.post("/returns_form/", {
+                "loan": loan.id, "return_date": self.today - datetime.timedelta(days=1), "condition": "bad", "notes": "x",
+            })
+        self.assertRedirects(response, "/loans/", fetch_redirect_response=False)
+        self.assertEqual(self.copies_out(), 0)
+        loan.refresh_from_db()
+        self.assertEqual((loan.dateRetourEffectif, loan.etat_livre), (self.today, "good"))
+
+    def test_delete_open_then_returned(self):
+        ouvert = self.emprunter_via_vue(self.etudiants[0])
+        rendu = self.emprunter_via_vue(self.etudiants[1])
+        self.rendre(rendu)
+        self.client.post(f"/loans/delete/{rendu.id}/")
+        self.assertEqual(self.copies_out(), 1)
+        self.client.post(f"/loans/delete/{ouvert.id}/")
+        self.assertEqual(self.copies_out(), 0)
+
+    def test_student_delete_cascades(self):
+        for _ in range(2):
+            self.emprunter_via_vue(self.etudiants[0])
+        self.emprunter_via_vue(self.etudiants[1])
+        self.client.post(f"/users/delete/{self.etudiants[0].matricule}/")
+        self.assertEqual(self.copies_out(), 1)
+
+
+@test_settings
+class AvailableBooksTests(Catalogue, TestCase):
+    """Livre.objects.disponibles() : filtre SQL paresseux, servi page par page au formulaire d'emprunt."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for i in range(3, 14):
+            cls.creer_livre(f"{i:010d}", f"Manuel {i:02d}", quantite=1)
+        # Tous les exemplaires sortis : absent des livres disponibles
+        Livre.objects.filter(isbn=f"{3:010d}").update(copies_out=1)
+        Livre.objects.filter(pk=cls.livres[0].pk).update(copies_out=1)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_disponibles(self):
+        livres = Livre.objects.disponibles()
+        self.assertNotIn(f"{3:010d}", livres.values_list("isbn", flat=True))
+        self.assertEqual(livres.count(), 13)
+        for livre in livres:
+            self.assertEqual(livre.disponible, livre.available_quantity())
+        self.assertEqual(Livre.objects.disponibles().get(pk=self.livres[0].pk).disponible, 1)
+
+    def test_api_pages(self):
+        pages = [self.client.get("/api/books/available/", {"page": page}).json() for page in (1, 2)]
+        self.assertEqual([len(page["results"]) for page in pages], [10, 3])
+        self.assertEqual([page["has_next"] for page in pages], [True, False])
+        found = self.client.get("/api/books/available/", {"q": "manuel 1"}).json()["results"]
+        self.assertEqual(sorted(r["titre"] for r in found), [f"Manuel {i}" for i in range(10, 14)])
+
+    def test_form_renders_first_page(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/loans/add/")
+        self.assertEqual(len(response.context["available_books"]), 10)
+        self.assertEqual(response.context["available_books_count"], 13)
+        # Jamais tout le catalogue : une page (LIMIT) et un COUNT
+        for query in queries.captured_queries:
+            if 'FROM "books_livre"' in query["sql"]:
+                self.assertRegex(query["sql"], r"LIMIT|COUNT")
+
+
+@test_settings
+class OpenLoansTests(Catalogue, TestCase):
+    """Formulaire de retour et /api/loans/open/ : emprunts ouverts joints, une requête par page."""
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.loans = [
+            self.emprunter(self.livres[i % 3], self.etudiants[i % 3], days_ago=i, status="late" if i > 9 else "active")
+            for i in range(12)
+        ]
+        self.emprunter(self.livres[0], self.etudiants[0], days_ago=3, status="returned", dateRetourEffectif=self.today)
+
+    def test_returns_form_query_count(self):
+        def queries(url):
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(url)
+            return response, len(captured)
+
+        response, count = queries("/returns_form/")
+        self.assertEqual(len(response.context["active_loans"]), 10)
+        self.assertEqual(response.context["active_loans_count"], 12)
+        # Emprunt présélectionné hors de la première page : une requête de plus, sans N+1
+        last = max(self.loans, key=lambda loan: (loan.dateRetourPrevu, loan.id))
+        response, preselected = queries(f"/returns_form/?loan={last.id}")
+        self.assertIn(last.id, [loan.id for loan in response.context["active_loans"]])
+        self.assertEqual(preselected, count + 1)
+
+        for i in range(5):
+            self.emprunter(self.livres[1], self.etudiants[2], days_ago=i)
+        self.assertEqual(queries("/returns_form/")[1], count)
+
+    def test_api(self):
+        pages = [self.client.get("/api/loans/open/", {"page": page}).json() for page in (1, 2)]
+        results = [r for page in pages for r in page["results"]]
+        self.assertEqual(sorted(r["id"] for r in results), sorted(loan.id for loan in self.loans))
+        self.assertEqual([page["has_next"] for page in pages], [True, False])
+        overdue = {loan.id: loan.status == "late" or loan.is_overdue() for loan in self.loans}
+        self.assertEqual({r["id"]: r["en_retard"] for r in results}, overdue)
+
+        by_matricule = self.client.get("/api/loans/open/", {"q": "m0001"}).json()["results"]
+        self.assertEqual({r["matricule"] for r in by_matricule}, {"M0001"})
+        by_title = self.client.get("/api/loans/open/", {"q": "retour 2"}).json()["results"]
+        self.assertEqual({r["livre"] for r in by_title}, {self.livres[2].titre})
+
+
+@test_settings
+class LoanFormStudentsTests(Catalogue, TestCase):
+    """Le formulaire d'emprunt ne rend qu'une page d'étudiants actifs, la suite vient de search_students."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for i in range(3, 15):
+            Etudiant.objects.create(
+                matricule=f"M{i:04d}", nom=f"Nom{i}", prenoms="Prénom", dateNaiss="2000-01-01",
+                telephone="0102030405", emailPers=f"p{i}@example.com", emailInst=f"i{i}@example.com",
+                numChambre="A1", ecole=cls.ecole, is_active=i != 14,
+            )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_first_page_only(self):
+        response = self.client.get("/loans/add/")
+        self.assertEqual(len(response.context["users"]), 10)
+        self.assertEqual(response.context["users_count"], 14)
+        self.assertContains(response, 'id="user_more"')
+
+    def test_edit_keeps_inactive_borrower(self):
+        loan = self.emprunter(self.livres[0], Etudiant.objects.get(matricule="M0014"))
+        response = self.client.get(f"/loans/edit/{loan.pk}/")
+        self.assertContains(response, '<option value="M0014" selected>')
+
+    def test_search_students(self):
+        pages = [self.client.get("/api/students/search/", {"page": page}).json() for page in (1, 2)]
+        self.assertEqual([len(page["results"]) for page in pages], [10, 4])
+        self.assertEqual([page["has_next"] for page in pages], [True, False])
+        matricules = [r["matricule"] for page in pages for r in page["results"]]
+        self.assertNotIn("M0014", matricules)
+        found = self.client.get("/api/students/search/", {"q": "nom12"}).json()["results"]
+        self.assertEqual([r["matricule"] for r in found], ["M0012"])
+
+
+@test_settings
+class KeysetPaginationTests(Catalogue, TestCase):
+    """Parcours page à page par curseur, avec et sans table d'archive."""
+
+    PER_PAGE = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        livre, etudiant = cls.livres[0], cls.etudiants[0]
+        # Plusieurs emprunts le même jour : l'id départage les ex aequo
+        for days_ago in (1, 1, 1, 3, 5, 5, 8, 40, 40, 45, 50, 50, 60):
+            status = "returned" if days_ago >= 40 else "active"
+            cls.emprunter(cls, livre, etudiant, days_ago=days_ago, status=status,
+                          dateRetourEffectif=cls.today if status == "returned" else None)
+        cls.ordre = list(Emprunter.objects.order_by("-dateEmprunt", "-id").values_list("id", flat=True))
+
+    def parcourir(self, queryset, **kwargs):
+        """Pages suivantes jusqu'à la fin, puis précédentes jusqu'au début."""
+        ordering = ["-dateEmprunt", "-id"]
+        pages = [keyset_paginate(queryset, ordering, per_page=self.PER_PAGE, **kwargs)]
+        while pages[-1].has_next():
+            pages.append(keyset_paginate(queryset, ordering, pages[-1].next_cursor, per_page=self.PER_PAGE, **kwargs))
+
+        retour = [pages[-1]]
+        while retour[-1].has_previous():
+            retour.append(keyset_paginate(
+                queryset, ordering, retour[-1].previous_cursor, per_page=self.PER_PAGE, **kwargs
+            ))
+        self.assertEqual(
+            [[obj.id for obj in page] for page in retour[::-1]],
+            [[obj.id for obj in page] for page in pages],
+        )
+        return pages
+
+    def ids(self, pages):
+        return [obj.id for page in pages for obj in page]
+
+    def test_forward_and_backward(self):
+        pages = self.parcourir(Emprunter.objects.all())
+        self.assertEqual(self.ids(pages), self.ordre)
+        self.assertEqual(pages[0].count, len(self.ordre))
+        self.assertTrue(pages[0].count_exact)
+
+    def test_tampered_cursor_returns_first_page(self):
+        page = keyset_paginate(Emprunter.objects.all(), ["-dateEmprunt", "-id"], "faux:curseur", per_page=self.PER_PAGE)
+        self.assertEqual([obj.id for obj in page], self.ordre[:self.PER_PAGE])
+        self.assertFalse(page.has_previous())
+
+    def test_count_limit(self):
+        page = keyset_paginate(Emprunter.objects.all(), ["-dateEmprunt", "-id"], per_page=self.PER_PAGE, count_limit=5)
+        self.assertEqual((page.count, page.count_exact), (5, False))
+
+    def test_archive_merge(self):
+        before = self.today - datetime.timedelta(days=30)
+        archive.archive(before, batch_size=2)
+        self.assertEqual(EmprunterArchive.objects.count(), 6)
+
+        kwargs = {
+            "archive": EmprunterArchive.objects.all(),
+            "archive_before": ArchiveRun.archived_before(EmprunterArchive),
+        }
+        pages = self.parcourir(Emprunter.objects.all(), **kwargs)
+        # Mêmes ids qu'avant l'archivage, dans le même ordre, sans doublon
+        self.assertEqual(self.ids(pages), self.ordre)
+        self.assertEqual(pages[0].count, len(self.ordre))
+        self.assertTrue(any(obj.is_archived for obj in pages[-1]))
+
+    def test_archive_not_read_above_bound(self):
+        archive.archive(self.today - datetime.timedelta(days=30))
+        archive_before = ArchiveRun.archived_before(EmprunterArchive)
+        with CaptureQueriesContext(connection) as queries:
+            keyset_paginate(
+                Emprunter.objects.all(), ["-dateEmprunt", "-id"], per_page=self.PER_PAGE,
+                archive=EmprunterArchive.objects.all(), archive_before=archive_before,
+            )
+        # Seul le total compte les lignes archivées, la page ne les lit pas
+        archive_reads = [q["sql"] for q in queries.captured_queries if "books_emprunterarchive" in q["sql"]]
+        self.assertEqual(len(archive_reads), 1)
+        self.assertIn("COUNT(", archive_reads[0])
+
+    def test_loans_list_view_reaches_archive(self):
+        archive.archive(self.today - datetime.timedelta(days=30))
+        self.client.force_login(self.admin)
+        ids, cursor = [], ""
+        with mock.patch("app.reporting.snapshot_taken_at", return_value=None):
+            while True:
+                response = self.client.get("/loans/", {"cursor": cursor} if cursor else {})
+                page = response.context["page_obj"]
+                ids += [obj.id for obj in page]
+                if not page.has_next():
+                    break
+                cursor = page.next_cursor
+        self.assertEqual(ids, self.ordre)
+
+
+@test_settings
+class ImportErrorTests(TestCase):
+    """Lignes invalides, dry_run et échec en cours d'écriture."""
+
+    def test_students_invalid_row_writes_nothing(self):
+        rows = [etudiant_row(0), etudiant_row(1, dateNaiss="03/02/2001"), etudiant_row(2, nom="")]
+        result = import_students(classeur(STUDENT_COLUMNS, rows))
+        self.assertEqual([line_no for line_no, _ in result.errors], [3, 4])
+        self.assertFalse(result.committed)
+        self.assertFalse(Etudiant.objects.exists())
+
+    def test_students_dry_run(self):
+        result = import_students(classeur(STUDENT_COLUMNS, [etudiant_row(i) for i in range(3)]), dry_run=True)
+        self.assertEqual((result.created, result.updated, result.errors, result.committed), (3, 0, [], False))
+        self.assertFalse(Etudiant.objects.exists())
+        self.assertFalse(Ecole.objects.exists())
+
+    def test_students_created_and_updated(self):
+        import_students(classeur(STUDENT_COLUMNS, [etudiant_row(i) for i in range(2)]))
+        rows = [etudiant_row(i, nom="Renommé") for i in range(4)]
+        for dry_run in (True, False):
+            with self.subTest(dry_run=dry_run):
+                result = import_students(classeur(STUDENT_COLUMNS, rows), dry_run=dry_run)
+                self.assertEqual((result.created, result.updated), (2, 2))
+        self.assertEqual(Etudiant.objects.filter(nom="Renommé").count(), 4)
+
+    def test_students_write_failure_rolls_back(self):
+        with mock.patch.object(Etudiant.objects, "bulk_create", side_effect=RuntimeError("disque plein")):
+            with self.assertRaises(RuntimeError):
+                import_students(classeur(STUDENT_COLUMNS, [etudiant_row(i) for i in range(3)]))
+        # L'école créée dans la même transaction est annulée elle aussi
+        self.assertFalse(Ecole.objects.exists())
+
+    def test_missing_columns(self):
+        with self.assertRaisesMessage(ValueError, "Colonnes manquantes : actif"):
+            import_students(classeur(STUDENT_COLUMNS[:-1], [etudiant_row(0)[:-1]]))
+        with self.assertRaisesMessage(ValueError, "Le fichier est vide."):
+            import_books(classeur([], []))
+
+    def test_books_invalid_rows_skipped(self):
+        rows = [livre_row(0), livre_row(1, quantite="beaucoup"), livre_row(2, titre=None), livre_row(3)]
+        result = import_books(classeur(BOOK_COLUMNS, rows))
+        self.assertEqual([line_no for line_no, _ in result.errors], [3, 4])
+        self.assertEqual((result.created, result.updated), (2, 0))
+        self.assertEqual(sorted(Livre.objects.values_list("isbn", flat=True)), [livre_row(0)[0], livre_row(3)[0]])
+
+    def test_books_write_failure_rolls_back(self):
+        real_bulk_update = Livre.objects.bulk_update
+        import_books(classeur(BOOK_COLUMNS, [livre_row(0)]))
+
+        def bulk_update(*args, **kwargs):
+            real_bulk_update(*args, **kwargs)
+            raise RuntimeError("interruption")
+
+        rows = [livre_row(0, titre="Modifié")] + [livre_row(i) for i in range(1, 5)]
+        with mock.patch.object(Livre.objects, "bulk_update", side_effect=bulk_update):
+            with self.assertRaises(RuntimeError):
+                import_books(classeur(BOOK_COLUMNS, rows), batch_size=2)
+        # Tout ou rien : ni les livres créés ni la mise à jour ne restent
+        self.assertEqual(list(Livre.objects.values_list("isbn", "titre")), [(livre_row(0)[0], livre_row(0)[1])])
+        self.assertFalse(search.search_livres(Livre.objects.all(), "Livre 3").exists())
+
+    def test_books_quantity_below_copies_out(self):
+        import_books(classeur(BOOK_COLUMNS, [livre_row(0, quantite=3), livre_row(1, quantite=3)]))
+        Livre.objects.update(copies_out=2)
+        result = import_books(classeur(BOOK_COLUMNS, [livre_row(0, quantite=1), livre_row(1, quantite=2)]))
+        self.assertEqual([line_no for line_no, _ in result.errors], [2])
+        self.assertEqual(result.updated, 1)
+        self.assertEqual(dict(Livre.objects.values_list("isbn", "quantite")), {livre_row(0)[0]: 3, livre_row(1)[0]: 2})
+
+
+@test_settings
+class JobTests(Catalogue, TestCase):
+    """Tâches de fond : visibles de leur auteur (et du staff), fichier déposé gardé après un échec."""
+
+    def setUp(self):
+        self.tmp = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.export = self.tmp / "abc_livres.xlsx"
+        self.export.write_bytes(b"xlsx")
+        self.job = Job.objects.create(kind="export_books", status="done", result_file=str(self.export),
+                                      created_by=self.admin)
+        self.autre = User.objects.create_user("autre", password="autre")
+
+    def test_other_user_cannot_see_job(self):
+        self.client.force_login(self.autre)
+        self.assertEqual(self.client.get(f"/jobs/{self.job.pk}/status/").status_code, 404)
+        self.assertEqual(self.client.get(f"/jobs/{self.job.pk}/download/").status_code, 404)
+        self.assertNotContains(self.client.get("/jobs/"), f"/jobs/{self.job.pk}/")
+
+    def test_owner_and_staff(self):
+        self.job.created_by = self.autre
+        self.job.save()
+        for user in (self.autre, self.admin):
+            with self.subTest(user=user.username):
+                self.client.force_login(user)
+                self.assertEqual(self.client.get(f"/jobs/{self.job.pk}/status/").status_code, 200)
+                response = self.client.get(f"/jobs/{self.job.pk}/download/")
+                self.assertEqual(b"".join(response.streaming_content), b"xlsx")
+
+    def run_import(self, content):
+        upload = self.tmp / "etudiants.xlsx"
+        upload.write_bytes(content)
+        job = run_job(Job.objects.create(kind="import_students", status="running", input_file=str(upload)))
+        return job, upload
+
+    def test_input_kept_after_failure(self):
+        job, upload = self.run_import(b"pas un classeur")
+        self.assertEqual(job.status, "failed")
+        self.assertTrue(upload.exists())
+
+    def test_input_deleted_after_success(self):
+        job, upload = self.run_import(classeur(STUDENT_COLUMNS, [etudiant_row(0)]).getvalue())
+        self.assertEqual(job.status, "done", job.message)
+        self.assertFalse(upload.exists())
+
+
+@test_settings
+class ExportStreamingTests(ReportingOnDefault, Catalogue, TestCase):
+    """Exports diffusés : le premier morceau part avant la fin de la lecture des lignes."""
+
+    def lent(self, consumed, n=2000):
+        for i in range(n):
+            consumed.append(i)
+            yield [f"{i:010d}", f"Titre {i} & <co>", "fr", i, 100]
+
+    def test_first_chunk_before_last_row(self):
+        headers = exports.BOOK_HEADERS[:5]
+        for name, stream in (("csv", lambda rows: exports.stream_csv("livres.csv", headers, rows)),
+                             ("xlsx", lambda rows: exports.stream_xlsx("livres.xlsx", "Livres", headers, rows))):
+            with self.subTest(format=name), mock.patch.object(exports, "XLSX_CHUNK_BYTES", 1024):
+                consumed = []
+                response = stream(self.lent(consumed))
+                self.assertTrue(response.streaming)
+                chunks = iter(response.streaming_content)
+                next(chunks)
+                self.assertLess(len(consumed), 2000)
+                b"".join(chunks)
+                self.assertEqual(len(consumed), 2000)
+
+    def test_books_csv(self):
+        response = self.client.get("/books/export/excel/?format=csv")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], ",".join(exports.BOOK_HEADERS))
+        self.assertEqual(len(lines), 1 + len(self.livres))
+
+    def test_xlsx_round_trip(self):
+        for url, func in (("/books/export/excel/", import_books), ("/users/export/excel/", import_students)):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response["Content-Type"], exports.XLSX_CONTENT_TYPE)
+                # Le classeur exporté se réimporte tel quel : tout est mis à jour, rien n'est créé
+                result = func(io.BytesIO(b"".join(response.streaming_content)))
+                self.assertEqual((result.created, result.updated, result.errors), (0, 3, []))
+
+    def test_xlsx_cells(self):
+        rows = [["0000000001", "A & <b> \x01", "", None, 7, 2.5]]
+        data = b"".join(exports.xlsx_chunks("Feuille", ["a", "b", "c", "d", "e", "f"], rows))
+        sheet = openpyxl.load_workbook(io.BytesIO(data), read_only=True).active
+        self.assertEqual(sheet.title, "Feuille")
+        self.assertEqual(list(sheet.iter_rows(values_only=True))[1], ("0000000001", "A & <b> ", None, None, 7, 2.5))
+
+
+@test_settings
+class HistoryExportTests(ReportingOnDefault, Catalogue, TestCase):
+    """L'export CSV de l'historique reprend exactement les filtres et l'ordre de la page."""
+
+    FILTERS = [
+        {},
+        {"search": "kouassi"},
+        {"action_type": "loan"},
+        {"date_to": "{old}"},
+        {"search": "ancien", "action_type": "delete"},
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        now = timezone.now()
+        for days, action_type, title in (
+            (1, "loan", "Emprunt Kouassi"), (2, "update", "Modification"), (3, "return", "Retour Kouassi"),
+            (40, "loan", "Emprunt ancien"), (45, "delete", "Suppression ancienne"),
+        ):
+            entry = ActivityLog.objects.create(action_type=action_type, title=title, description="-", user="admin")
+            ActivityLog.objects.filter(pk=entry.pk).update(timestamp=now - datetime.timedelta(days=days))
+        # Les entrées de plus de 30 jours passent dans l'archive
+        archive.archive(cls.today - datetime.timedelta(days=30))
+
+    def filters(self):
+        old = (self.today - datetime.timedelta(days=35)).isoformat()
+        return [{name: value.format(old=old) for name, value in f.items()} for f in self.FILTERS]
+
+    def csv(self, filters, **extra):
+        return self.client.get("/history_export/", {**filters, **extra})
+
+    def test_same_rows_as_page(self):
+        for filters in self.filters():
+            with self.subTest(filters=filters):
+                page = [a.title for a in self.client.get("/history/", filters).context["activities"]]
+                rows = b"".join(self.csv(filters).streaming_content).decode().splitlines()[1:]
+                self.assertTrue(page)
+                self.assertEqual([row.split(",")[2] for row in rows], page)
+
+    def test_gzip(self):
+        filters = {"action_type": "loan"}
+        response = self.csv(filters, gzip="1")
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertIn('historique.csv.gz"', response["Content-Disposition"])
+        plain = b"".join(self.csv(filters).streaming_content)
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), plain)
+
+
+@test_settings
+class ImportProgressTests(TestCase):
+    """progress() est appelé hors de toute transaction ouverte par l'import."""
+
+    def depth_at_progress(self, func, excel_file, **kwargs):
+        baseline = len(connection.atomic_blocks)  # blocs ouverts par TestCase
+        depths = []
+        func(excel_file, batch_size=2, progress=lambda n: depths.append(len(connection.atomic_blocks) - baseline), **kwargs)
+        return depths
+
+    def test_books_progress_while_reading(self):
+        depths = self.depth_at_progress(import_books, classeur(BOOK_COLUMNS, [livre_row(i) for i in range(5)]))
+        self.assertEqual(depths, [0, 0, 0])
+
+    def test_students_validate_outside_transaction(self):
+        depths = self.depth_at_progress(import_students, classeur(STUDENT_COLUMNS, [etudiant_row(i) for i in range(5)]))
+        self.assertEqual(depths, [0, 0, 0])
+
+
+@test_settings
+class MetricsAccessTests(Catalogue, TestCase):
+    """/metrics : staff ou jeton ; les adresses autorisées sont une option explicite."""
+
+    def get(self, **headers):
+        return self.client.get("/metrics", **headers)
+
+    def test_anonymous_localhost_denied_by_default(self):
+        # Derrière un proxy inverse, toute requête arrive de 127.0.0.1
+        self.assertEqual(self.get(REMOTE_ADDR="127.0.0.1").status_code, 404)
+
+    def test_staff(self):
+        self.client.force_login(self.admin)
+        self.assertEqual(self.get().status_code, 200)
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_bearer_token(self):
+        self.assertEqual(self.get(HTTP_AUTHORIZATION="Bearer s3cret").status_code, 200)
+        self.assertEqual(self.get(HTTP_AUTHORIZATION="Bearer autre").status_code, 404)
+        self.assertEqual(self.get(HTTP_AUTHORIZATION="Basic s3cret").status_code, 404)
+
+    @override_settings(METRICS_ALLOWED_IPS=["10.0.0.5"])
+    def test_configured_address(self):
+        self.assertEqual(self.get(REMOTE_ADDR="10.0.0.5").status_code, 200)
+        self.assertEqual(self.get(REMOTE_ADDR="127.0.0.1").status_code, 404)
+
+
+class MetricsFilesTests(SimpleTestCase):
+    """Fichiers de METRICS_DIR : un pid réutilisé ou un processus arrêté ne fait pas baisser les compteurs."""
+
+    LOANS = ("library_loans_total", ())
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.dir = Path(directory.name)
+        for patcher in (
+            mock.patch.object(settings, "METRICS_DIR", self.dir),
+            mock.patch.object(metrics, "_zones", [{self.LOANS: 3}]),
+            mock.patch.object(metrics, "_process", None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def stopped_pid(self):
+        process = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+        return int(process.stdout)
+
+    def test_tests_write_no_metrics_file(self):
+        with override_settings(METRICS_DIR=None):
+            metrics.flush()
+            self.assertEqual(metrics.collect(), {self.LOANS: 3})
+        self.assertEqual(list(self.dir.iterdir()), [])
+
+    def test_reused_pid_keeps_totals(self):
+        metrics.flush()
+        metrics._process = None  # nouveau processus, même pid
+        metrics.flush()
+        self.assertEqual(len(list(self.dir.glob("*.json"))), 2)
+        self.assertEqual(metrics.collect()[self.LOANS], 6)
+
+    @skipIf(metrics.fcntl is None, "regroupement sous verrou fcntl")
+    def test_stopped_processes_compacted(self):
+        pid = self.stopped_pid()
+        for name in (f"{pid}-1.json", f"{pid}.json", f"{os.getppid()}-1.json"):
+            (self.dir / name).write_text(json.dumps([["library_loans_total", {}, 2]]))
+        metrics.flush()
+        for _ in range(2):
+            metrics.compact()
+            self.assertEqual(metrics.collect()[self.LOANS], 9)
+        self.assertEqual(
+            sorted(path.name for path in self.dir.glob("*.json")),
+            sorted([metrics.STOPPED_FILE, f"{os.getppid()}-1.json", metrics._process_file()]),
+        )
+
+
+class ReportingViewTests(SimpleTestCase):
+    """@reporting_view lit l'instantané s'il est assez récent, « default » sinon."""
+
+    def call(self, taken_at, streaming=False):
+        seen = []
+
+        def rows():
+            for _ in range(2):
+                seen.append(router.db_for_read(Livre))
+                yield b"x"
+
+        @reporting.reporting_view
+        def view(request):
+            seen.append(router.db_for_read(Livre))
+            return StreamingHttpResponse(rows()) if streaming else HttpResponse()
+
+        request = RequestFactory().get("/")
+        with mock.patch.object(reporting, "snapshot_taken_at", return_value=taken_at):
+            response = view(request)
+        if streaming:
+            b"".join(response.streaming_content)
+        return seen, getattr(request, "snapshot_taken_at", None)
+
+    def test_fresh_snapshot(self):
+        taken_at = timezone.now() - datetime.timedelta(seconds=reporting.REPORTING_MAX_STALENESS - 60)
+        self.assertEqual(self.call(taken_at), ([reporting.REPORTING_DATABASE], taken_at))
+        # Lectures hors de la vue : de nouveau sur « default »
+        self.assertEqual(router.db_for_read(Livre), "default")
+        # Auth et sessions ne sont jamais redirigées
+        token = reporting._reporting.set(reporting.REPORTING_DATABASE)
+        try:
+            self.assertEqual(router.db_for_read(Livre), reporting.REPORTING_DATABASE)
+            self.assertEqual(router.db_for_read(User), "default")
+        finally:
+            reporting._reporting.reset(token)
+
+    def test_streamed_rows_read_snapshot(self):
+        seen, _ = self.call(timezone.now(), streaming=True)
+        self.assertEqual(seen, [reporting.REPORTING_DATABASE] * 3)
+
+    def test_stale_or_missing_snapshot(self):
+        stale = timezone.now() - datetime.timedelta(seconds=reporting.REPORTING_MAX_STALENESS + 60)
+        for taken_at in (None, stale):
+            with self.subTest(taken_at=taken_at):
+                self.assertEqual(self.call(taken_at, streaming=True), (["default"] * 3, None))
+
+
+class ProfilingTemplateTests(SimpleTestCase):
+    """Template._render n'est remplacé que le temps d'une requête échantillonnée."""
+
+    def profile(self, rate):
+        seen = []
+
+        def view(request):
+            seen.append(template_base.Template._render)
+            return HttpResponse(Template("{{ x }}").render(Context({"x": 1})))
+
+        with mock.patch.object(profiling, "PROFILING_TEMPLATE_SAMPLE_RATE", rate), \
+                mock.patch.object(profiling, "logger"), mock.patch.object(profiling, "recent", []):
+            profiling.ProfilingMiddleware(view)(RequestFactory().get("/"))
+            return seen[0], profiling.recent[0]
+
+    def test_sampled_request(self):
+        before = template_base.Template._render
+        render, record = self.profile(1.0)
+        self.assertIs(render, profiling._timed_render)
+        self.assertIsNotNone(record["template_ms"])
+        # Méthode remplacée remise en place (ici l'instrumentation des tests)
+        self.assertIs(template_base.Template._render, before)
+
+    def test_unsampled_request(self):
+        before = template_base.Template._render
+        render, record = self.profile(0.0)
+        self.assertIs(render, before)
+        self.assertIsNone(record["template_ms"])
+
+
+class SQLiteSettingsTests(TestCase):
+
+    def test_wal_only_when_configured(self):
+        # WAL réécrit le fichier de la base : jamais appliqué sans demande du déploiement
+        with override_settings(SQLITE_PRAGMAS={}):
+            self.assertNotIn("journal_mode", sqlite_pragmas())
+        with override_settings(SQLITE_PRAGMAS=WAL_PRAGMAS):
+            self.assertEqual(sqlite_pragmas()["journal_mode"], "wal")
+
+    def test_lock_wait_follows_options_timeout(self):
+        # Aucun PRAGMA busy_timeout ne doit écraser OPTIONS['timeout']
+        timeout = connection.settings_dict["OPTIONS"].get("timeout", 5)
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], int(timeout * 1000))
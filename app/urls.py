@@ -8,6 +8,10 @@ urlpatterns = [
     path('dashboard/', views.dash, name="dashboard"),
     path('api/authors/search/', views.search_authors, name='search_authors'),
     path('api/publishers/search/', views.search_publishers, name='search_publishers'),
+    path('api/books/available/', views.search_available_books, name='search_available_books'),
+    path('api/students/search/', views.search_students, name='search_students'),
+    path('api/loans/open/', views.search_open_loans, name='search_open_loans'),
+    path('api/categories/stats/', views.categories_stats, name='categories_stats'),
     path('books/', views.books_list, name="books_list"),
     path("books/export/excel/", views.books_export_excel, name="books_export_excel"),
     path("books/import/excel/", views.books_import_excel, name="books_import_excel"),
@@ -31,6 +35,11 @@ urlpatterns = [
     path('returns_form/', views.returns_form, name="returns_form"),
     path('history/', views.history, name="history"),
     path('history_export/', views.history_export, name="history_export"),
+    path('jobs/', views.jobs_list, name="jobs_list"),
+    path('jobs/<int:pk>/status/', views.job_status, name="job_status"),
+    path('jobs/<int:pk>/download/', views.job_download, name="job_download"),
+    path('metrics', views.metrics_endpoint, name="metrics"),
+    path('profiling/', views.profiling_report, name="profiling_report"),
     path('profile/', views.profile, name="profile"),
     path('change_password/', views.change_password, name="change_password"),
 ]
@@ -1,21 +1,33 @@
-import csv
-from datetime import datetime
-import openpyxl
+import os
 
 from django.http import JsonResponse
+from django.urls import reverse
 from django.utils import timezone
 from django.utils.timezone import now, timedelta
 from django.shortcuts import render,redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
 from django.utils.text import slugify
 from django.db.models import Q, F, Count
 from django.db import transaction
 from django.core.paginator import Paginator
-from django.http import HttpResponse
-
-from books.models import ActivityLog, Categorie, Emprunter, Etudiant, Ecole, Editeur, Auteur, Livre,ICONE_CHOICES,LANGUAGES_CHOICES,ETAT_LIVRE_CHOICES
+from django.http import HttpResponse, FileResponse, Http404
+from django.conf import settings
+from django.core.cache import cache
+
+from .imports import import_books, import_students
+from .jobs import enqueue, visible_jobs
+from . import metrics, profiling
+from .pagination import keyset_paginate
+from .reporting import reporting_view
+from .exports import BOOK_HEADERS, USER_HEADERS, HISTORY_HEADERS, book_rows, user_rows, history_archive, history_queryset, history_rows, stream_csv, stream_xlsx
+from .stats import category_stats, dashboard_stats
+from books import activity, autocomplete, cascade, fragments
+from books.search import search_livres
+from books.models import ArchiveRun, Categorie, Emprunter, EmprunterArchive, Etudiant, Ecole, Editeur, Auteur, Livre,ICONE_CHOICES,LANGUAGES_CHOICES,ETAT_LIVRE_CHOICES,OPEN_LOAN_STATUSES
 
 # Authentification
 
@@ -54,63 +66,26 @@ def logout_view(request):
 # Dashboard
 @login_required(login_url='signin')
 def dash(request):
-    today = now().date()
-    last_week = today - timedelta(days=6)  # pour les 7 derniers jours
-
-    # --- KPI Cards ---
-    total_books = sum([book.available_quantity() for book in Livre.objects.all()])
-    active_loans = Emprunter.objects.filter(status="active").count()
-    late_returns = Emprunter.objects.filter(status="late").count()
-    total_users = Etudiant.objects.filter(is_active=True).count()
-
-    late_returns_with_returned = Emprunter.objects.filter(
-    Q(dateRetourEffectif__gt=F('dateRetourPrevu')) | 
-    Q(dateRetourPrevu__lt=now().date(), dateRetourEffectif__isnull=True),
-    status="returned"
-).count()
-
-    # --- Graphiques ---
-    # 1) Emprunts par jour (line chart)
-    loans_last_7_days = []
-    labels_last_7_days = []
-    for i in range(7):
-        day = last_week + timedelta(days=i)
-        labels_last_7_days.append(day.strftime("%a"))  # Lun, Mar, ...
-        loans_count = Emprunter.objects.filter(dateEmprunt=day).count()
-        loans_last_7_days.append(loans_count)
-
-    # 2) Disponibilité des livres (donut chart)
-    total_disponibles = sum([book.available_quantity() for book in Livre.objects.all()])
-    total_empruntes = sum([book.quantite - book.available_quantity() for book in Livre.objects.all()])
-    total_en_retard = sum([1 for emprunt in Emprunter.objects.all() if emprunt.is_overdue()])
-
-    # 3) Statut des emprunts (bar chart)
-    status_counts = Emprunter.objects.values('status').annotate(count=Count('id'))
-    status_dict = {s['status']: s['count'] for s in status_counts}
-    loans_status = {
-        "late": status_dict.get("late", 0),
-        "returned": status_dict.get("returned", 0),
-        "active": status_dict.get("active", 0)
+    # --- KPI Cards + Graphiques (requêtes agrégées, en cache jusqu'à la prochaine écriture) ---
+    # Lus sur « default » et non sur l'instantané de reporting : un emprunt ou
+    # un retour change la disponibilité dès la requête suivante
+    version = f"{timezone.now().date()}:{fragments.version(Livre, Emprunter, Etudiant)}"
+    context = {
+        **cache.get_or_set(f"dashboard:stats:{version}", dashboard_stats, fragments.FRAGMENT_CACHE_TIMEOUT),
+        "cache_version": version,
+        "fragment_timeout": fragments.FRAGMENT_CACHE_TIMEOUT,
     }
 
     # --- Activités récentes ---
-    recent_activities = Emprunter.objects.all().order_by("-dateEmprunt")[:3]
+    recent_activities = Emprunter.objects.select_related(
+        "etudiant", "etudiant__ecole", "livre"
+    ).order_by("-dateEmprunt")[:3]
     activities_placeholder = recent_activities if recent_activities else []
 
-    context = {
-        "total_books": total_books,
-        "active_loans": active_loans,
-        "late_returns": late_returns_with_returned,
-        "total_users": total_users,
-        "labels_last_7_days": labels_last_7_days,
-        "loans_last_7_days": loans_last_7_days,
-        "total_disponibles": total_disponibles,
-        "total_empruntes": total_empruntes,
-        "total_en_retard": total_en_retard,
-        "loans_status": loans_status,
+    context.update({
         "recent_activities": recent_activities,
         "activities_placeholder": activities_placeholder
-    }
+    })
     return render(request, 'dashboard.html', context)
 
 
@@ -120,28 +95,37 @@ def dash(request):
 @login_required(login_url='signin')
 def books_list(request):
     categories_active = Categorie.objects.filter(is_active=True)
-    livres = Livre.objects.all()
+    # Disponibilité annotée une seule fois dans la requête de la page
+    livres = Livre.objects.avec_disponibilite().select_related(
+        "editeur", "auteur", "categorie"
+    )
 
     search = request.GET.get("search", "")
     category_id = request.GET.get("category", "")
     status = request.GET.get("status", "")
+    sort = request.GET.get("sort", "")
 
     if search:
-        livres = livres.filter(
-            Q(titre__icontains=search) |
-            Q(isbn__icontains=search) |
-            Q(auteur__nom_complet__icontains=search) |
-            Q(editeur__nom__icontains=search)
-        )
+        livres = search_livres(livres, search)
 
     if category_id:
         livres = livres.filter(categorie_id=category_id)
 
     if status == "available":
-        livres = livres.filter(quantite__gte=1)
+        livres = livres.filter(disponible__gt=0)
 
     elif status == "borrowed":
-        livres = livres.filter(quantite__lt=1)
+        livres = livres.filter(disponible__lte=0)
+
+    if sort == "available":
+        livres = livres.order_by("-disponible", "id")
+    elif sort == "borrowed":
+        livres = livres.order_by("disponible", "id")
+    elif search and "search_rank" in livres.query.annotations:
+        # Résultats les plus pertinents en premier
+        livres = livres.order_by("search_rank", "id")
+    else:
+        livres = livres.order_by("id")
 
     paginator = Paginator(livres, 10)
     page_number = request.GET.get("page")
@@ -153,57 +137,24 @@ def books_list(request):
         "search_query": search,
         "selected_category": category_id,
         "selected_status": status,
+        "selected_sort": sort,
         "page_obj": page_obj,
         "is_paginated": True,
     })
 
 @login_required(login_url="signin")
+@reporting_view
 def books_export_excel(request):
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Livres"
-
-    headers = [
-        "isbn",
-        "titre",
-        "langue",
-        "quantite",
-        "nbre_pages",
-        "annee_publication",
-        "emplacement",
-        "resume",
-        "editeur",
-        "auteur",
-        "categorie",
-    ]
-    ws.append(headers)
-
-    livres = Livre.objects.select_related(
-        "editeur", "auteur", "categorie"
-    ).all()
-
-    for livre in livres:
-        ws.append([
-            livre.isbn,
-            livre.titre,
-            livre.langue,
-            livre.quantite,
-            livre.nbre_pages,
-            livre.annee_publication or "",
-            livre.emplacement or "",
-            livre.resume or "",
-            livre.editeur.nom,
-            livre.auteur.nom_complet,
-            livre.categorie.nom,
-        ])
-
-    response = HttpResponse(
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
-    response["Content-Disposition"] = 'attachment; filename="livres.xlsx"'
-    wb.save(response)
+    # ?format=csv : export CSV diffusé ligne par ligne
+    if request.GET.get("format") == "csv":
+        return stream_csv("livres.csv", BOOK_HEADERS, book_rows())
+
+    if settings.BACKGROUND_JOBS:
+        job = enqueue("export_books", request.user)
+        messages.info(request, f"Export lancé en arrière-plan (tâche n°{job.id}).")
+        return redirect("jobs_list")
 
-    return response
+    return stream_xlsx("livres.xlsx", "Livres", BOOK_HEADERS, book_rows())
 
 @login_required(login_url="signin")
 def books_import_excel(request):
@@ -215,76 +166,32 @@ def books_import_excel(request):
         messages.error(request, "Aucun fichier sélectionné.")
         return redirect("books_list")
 
-    wb = openpyxl.load_workbook(excel_file)
-    ws = wb.active
-
-    rows = list(ws.iter_rows(values_only=True))
-    headers = [h.strip() if h else "" for h in rows[0]]
-    data_rows = rows[1:]
-
-    REQUIRED_COLS = {
-        "isbn",
-        "titre",
-        "langue",
-        "quantite",
-        "nbre_pages",
-        "editeur",
-        "auteur",
-        "categorie",
-    }
-
-    missing = REQUIRED_COLS - set(headers)
-    if missing:
-        messages.error(
-            request,
-            f"Colonnes manquantes : {', '.join(missing)}"
-        )
-        return redirect("books_list")
-
-    col = {name: headers.index(name) for name in headers}
+    if settings.BACKGROUND_JOBS:
+        job = enqueue("import_books", request.user, upload=excel_file)
+        messages.info(request, f"Import lancé en arrière-plan (tâche n°{job.id}).")
+        return redirect("jobs_list")
 
     try:
-        with transaction.atomic():
-            for line_no, row in enumerate(data_rows, start=2):
-                try:
-                    editeur, _ = Editeur.objects.get_or_create(
-                        nom=row[col["editeur"]]
-                    )
-                    auteur, _ = Auteur.objects.get_or_create(
-                        nom_complet=row[col["auteur"]]
-                    )
-                    categorie, _ = Categorie.objects.get_or_create(
-                        nom=row[col["categorie"]],
-                        defaults={"is_active": True}
-                    )
-
-                    Livre.objects.update_or_create(
-                        isbn=row[col["isbn"]],
-                        defaults={
-                            "titre": row[col["titre"]],
-                            "langue": row[col["langue"]],
-                            "quantite": int(row[col["quantite"]]),
-                            "nbre_pages": int(row[col["nbre_pages"]]),
-                            "annee_publication": row[col.get("annee_publication")] or None,
-                            "emplacement": row[col.get("emplacement")] or "",
-                            "resume": row[col.get("resume")] or "",
-                            "editeur": editeur,
-                            "auteur": auteur,
-                            "categorie": categorie,
-                        }
-                    )
-
-                except Exception as e:
-                    raise ValueError(f"Ligne {line_no} : {e}")
-
-        messages.success(request, "Importation des livres réussie.")
-
+        result = import_books(excel_file, performed_by=request.user)
     except Exception as e:
         messages.error(request, f"Import annulé : {e}")
+        return redirect("books_list")
+
+    messages.success(
+        request,
+        f"Importation des livres terminée : {result.created} ajouté(s), {result.updated} mis à jour."
+    )
+    if result.errors:
+        messages.warning(
+            request,
+            f"{len(result.errors)} ligne(s) ignorée(s) : " + " | ".join(result.error_summary())
+        )
 
     return redirect("books_list")
 
 @login_required(login_url='signin')
+@cache_control(private=True, max_age=60)
+@condition(etag_func=lambda request: autocomplete.etag(autocomplete.auteurs, request))
 def search_authors(request):
     """
     Endpoint API pour rechercher des auteurs
@@ -295,24 +202,15 @@ def search_authors(request):
     if len(query) < 2:
         return JsonResponse([], safe=False)
     
-    # Recherche insensible à la casse
-    authors = Auteur.objects.filter(
-        nom_complet__icontains=query
-    ).order_by('nom_complet')[:10]  # Limiter à 10 résultats
-    
-    # Formatter les résultats
-    results = []
-    for author in authors:
-        results.append({
-            'id': author.id,
-            'nom_complet': author.nom_complet,
-            'dateNaiss': author.dateNaiss.isoformat() if author.dateNaiss else None
-        })
+    # Index en mémoire (insensible à la casse et aux accents), limité à 10 résultats
+    results = autocomplete.auteurs.search(query, limit=10)
     
     return JsonResponse(results, safe=False)
 
 
 @login_required(login_url='signin')
+@cache_control(private=True, max_age=60)
+@condition(etag_func=lambda request: autocomplete.etag(autocomplete.editeurs, request))
 def search_publishers(request):
     """
     Endpoint API pour rechercher des éditeurs
@@ -323,20 +221,77 @@ def search_publishers(request):
     if len(query) < 2:
         return JsonResponse([], safe=False)
     
-    # Recherche insensible à la casse
-    publishers = Editeur.objects.filter(
-        nom__icontains=query
-    ).order_by('nom')[:10]  # Limiter à 10 résultats
+    # Index en mémoire (insensible à la casse et aux accents), limité à 10 résultats
+    results = autocomplete.editeurs.search(query, limit=10)
     
+    return JsonResponse(results, safe=False)
+
+@login_required(login_url='signin')
+def search_available_books(request):
+    """
+    Endpoint API pour rechercher les livres disponibles (formulaire d'emprunt)
+    URL: /api/books/available/?q=<query>&page=<n>
+    """
+    query = request.GET.get('q', '').strip()
+
+    livres = Livre.objects.disponibles().select_related('auteur').order_by('titre', 'id')
+
+    if query:
+        livres = search_livres(livres, query)
+
+    paginator = Paginator(livres, 10)  # 10 résultats par page
+    page_obj = paginator.get_page(request.GET.get('page'))
+
     # Formatter les résultats
     results = []
-    for publisher in publishers:
+    for livre in page_obj:
         results.append({
-            'id': publisher.id,
-            'nom': publisher.nom
+            'id': livre.id,
+            'isbn': livre.isbn,
+            'titre': livre.titre,
+            'auteur': livre.auteur.nom_complet,
+            'disponible': livre.disponible
         })
-    
-    return JsonResponse(results, safe=False)
+
+    return JsonResponse({
+        'results': results,
+        'has_next': page_obj.has_next()
+    })
+
+@login_required(login_url='signin')
+def search_students(request):
+    """
+    Endpoint API pour rechercher les étudiants actifs (formulaire d'emprunt)
+    URL: /api/students/search/?q=<query>&page=<n>
+    """
+    query = request.GET.get('q', '').strip()
+
+    etudiants = Etudiant.objects.filter(is_active=True).select_related('ecole').order_by('nom', 'prenoms', 'matricule')
+
+    if query:
+        etudiants = etudiants.filter(
+            Q(matricule__icontains=query) |
+            Q(nom__icontains=query) |
+            Q(prenoms__icontains=query)
+        )
+
+    paginator = Paginator(etudiants, 10)  # 10 résultats par page
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    results = []
+    for etudiant in page_obj:
+        results.append({
+            'matricule': etudiant.matricule,
+            'nom': etudiant.nom,
+            'prenoms': etudiant.prenoms,
+            'ecole': etudiant.ecole.nom,
+            'chambre': etudiant.numChambre,
+        })
+
+    return JsonResponse({
+        'results': results,
+        'has_next': page_obj.has_next()
+    })
 
 @login_required(login_url='signin')
 def books_form(request, pk=None):
@@ -405,7 +360,7 @@ def books_form(request, pk=None):
             book.categorie = categorie
             book.save()
 
-            ActivityLog.objects.create(
+            activity.log(
                 action_type="update",
                 title=f"Modification du livre {book.titre}",
                 description=f"« {book.titre} » ({book.quantite} exemplaires)",
@@ -427,7 +382,7 @@ def books_form(request, pk=None):
                 categorie=categorie
             )
 
-            ActivityLog.objects.create(
+            activity.log(
                 action_type="add_book",
                 title="Nouveau livre ajouté",
                 description=f"« {livre.titre} » ({livre.quantite} exemplaires)",
@@ -446,7 +401,7 @@ def books_form(request, pk=None):
 @login_required(login_url='signin')
 def books_delete(request,pk):
     book = get_object_or_404(Livre, pk=pk)
-    ActivityLog.objects.create(
+    activity.log(
         action_type="delete",
         title=f"Suppression du livre {book.titre}",
         description=f"« {book.titre} » ({book.quantite} exemplaires)",
@@ -461,11 +416,28 @@ def books_delete(request,pk):
 
 @login_required(login_url='signin')
 def categories_list(request):
-    categories = Categorie.objects.all()
+    # Livres, exemplaires et emprunts en cours annotés en une requête (cartes et tableau)
+    categories = Categorie.objects.avec_statistiques().order_by("id")
     return render(request, "categories_list.html", {
-        "categories": categories
+        "categories": categories,
+        # Cartes et tableau rendus une fois par version des catégories / livres / emprunts
+        "cache_version": fragments.version(Categorie, Livre, Emprunter),
+        "fragment_timeout": fragments.FRAGMENT_CACHE_TIMEOUT,
     })
 
+@login_required(login_url='signin')
+def categories_stats(request):
+    """
+    Endpoint API : statistiques par catégorie (graphique du tableau de bord)
+    URL: /api/categories/stats/
+    """
+    # Disponibilités lues sur « default », en cache jusqu'à la prochaine écriture
+    version = fragments.version(Categorie, Livre, Emprunter)
+    results = cache.get_or_set(
+        f"categories:stats:{version}", category_stats, fragments.FRAGMENT_CACHE_TIMEOUT
+    )
+    return JsonResponse({'results': results})
+
 @login_required(login_url='signin')
 def categories_form(request, pk=None):
     # Mode modification si un ID est présent
@@ -490,7 +462,7 @@ def categories_form(request, pk=None):
             category.is_active = active
             category.save()
 
-            ActivityLog.objects.create(
+            activity.log(
                 action_type="update",
                 title=f"Modification de la catégorie {category.nom}",
                 description=f"« {category.nom} » modifiée",
@@ -507,7 +479,7 @@ def categories_form(request, pk=None):
                 slug_url=slugify(nom)
             )
 
-            ActivityLog.objects.create(
+            activity.log(
                 action_type="add_book",
                 title="Nouvelle catégorie ajoutée",
                 description=f"« {category.nom} » ajoutée",
@@ -524,13 +496,14 @@ def categories_form(request, pk=None):
 @login_required(login_url='signin')
 def categories_delete(request,pk):
     category = get_object_or_404(Categorie, pk=pk)
-    ActivityLog.objects.create(
+    activity.log(
         action_type="delete",
         title=f"Suppression de la catégorie {category.nom}",
         description=f"« {category.nom} » supprimé",
         performed_by=request.user
     )
-    category.delete()
+    # Livres et emprunts en une requête par table, et non par livre
+    cascade.delete_categorie(category)
     return redirect("categories_list")
 
 
@@ -539,69 +512,55 @@ def categories_delete(request,pk):
 
 @login_required(login_url='signin')
 def users_list(request):
-    users = Etudiant.objects.all()
+    etudiants = Etudiant.objects.all()
 
     search = request.GET.get("search", "")
+    loans = request.GET.get("loans", "")
+    sort = request.GET.get("sort", "")
 
     if search:
-        users = users.filter(
+        etudiants = etudiants.filter(
                 Q(matricule__icontains=search) |
                 Q(nom__icontains=search) |
                 Q(emailInst__icontains=search) |
                 Q(telephone__icontains=search)
             )
-        
-    paginator = Paginator(users, 10)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    etudiants = etudiants.filtre_emprunts(loans)
+
+    # Compteurs d'emprunts annotés, école jointe : pas de requête par ligne.
+    # Le total est compté sur etudiants, sans les sous-requêtes des compteurs.
+    users = etudiants.avec_emprunts().select_related("ecole")
+
+    # Pagination par curseur : le matricule (clé primaire) départage les ex aequo
+    ordering = {
+        "late": ["-nb_emprunts_en_retard", "matricule"],
+        "active": ["-nb_emprunts_actifs", "matricule"],
+        "total": ["-nb_emprunts_total", "matricule"],
+    }.get(sort, ["matricule"])
+    page_obj = keyset_paginate(users, ordering, request.GET.get("cursor"), count_queryset=etudiants)
 
     return render(request, 'users_list.html', {
         "users": page_obj,
         "search_query": search,
+        "selected_loans": loans,
+        "selected_sort": sort,
         "page_obj": page_obj,
         "is_paginated": True,
     })
 
 @login_required(login_url='signin')
+@reporting_view
 def users_export_excel(request):
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Utilisateurs"
-
-    # ⚠️ Les noms DOIVENT correspondre à l'import
-    headers = [
-        "matricule",
-        "nom",
-        "prenoms",
-        "email",
-        "telephone",
-        "ecole",
-        "dateNaiss",
-        "actif",
-    ]
-    ws.append(headers)
-
-    users = Etudiant.objects.select_related("ecole").all()
-
-    for u in users:
-        ws.append([
-            u.matricule,
-            u.nom,
-            u.prenoms,
-            u.emailInst,
-            u.telephone,
-            u.ecole.nom if u.ecole else "",
-            u.dateNaiss.strftime("%Y-%m-%d") if u.dateNaiss else "",
-            "Oui" if u.is_active else "Non",
-        ])
-
-    response = HttpResponse(
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
-    response["Content-Disposition"] = 'attachment; filename="utilisateurs.xlsx"'
-    wb.save(response)
+    # ?format=csv : export CSV diffusé ligne par ligne
+    if request.GET.get("format") == "csv":
+        return stream_csv("utilisateurs.csv", USER_HEADERS, user_rows())
+
+    if settings.BACKGROUND_JOBS:
+        job = enqueue("export_users", request.user)
+        messages.info(request, f"Export lancé en arrière-plan (tâche n°{job.id}).")
+        return redirect("jobs_list")
 
-    return response
+    return stream_xlsx("utilisateurs.xlsx", "Utilisateurs", USER_HEADERS, user_rows())
 
 @login_required(login_url='signin')
 def users_import_excel(request):
@@ -612,58 +571,35 @@ def users_import_excel(request):
             messages.error(request, "Aucun fichier sélectionné.")
             return redirect("users_list")
 
-        wb = openpyxl.load_workbook(excel_file)
-        ws = wb.active
-
-        rows = list(ws.iter_rows(values_only=True))
-        headers = rows[0]
-        data_rows = rows[1:]
-
-        for index, row in enumerate(data_rows, start=2):
-            try:
-                (
-                    matricule,
-                    nom,
-                    prenoms,
-                    email,
-                    telephone,
-                    ecole_nom,
-                    date_naiss,
-                    actif,
-                ) = row
-
-                if not date_naiss:
-                    raise ValueError(f"Date de naissance manquante (ligne {index})")
-
-                # Conversion date si besoin
-                if isinstance(date_naiss, str):
-                    date_naiss = datetime.strptime(date_naiss, "%Y-%m-%d").date()
-
-                ecole = None
-                if ecole_nom:
-                    ecole, _ = Ecole.objects.get_or_create(nom=ecole_nom)
-
-                Etudiant.objects.update_or_create(
-                    matricule=matricule,
-                    defaults={
-                        "nom": nom,
-                        "prenoms": prenoms,
-                        "emailInst": email,
-                        "telephone": telephone,
-                        "ecole": ecole,
-                        "dateNaiss": date_naiss,
-                        "is_active": True if actif == "Oui" else False,
-                    }
-                )
+        dry_run = request.POST.get("dry_run") is not None
 
-            except Exception as e:
-                messages.error(
-                    request,
-                    f"Erreur ligne {index} : {e}"
-                )
-                return redirect("users_list")
+        if settings.BACKGROUND_JOBS:
+            job = enqueue("import_students", request.user, upload=excel_file, dry_run=dry_run)
+            messages.info(request, f"Import lancé en arrière-plan (tâche n°{job.id}).")
+            return redirect("jobs_list")
 
-        messages.success(request, "Importation Excel réussie.")
+        try:
+            result = import_students(excel_file, dry_run=dry_run, performed_by=request.user)
+        except Exception as e:
+            messages.error(request, f"Import annulé : {e}")
+            return redirect("users_list")
+
+        if result.errors:
+            messages.error(
+                request,
+                f"Import annulé, {len(result.errors)} ligne(s) invalide(s) : " + " | ".join(result.error_summary())
+            )
+        elif dry_run:
+            messages.info(
+                request,
+                f"Vérification réussie : {result.created} étudiant(s) à ajouter, {result.updated} à mettre à jour, "
+                "aucune modification enregistrée."
+            )
+        else:
+            messages.success(
+                request,
+                f"Importation Excel réussie : {result.created} étudiant(s) ajouté(s), {result.updated} mis à jour."
+            )
 
     return redirect("users_list")
 
@@ -705,7 +641,7 @@ def users_form(request, pk=None):
             user.ecole = ecole_obj
             user.is_active = is_active
             user.save()
-            ActivityLog.objects.create(
+            activity.log(
                 action_type="update",
                 title=f"Modification de l'etudiant {user.nom}",
                 description=f"« {user.nom} » modifiée",
@@ -727,7 +663,7 @@ def users_form(request, pk=None):
 
             )
 
-            ActivityLog.objects.create(
+            activity.log(
                 action_type="add_user",
                 title="Nouvel étudiant ajouté",
                 description=f"« {etudiant.nom} {etudiant.prenoms} » ajouté",
@@ -743,7 +679,7 @@ def users_form(request, pk=None):
 @login_required(login_url='signin')
 def users_delete(request,pk):
     user = Etudiant.objects.get(pk=pk)
-    ActivityLog.objects.create(
+    activity.log(
         action_type="delete",
         title=f"Suppression de l'utilisateur {user.nom} {user.prenoms}",
         description=f"« {user.nom} {user.prenoms} » supprimé",
@@ -760,6 +696,7 @@ def users_delete(request,pk):
 def loans_list(request):
     emprunts = Emprunter.objects.select_related(
         "etudiant",
+        "etudiant__ecole",
         "livre",
         "livre__auteur"
     )
@@ -768,26 +705,28 @@ def loans_list(request):
     status = request.GET.get("status", "all")
 
     # 🔍 SEARCH
-    if search:
-        emprunts = emprunts.filter(
+    def rechercher(emprunts):
+        if not search:
+            return emprunts
+        return emprunts.filter(
             Q(etudiant__nom__icontains=search) |
             Q(livre__titre__icontains=search) |
             Q(livre__auteur__nom_complet__icontains=search)
         )
 
-    today = timezone.now().date()
+    emprunts = rechercher(emprunts)
 
-    # 🎯 FILTER STATUS
+    # 🎯 FILTER STATUS (« late » est posé par la commande mark_overdue_loans)
     if status == "active":
         emprunts = emprunts.filter(
             dateRetourEffectif__isnull=True,
-            dateRetourPrevu__gte=today
+            status="active"
         )
 
     elif status == "late":
         emprunts = emprunts.filter(
             dateRetourEffectif__isnull=True,
-            dateRetourPrevu__lt=today
+            status="late"
         )
 
     elif status == "returned":
@@ -795,10 +734,22 @@ def loans_list(request):
             dateRetourEffectif__isnull=False
         )
 
-    # 📄 PAGINATION
-    paginator = Paginator(emprunts.order_by("-dateEmprunt"), 10)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    # 🗄️ ARCHIVE : seulement des emprunts rendus, antérieurs à archive_before
+    archive = None
+    archive_before = ArchiveRun.archived_before(EmprunterArchive)
+    if status in ("all", "returned") and archive_before:
+        archive = rechercher(EmprunterArchive.objects.select_related(
+            "etudiant",
+            "etudiant__ecole",
+            "livre",
+            "livre__auteur"
+        ))
+
+    # 📄 PAGINATION (curseur sur dateEmprunt, id)
+    page_obj = keyset_paginate(
+        emprunts, ["-dateEmprunt", "-id"], request.GET.get("cursor"),
+        archive=archive, archive_before=archive_before,
+    )
 
     return render(request, "loans_list.html", {
         "loans": page_obj,
@@ -813,7 +764,7 @@ def loans_form(request, pk=None):
     # Mode de visualisation
     loan = None
     if pk:
-        loan = get_object_or_404(Emprunter,pk=pk)
+        loan = get_object_or_404(Emprunter.objects.select_related('etudiant__ecole', 'livre__auteur'), pk=pk)
 
     if request.method == "POST":
         etudiant_matri = request.POST.get("user")
@@ -827,16 +778,19 @@ def loans_form(request, pk=None):
 
         if not loan:
             # Création
-            Emprunter.objects.create(
-                etudiant = etudiant,
-                livre = livre,
-                dateEmprunt = dateEmprunt,
-                dateRetourPrevu = dateRetourPrevu,
-                observation = observation,
-                status = "active"
-            )
+            with transaction.atomic():
+                Emprunter.objects.create(
+                    etudiant = etudiant,
+                    livre = livre,
+                    dateEmprunt = dateEmprunt,
+                    dateRetourPrevu = dateRetourPrevu,
+                    observation = observation,
+                    status = "active"
+                )
+                Livre.objects.filter(pk=livre.pk).update(copies_out=F("copies_out") + 1)
+            metrics.inc("library_loans_total")
 
-            ActivityLog.objects.create(
+            activity.log(
                 action_type="loan",
                 title="Nouvel emprunt",
                 description=f"{etudiant.nom} {etudiant.prenoms} a emprunté « {livre.titre} »",
@@ -846,11 +800,18 @@ def loans_form(request, pk=None):
 
         return redirect("loans_list")
 
+    # Seule la première page est rendue, la suite est chargée via search_available_books
+    # et search_students
+    available_books = Livre.objects.disponibles().select_related('auteur').order_by('titre', 'id')
+    users = Etudiant.objects.filter(is_active=True).select_related('ecole').order_by('nom', 'prenoms', 'matricule')
+
     context = {
         "loan":loan,
         'today': timezone.now().date(),
-        'available_books': Livre.disponibles(),
-        "users": Etudiant.objects.filter(is_active=True)
+        'available_books': available_books[:10],
+        'available_books_count': available_books.count(),
+        "users": users[:10],
+        "users_count": users.count(),
     }
     return render(request, 'loans_form.html', context)
 
@@ -863,15 +824,28 @@ def returns_form(request):
         etat = request.POST.get("condition")
         notes = request.POST.get("notes")
 
-        loan = get_object_or_404(Emprunter,id=loan_id)
+        loan = get_object_or_404(Emprunter.objects.select_related("etudiant", "livre"), id=loan_id)
+
+        with transaction.atomic():
+            # UPDATE conditionnel : de deux retours simultanés du même emprunt,
+            # un seul trouve encore l'emprunt ouvert et libère l'exemplaire
+            returned = Emprunter.objects.filter(pk=loan.pk, status__in=OPEN_LOAN_STATUSES).update(
+                dateRetourEffectif=dateRetour,
+                etat_livre=etat,
+                observation=(loan.observation or "") + " \n" + (notes or ""),
+                status="returned",
+            )
+            if returned == 1:
+                Livre.objects.filter(pk=loan.livre_id).update(copies_out=F("copies_out") - 1)
+                # update() n'émet pas post_save
+                fragments.invalidate_on_commit(Emprunter)
 
-        loan.dateRetourEffectif = dateRetour
-        loan.etat_livre = etat
-        loan.observation += " \n" + notes
-        loan.status = "returned"
-        loan.save()
+        if returned != 1:
+            messages.warning(request, "Cet emprunt a déjà été retourné.")
+            return redirect("loans_list")
+        metrics.inc("library_returns_total")
 
-        ActivityLog.objects.create(
+        activity.log(
             action_type="return",
             title="Retour de livre",
             description=f"{loan.etudiant.nom} a retourné « {loan.livre.titre} »",
@@ -881,22 +855,72 @@ def returns_form(request):
 
         return redirect("loans_list")
 
-    emprunts = Emprunter.objects.filter(status__in=["late","active"])
+    # Seule la première page est rendue, la suite est chargée via search_open_loans
+    emprunts = open_loans_queryset()
+    active_loans = list(emprunts[:10])
+
+    # Emprunt présélectionné depuis la liste des emprunts (?loan=<id>)
+    selected = request.GET.get("loan", "")
+    if selected.isdigit() and all(loan.id != int(selected) for loan in active_loans):
+        active_loans += list(emprunts.filter(id=selected))
+
     context = {
-        "active_loans":emprunts,
+        "active_loans": active_loans,
+        "active_loans_count": emprunts.count(),
         "etats": ETAT_LIVRE_CHOICES,
     }
     return render(request, 'returns_form.html',context)
 
+def open_loans_queryset():
+    # Emprunteur et livre joints, retard calculé en SQL : une requête par page
+    return Emprunter.objects.ouverts().select_related(
+        "etudiant", "livre"
+    ).order_by("dateRetourPrevu", "id")
+
+@login_required(login_url='signin')
+def search_open_loans(request):
+    """
+    Endpoint API pour rechercher les emprunts non rendus (formulaire de retour)
+    URL: /api/loans/open/?q=<matricule ou titre>&page=<n>
+    """
+    query = request.GET.get('q', '').strip()
+
+    emprunts = open_loans_queryset()
+    if query:
+        emprunts = emprunts.filter(
+            Q(etudiant__matricule__istartswith=query) | Q(livre__titre__icontains=query)
+        )
+
+    paginator = Paginator(emprunts, 10)  # 10 résultats par page
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    results = []
+    for loan in page_obj:
+        results.append({
+            'id': loan.id,
+            'matricule': loan.etudiant.matricule,
+            'etudiant': f"{loan.etudiant.nom} {loan.etudiant.prenoms}",
+            'livre': loan.livre.titre,
+            'dateEmprunt': loan.dateEmprunt.strftime('%d/%m/%Y'),
+            'dateRetourPrevu': loan.dateRetourPrevu.strftime('%d/%m/%Y'),
+            'en_retard': loan.en_retard,
+        })
+
+    return JsonResponse({
+        'results': results,
+        'has_next': page_obj.has_next()
+    })
+
 @login_required(login_url='signin')
 def loans_delete(request, pk):
     loan = get_object_or_404(Emprunter, pk=pk)
-    ActivityLog.objects.create(
+    activity.log(
         action_type="delete",
         title=f"Suppression de l'emprunt de {loan.etudiant.nom} {loan.etudiant.prenoms} du livre {loan.livre.titre}",
         description=f"« emprunt numero {loan.id} » supprimé",
         performed_by=request.user
     )
+    # copies_out est décrémenté par le signal pre_delete (books.signals.release_copy)
     loan.delete()
     return redirect("loans_list")
 
@@ -904,34 +928,31 @@ def loans_delete(request, pk):
 
 # Gestion du profil des utilisateur
 
+def history_filters(request):
+    """Filtres de l'historique, partagés par la page et l'export CSV."""
+    return {
+        name: request.GET.get(name, "")
+        for name in ("search", "action_type", "date_from", "date_to")
+    }
+
 @login_required(login_url="signin")
+@reporting_view
 def history(request):
-    activities = ActivityLog.objects.all().order_by("-timestamp")
-
-    search = request.GET.get("search", "")
-    action_type = request.GET.get("action_type", "")
-    date_from = request.GET.get("date_from", "")
-    date_to = request.GET.get("date_to", "")
-
-    if search:
-        activities = activities.filter(
-            Q(title__icontains=search) |
-            Q(description__icontains=search) |
-            Q(user__icontains=search)
-        )
-
-    if action_type:
-        activities = activities.filter(action_type=action_type)
-
-    if date_from:
-        activities = activities.filter(timestamp__date__gte=date_from)
-
-    if date_to:
-        activities = activities.filter(timestamp__date__lte=date_to)
-
-    paginator = Paginator(activities, 10)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    filters = history_filters(request)
+    search = filters["search"]
+    action_type = filters["action_type"]
+    date_from = filters["date_from"]
+    date_to = filters["date_to"]
+
+    activities = history_queryset(**filters)
+    # Entrées archivées : lues seulement si la période demandée les recouvre
+    archive, archive_before = history_archive(**filters)
+
+    # Pagination par curseur : les pages profondes coûtent autant que la première
+    page_obj = keyset_paginate(
+        activities, ["-timestamp", "-id"], request.GET.get("cursor"),
+        archive=archive, archive_before=archive_before,
+    )
 
     return render(request, "history.html", {
         "activities": page_obj,
@@ -948,26 +969,89 @@ def profile(request):
     return render(request, 'profile.html')
 
 @login_required(login_url="signin")
+@reporting_view
 def history_export(request):
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = 'attachment; filename="historique.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow([
-        "Date", "Action", "Titre", "Description", "Utilisateur", "Effectué par"
-    ])
-
-    for act in ActivityLog.objects.all().order_by("-timestamp"):
-        writer.writerow([
-            act.timestamp.strftime("%d/%m/%Y %H:%M"),
-            act.action_type,
-            act.title,
-            act.description,
-            act.user,
-            act.performed_by.username if act.performed_by else ""
-        ])
-
-    return response
+    # Mêmes filtres que la page Historique
+    filters = history_filters(request)
+
+    if settings.BACKGROUND_JOBS:
+        job = enqueue("export_history", request.user, **filters)
+        messages.info(request, f"Export lancé en arrière-plan (tâche n°{job.id}).")
+        return redirect("jobs_list")
+
+    # ?gzip=1 : CSV compressé à la volée, pour les journaux de plusieurs années
+    return stream_csv(
+        "historique.csv",
+        HISTORY_HEADERS,
+        history_rows(**filters),
+        compress=request.GET.get("gzip") == "1",
+    )
+
+# Tâches en arrière-plan
+
+@login_required(login_url='signin')
+def jobs_list(request):
+    jobs = visible_jobs(request.user).select_related("created_by").order_by("-created_at")[:20]
+    return render(request, "jobs_list.html", {
+        "jobs": jobs
+    })
+
+@login_required(login_url='signin')
+def job_status(request, pk):
+    """
+    Endpoint API pour suivre l'avancement d'une tâche
+    URL: /jobs/<id>/status/
+    """
+    job = get_object_or_404(visible_jobs(request.user), pk=pk)
+    return JsonResponse({
+        'id': job.id,
+        'kind': job.get_kind_display(),
+        'status': job.status,
+        'status_label': job.get_status_display(),
+        'progress': job.progress,
+        'message': job.message,
+        'download_url': reverse("job_download", args=[job.id]) if job.result_file else None
+    })
+
+@login_required(login_url='signin')
+def job_download(request, pk):
+    job = get_object_or_404(visible_jobs(request.user), pk=pk, status="done")
+    if not job.result_file:
+        raise Http404("Aucun fichier pour cette tâche.")
+    try:
+        fichier = open(job.result_file, "rb")
+    except FileNotFoundError:
+        raise Http404("Fichier introuvable.")
+    # Nom d'origine sans le préfixe unique
+    filename = os.path.basename(job.result_file).split("_", 1)[-1]
+    return FileResponse(fichier, as_attachment=True, filename=filename)
+
+def metrics_endpoint(request):
+    """
+    Métriques au format texte Prometheus
+    URL: /metrics (utilisateur staff ou jeton METRICS_TOKEN, voir metrics.authorized)
+    """
+    if not metrics.authorized(request):
+        raise Http404
+    return HttpResponse(
+        metrics.render(metrics.library_gauges()),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+@login_required(login_url='signin')
+@user_passes_test(lambda user: user.is_staff, login_url='signin')
+def profiling_report(request):
+    # ?source=log : journal structuré de tous les processus, sinon le tampon de ce processus
+    source = request.GET.get("source", "")
+    records = profiling.read_log() if source == "log" else list(profiling.recent)
+    summary = profiling.summarize(records)
+    return render(request, "profiling.html", {
+        "enabled": "app.profiling.ProfilingMiddleware" in settings.MIDDLEWARE,
+        "source": source,
+        "slowest": summary[:15],
+        "chattiest": profiling.chattiest(summary)[:15],
+        "recent": records[-20:][::-1],
+    })
 
 @login_required(login_url='signin')
 def change_password(request):
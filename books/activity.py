@@ -0,0 +1,97 @@
+"""
+Écriture du journal d'activités (ActivityLog) hors du chemin critique.
+
+activity.log(...) prend les mêmes arguments que ActivityLog.objects.create.
+En mode asynchrone (ACTIVITY_LOG_ASYNC, par défaut), l'entrée est placée dans
+une file en mémoire ; un thread l'écrit avec bulk_create dès que
+ACTIVITY_LOG_BATCH_SIZE entrées sont en attente ou au plus tard après
+ACTIVITY_LOG_FLUSH_MS millisecondes. La file est vidée à l'arrêt du
+processus (atexit). En mode synchrone, chaque appel écrit immédiatement
+(utile pour les tests et les scripts).
+
+Dans une transaction, l'entrée n'est mise en file qu'au commit : une action
+annulée n'apparaît pas dans l'historique. L'horodatage (auto_now_add) est
+celui de l'écriture, soit au plus ACTIVITY_LOG_FLUSH_MS après l'action.
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .models import ActivityLog
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_LOG_BATCH_SIZE = getattr(settings, "ACTIVITY_LOG_BATCH_SIZE", 100)
+ACTIVITY_LOG_FLUSH_MS = getattr(settings, "ACTIVITY_LOG_FLUSH_MS", 500)
+
+
+class ActivityWriter:
+
+    def __init__(self, batch_size=ACTIVITY_LOG_BATCH_SIZE, flush_ms=ACTIVITY_LOG_FLUSH_MS):
+        self.batch_size = batch_size
+        self.interval = flush_ms / 1000
+        self.pending = []
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def _start(self):
+        # Démarré au premier appel : rien ne tourne dans les processus qui ne journalisent pas
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run, name="activity-log", daemon=True)
+            self.thread.start()
+            atexit.register(self.flush)
+
+    def add(self, entry):
+        with self.lock:
+            self.pending.append(entry)
+            full = len(self.pending) >= self.batch_size
+            self._start()
+        if full:
+            self.wakeup.set()
+
+    def flush(self):
+        with self.lock:
+            entries, self.pending = self.pending, []
+        if not entries:
+            return 0
+        try:
+            ActivityLog.objects.bulk_create(entries, batch_size=self.batch_size)
+        except Exception:
+            logger.exception("Écriture de %d entrée(s) d'historique impossible", len(entries))
+            return 0
+        return len(entries)
+
+    def _run(self):
+        while True:
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            self.flush()
+            # Le thread garde sa propre connexion : la libérer si elle a expiré
+            close_old_connections()
+
+
+writer = ActivityWriter()
+
+
+def log(action_type, title, description, user=None, performed_by=None):
+    entry = ActivityLog(
+        action_type=action_type,
+        title=title,
+        description=description,
+        user=user,
+        performed_by_id=getattr(performed_by, "pk", None),
+    )
+    # Relu à chaque appel : override_settings(ACTIVITY_LOG_ASYNC=False) dans les tests
+    if not getattr(settings, "ACTIVITY_LOG_ASYNC", True):
+        entry.save()
+        return
+    transaction.on_commit(lambda: writer.add(entry))
+
+
+def flush():
+    """Écrit immédiatement les entrées en attente (avant une lecture de l'historique en script, par exemple)."""
+    return writer.flush()
@@ -10,3 +10,4 @@ admin.site.register(Livre)
 admin.site.register(Categorie)
 admin.site.register(Filiere)
 admin.site.register(Emprunter)
+admin.site.register(ArchiveRun)
@@ -0,0 +1,58 @@
+"""
+Archivage des lignes froides : entrées anciennes du journal d'activités et
+emprunts rendus depuis longtemps quittent les tables ActivityLog et
+Emprunter pour ActivityLogArchive et EmprunterArchive (mêmes colonnes, même
+id). Les tables consultées à chaque page restent petites et leurs index
+tiennent dans le cache de pages SQLite.
+
+Chaque lot est copié puis supprimé dans une même transaction : une
+interruption ne perd ni ne duplique aucune ligne.
+"""
+from datetime import datetime
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ActivityLog, ActivityLogArchive, ArchiveRun, Emprunter, EmprunterArchive
+
+ARCHIVE_BATCH_SIZE = 1000
+
+
+def _move(queryset, archive_model, batch_size):
+    moved = 0
+    while True:
+        with transaction.atomic():
+            ids = list(queryset.order_by("pk").values_list("pk", flat=True)[:batch_size])
+            if not ids:
+                return moved
+            rows = queryset.model.objects.filter(pk__in=ids).values()
+            archive_model.objects.bulk_create(archive_model(**row) for row in rows)
+            queryset.model.objects.filter(pk__in=ids).delete()
+        moved += len(ids)
+
+
+def activities_to_archive(before):
+    start = timezone.make_aware(datetime.combine(before, datetime.min.time()))
+    return ActivityLog.objects.filter(timestamp__lt=start)
+
+
+def loans_to_archive(before):
+    # Seuls les emprunts rendus : copies_out n'est pas concerné
+    return Emprunter.objects.filter(
+        status="returned",
+        dateRetourEffectif__isnull=False,
+        dateEmprunt__lt=before,
+    )
+
+
+def archive(before, batch_size=ARCHIVE_BATCH_SIZE):
+    """Archive tout ce qui est antérieur à la date before ; renvoie {table: lignes déplacées}."""
+    result = {}
+    for queryset, archive_model in (
+        (activities_to_archive(before), ActivityLogArchive),
+        (loans_to_archive(before), EmprunterArchive),
+    ):
+        moved = _move(queryset, archive_model, batch_size)
+        ArchiveRun.objects.create(table=archive_model._meta.db_table, before=before, moved=moved)
+        result[archive_model._meta.db_table] = moved
+    return result
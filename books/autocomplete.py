@@ -0,0 +1,148 @@
+"""
+Autocomplétion en mémoire des auteurs et des éditeurs.
+
+Chaque index garde, pour chaque mot normalisé (minuscules, sans accents)
+d'un nom, une entrée dans un tableau trié : une recherche par préfixe est un
+simple bisect, sans requête SQL. L'index est construit pour une version du
+modèle (books.fragments, dans le cache partagé) : une écriture validée
+change cette version et chaque processus (workers WSGI, run_jobs)
+reconstruit son index à la recherche suivante. AUTOCOMPLETE_TTL borne en
+plus l'âge de l'index, pour les écritures faites hors de l'ORM.
+"""
+import hashlib
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+
+from django.conf import settings
+
+from . import fragments
+from .models import Auteur, Editeur
+
+AUTOCOMPLETE_TTL = getattr(settings, "AUTOCOMPLETE_TTL", 300)
+
+
+def normalize(text):
+    """« Émile  ZOLA » -> « emile zola »"""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.lower().split())
+
+
+class PrefixIndex:
+
+    def __init__(self, model, loader):
+        self.model = model
+        self.loader = loader  # -> [(libellé, données JSON), ...]
+        self.lock = threading.Lock()
+        self.words = []       # [(mot, n° entrée), ...] trié
+        self.entries = []     # [(libellé normalisé, données), ...] trié
+        self.labels = []      # [(libellé normalisé,), ...] pour bisect
+        self.etag = ""
+        self.built_at = None
+        self.built_version = None
+
+    def invalidate(self):
+        """Après le commit, pour tous les processus (écritures sans signaux : bulk_create...)."""
+        fragments.invalidate_on_commit(self.model)
+
+    def _fresh(self, version):
+        return (
+            self.built_version == version
+            and time.monotonic() - self.built_at < AUTOCOMPLETE_TTL
+        )
+
+    def _ensure(self):
+        # Version lue avant le chargement : une écriture pendant la construction
+        # change la version et provoquera une nouvelle construction
+        version = fragments.version(self.model)
+        if self._fresh(version):
+            return
+        with self.lock:
+            if self._fresh(version):
+                return
+            entries = sorted(
+                ((normalize(label), data) for label, data in self.loader()),
+                key=lambda entry: entry[0],
+            )
+            words = sorted(
+                (word, n)
+                for n, (label, _) in enumerate(entries)
+                for word in set(label.split())
+            )
+            digest = hashlib.md5()
+            for label, data in entries:
+                digest.update(f"{data['id']}:{label}\n".encode())
+
+            self.entries, self.words = entries, words
+            self.labels = [(label,) for label, _ in entries]
+            self.etag = digest.hexdigest()
+            self.built_at = time.monotonic()
+            self.built_version = version
+
+    def version(self):
+        self._ensure()
+        return self.etag
+
+    def _range(self, sorted_list, prefix):
+        return (
+            bisect_left(sorted_list, (prefix,)),
+            bisect_left(sorted_list, (prefix + "\uffff",)),
+        )
+
+    def search(self, query, limit=10):
+        self._ensure()
+        query = normalize(query)
+        terms = query.split()
+        if not terms:
+            return []
+
+        results = []
+        seen = set()
+
+        # 1) Libellés commençant par la saisie, dans l'ordre alphabétique
+        start, end = self._range(self.labels, query)
+        for n in range(start, min(end, start + limit)):
+            seen.add(n)
+            results.append(self.entries[n][1])
+
+        # 2) Mots commençant par un terme : on parcourt la plage la plus courte
+        #    et on s'arrête dès que « limit » résultats sont trouvés
+        start, end = min((self._range(self.words, term) for term in terms), key=lambda r: r[1] - r[0])
+        for i in range(start, end):
+            if len(results) >= limit:
+                break
+            n = self.words[i][1]
+            if n in seen:
+                continue
+            label_words = self.entries[n][0].split()
+            if all(any(word.startswith(term) for word in label_words) for term in terms):
+                seen.add(n)
+                results.append(self.entries[n][1])
+
+        return results
+
+
+def _load_auteurs():
+    for id_, nom, date_naiss in Auteur.objects.values_list("id", "nom_complet", "dateNaiss"):
+        yield nom, {
+            "id": id_,
+            "nom_complet": nom,
+            "dateNaiss": date_naiss.isoformat() if date_naiss else None,
+        }
+
+
+def _load_editeurs():
+    for id_, nom in Editeur.objects.values_list("id", "nom"):
+        yield nom, {"id": id_, "nom": nom}
+
+
+auteurs = PrefixIndex(Auteur, _load_auteurs)
+editeurs = PrefixIndex(Editeur, _load_editeurs)
+
+
+def etag(index, request):
+    """ETag d'une réponse : version de l'index + saisie normalisée."""
+    query = normalize(request.GET.get("q", ""))
+    return hashlib.md5(f"{index.version()}:{query}".encode()).hexdigest()
@@ -0,0 +1,48 @@
+"""
+Base SQLite dédiée aux mesures de performance (seed_bench, benchmark).
+
+seed_bench génère ses données dans BENCH_DATABASE, jamais dans la base de
+l'application, et benchmark mesure une copie jetable de ce fichier. Le temps
+de la commande, l'alias « default » pointe sur ce fichier (comme le lanceur
+de tests sur la base de test) : vues, signaux et commandes appelées
+(reconcile_availability, rebuild_search_index) n'ont pas à connaître l'alias.
+"""
+import sqlite3
+from contextlib import closing, contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from . import search
+
+BENCH_DATABASE = Path(getattr(settings, "BENCH_DATABASE", settings.BASE_DIR / "bench.sqlite3"))
+
+
+def is_application_database(path):
+    """path est-il le fichier de la base « default » configurée ?"""
+    name = connections[DEFAULT_DB_ALIAS].settings_dict["NAME"]
+    return Path(path).resolve() == Path(name).resolve()
+
+
+@contextmanager
+def sqlite_file(path, alias=DEFAULT_DB_ALIAS):
+    """Pointe l'alias SQLite sur le fichier path le temps du bloc."""
+    connection = connections[alias]
+    previous = connection.settings_dict["NAME"]
+    connection.close()
+    connection.settings_dict["NAME"] = str(path)
+    # L'index FTS trouvé sur l'ancien fichier n'existe peut-être pas sur celui-ci
+    search._ready.discard(alias)
+    try:
+        yield
+    finally:
+        connection.close()
+        connection.settings_dict["NAME"] = previous
+        search._ready.discard(alias)
+
+
+def copy(source, target):
+    """Copie cohérente d'un fichier SQLite (API de sauvegarde en ligne)."""
+    with closing(sqlite3.connect(source)) as src, closing(sqlite3.connect(target)) as dst:
+        src.backup(dst)
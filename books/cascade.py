@@ -0,0 +1,41 @@
+"""
+Suppression d'une catégorie et de ses livres en une requête par table.
+
+Avec category.delete(), le Collector de Django lit chaque livre et chaque
+emprunt de la catégorie pour leur envoyer les signaux de books.signals
+(index FTS, copies_out, fragments), puis les supprime par lots de 100 : des
+dizaines de requêtes pour une grande catégorie. Ici, les lignes dépendantes
+sont supprimées par sous-requête et le travail des signaux est fait une
+seule fois. copies_out n'a pas à être tenu : les livres disparaissent avec
+leurs emprunts.
+"""
+from django.db import connections, transaction
+
+from . import fragments, search
+from .models import Emprunter, EmprunterArchive, Livre
+
+
+def _delete(queryset):
+    """DELETE ... WHERE pk IN (sous-requête) : sans lire les lignes ni envoyer de signaux."""
+    meta = queryset.model._meta
+    connection = connections[queryset.db]
+    quote = connection.ops.quote_name
+    sql, params = queryset.values("pk").query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {quote(meta.db_table)} WHERE {quote(meta.pk.column)} IN ({sql})", params
+        )
+        return cursor.rowcount
+
+
+def delete_categorie(categorie):
+    livres = Livre.objects.filter(categorie=categorie)
+    with transaction.atomic():
+        search.unindex_livres(livres)
+        # Sans signal : suppression directe par le Collector
+        EmprunterArchive.objects.filter(livre__in=livres).delete()
+        _delete(Emprunter.objects.filter(livre__in=livres))
+        _delete(livres)
+        fragments.invalidate_on_commit(Livre, Emprunter)
+        # Plus aucun livre : le Collector ne fait que vérifier et supprimer la catégorie
+        categorie.delete()
@@ -0,0 +1,77 @@
+"""
+Versions des fragments de gabarits mis en cache ({% cache %}).
+
+Chaque modèle a un numéro de version dans le cache (settings.CACHES) ; un
+fragment est mis en cache sous la version des modèles dont il dépend. Les
+signaux de books.signals changent la version d'un modèle après chaque
+écriture validée : les fragments concernés sont recalculés au prochain
+affichage, les autres restent en cache. Les index d'autocomplétion
+(books.autocomplete) suivent les versions d'Auteur et d'Editeur de la même
+façon.
+
+invalidate_on_commit() regroupe les invalidations d'une transaction : une
+suppression en cascade ou un archivage de milliers de lignes ne change la
+version de chaque modèle qu'une fois, en une écriture du cache au commit.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+FRAGMENT_CACHE_TIMEOUT = getattr(settings, "FRAGMENT_CACHE_TIMEOUT", 600)
+
+
+def _key(model):
+    return f"fragments:{model._meta.label_lower}"
+
+
+def invalidate(*models):
+    cache.set_many({_key(model): time.time_ns() for model in models}, None)
+
+
+# Par thread et par base : (run_on_commit, points de sauvegarde, modèles en attente)
+_pending = threading.local()
+
+
+def invalidate_on_commit(*models, using="default"):
+    """
+    Invalide les modèles après le commit de la transaction en cours (tout de
+    suite hors transaction). Un seul rappel on_commit, donc une seule écriture
+    du cache, par transaction ou point de sauvegarde.
+    """
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        invalidate(*models)
+        return
+    state = getattr(_pending, using, None)
+    # Un rappel par bloc atomic : Django remplace run_on_commit après un
+    # commit ou un rollback (même partiel), le rappel précédent a alors pu
+    # disparaître ; un nouveau point de sauvegarde peut être annulé seul
+    # (atomic(savepoint=False), utilisé par save() et delete(), empile None)
+    savepoints = [sid for sid in connection.savepoint_ids if sid]
+    if state is None or state[0] is not connection.run_on_commit or state[1] != savepoints:
+        state = (connection.run_on_commit, savepoints, set())
+        setattr(_pending, using, state)
+
+        def flush():
+            if getattr(_pending, using, None) is state:
+                delattr(_pending, using)
+            invalidate(*state[2])
+
+        transaction.on_commit(flush, using=using)
+    state[2].update(models)
+
+
+def version(*models):
+    """« v1.v2... » : change dès qu'un des modèles est modifié."""
+    keys = [_key(model) for model in models]
+    found = cache.get_many(keys)
+    if len(found) < len(keys):
+        # add() : si un autre processus vient de créer la version, c'est la sienne qui compte
+        for key in keys:
+            if key not in found:
+                cache.add(key, time.time_ns(), None)
+        found = cache.get_many(keys)
+    return ".".join(str(found.get(key, 0)) for key in keys)
@@ -0,0 +1,51 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from books.archive import ARCHIVE_BATCH_SIZE, activities_to_archive, archive, loans_to_archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Déplace vers les tables d'archive les entrées du journal et les emprunts "
+        "rendus plus anciens que --older-than jours."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            default=365,
+            help="Âge minimal en jours des lignes à archiver (365 par défaut).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=ARCHIVE_BATCH_SIZE,
+            help="Nombre de lignes déplacées par transaction.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Affiche le nombre de lignes concernées sans les déplacer.",
+        )
+
+    def handle(self, *args, **options):
+        if options["older_than"] < 1 or options["batch_size"] < 1:
+            raise CommandError("--older-than et --batch-size doivent être positifs.")
+
+        before = timezone.now().date() - timedelta(days=options["older_than"])
+
+        if options["dry_run"]:
+            self.stdout.write(
+                f"Avant le {before:%d/%m/%Y} : "
+                f"{activities_to_archive(before).count()} entrée(s) du journal, "
+                f"{loans_to_archive(before).count()} emprunt(s) rendu(s)."
+            )
+            return
+
+        for table, moved in archive(before, options["batch_size"]).items():
+            self.stdout.write(f"{table} : {moved} ligne(s) archivée(s).")
+
+        self.stdout.write(self.style.SUCCESS(f"Archivage terminé (avant le {before:%d/%m/%Y})."))
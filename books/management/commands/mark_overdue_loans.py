@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from books import activity, fragments
+from books.models import Emprunter
+
+
+class Command(BaseCommand):
+    help = (
+        "Passe en « late » les emprunts « active » dont la date de retour prévue "
+        "est dépassée. À lancer chaque jour (cron), par exemple peu après minuit."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date",
+            help="Date de référence AAAA-MM-JJ (aujourd'hui par défaut).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Affiche le nombre d'emprunts concernés sans les modifier.",
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.now().date()
+        if options["date"]:
+            today = parse_date(options["date"])
+            if today is None:
+                raise CommandError("Date invalide (format AAAA-MM-JJ).")
+
+        emprunts = Emprunter.objects.a_passer_en_retard(today)
+
+        if options["dry_run"]:
+            self.stdout.write(f"{emprunts.count()} emprunt(s) à passer en retard.")
+            return
+
+        with transaction.atomic():
+            # Un seul UPDATE ; copies_out ne change pas (« late » reste un emprunt ouvert)
+            total = emprunts.update(status="late")
+
+            # Une entrée d'historique résume tout le passage
+            if total:
+                fragments.invalidate_on_commit(Emprunter)
+                activity.log(
+                    action_type="overdue",
+                    title="Emprunts en retard",
+                    description=(
+                        f"{total} emprunt(s) non rendu(s) au {today:%d/%m/%Y} "
+                        f"passé(s) au statut « En Retard »"
+                    ),
+                )
+
+        self.stdout.write(self.style.SUCCESS(f"{total} emprunt(s) passé(s) en retard."))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from books import search
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche plein texte (SQLite FTS5) du catalogue."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            default="default",
+            help="Alias de la base à indexer.",
+        )
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        if connections[using].vendor != "sqlite":
+            raise CommandError("L'index FTS5 n'est disponible qu'avec SQLite.")
+
+        start = time.monotonic()
+        with transaction.atomic(using=using):
+            search.rebuild_index(using)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Index de recherche reconstruit en {time.monotonic() - start:.2f}s."
+        ))
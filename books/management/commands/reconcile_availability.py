@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from books import fragments
+from books.models import Emprunter, Livre, OPEN_LOAN_STATUSES
+
+
+class Command(BaseCommand):
+    help = "Recalcule Livre.copies_out à partir des emprunts en cours (Emprunter)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Affiche le nombre de livres désynchronisés sans les corriger.",
+        )
+
+    def handle(self, *args, **options):
+        # Nombre d'emprunts ouverts par livre, calculé dans une sous-requête
+        emprunts_ouverts = Coalesce(
+            Subquery(
+                Emprunter.objects
+                .filter(livre=OuterRef("pk"), status__in=OPEN_LOAN_STATUSES)
+                .order_by()
+                .values("livre")
+                .annotate(total=Count("id"))
+                .values("total"),
+                output_field=IntegerField(),
+            ),
+            0,
+        )
+
+        with transaction.atomic():
+            desynchronises = (
+                Livre.objects
+                .annotate(reel=emprunts_ouverts)
+                .exclude(copies_out=F("reel"))
+                .count()
+            )
+
+            if options["dry_run"]:
+                self.stdout.write(f"{desynchronises} livre(s) désynchronisé(s).")
+                return
+
+            # Un seul UPDATE pour tout le catalogue
+            Livre.objects.update(copies_out=emprunts_ouverts)
+            fragments.invalidate_on_commit(Livre)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Compteurs recalculés ({desynchronises} livre(s) corrigé(s))."
+        ))
@@ -0,0 +1,219 @@
+import random
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from books import bench
+from books.models import (
+    ActivityLog, Auteur, Categorie, Ecole, Editeur, Emprunter, Etudiant, Livre,
+    ICONE_CHOICES,
+)
+
+# Volumes par défaut de chaque échelle : livres, étudiants et emprunts
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+
+BATCH_SIZE = 2_000
+
+# Préfixes des données synthétiques
+ISBN_PREFIX = "B"
+MATRICULE_PREFIX = "BENCH"
+BENCH_NAME = "Bench"
+
+TITRES = ("Introduction à", "Histoire de", "Manuel de", "Essai sur")
+SUJETS = ("la physique", "l'algèbre", "la poésie", "Abidjan", "la chimie")
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère un jeu de données synthétique (livres, étudiants, emprunts, "
+        "journal) dans une base SQLite dédiée, pour la commande « benchmark ». "
+        "La base de l'application n'est jamais modifiée."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale",
+            choices=SCALES,
+            default="1k",
+            help="Nombre de livres, d'étudiants et d'emprunts (1k par défaut).",
+        )
+        parser.add_argument("--books", type=int, help="Nombre de livres (remplace --scale).")
+        parser.add_argument("--students", type=int, help="Nombre d'étudiants (remplace --scale).")
+        parser.add_argument("--loans", type=int, help="Nombre d'emprunts (remplace --scale).")
+        parser.add_argument(
+            "--activities",
+            type=int,
+            help="Entrées du journal d'activité (autant que d'emprunts par défaut).",
+        )
+        parser.add_argument("--seed", type=int, default=42, help="Graine du générateur aléatoire.")
+        parser.add_argument(
+            "--database",
+            default=str(bench.BENCH_DATABASE),
+            help="Fichier SQLite à créer (BENCH_DATABASE par défaut).",
+        )
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Remplace le fichier d'un précédent seed_bench.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("La base de benchmark est un fichier SQLite.")
+        path = Path(options["database"])
+        if bench.is_application_database(path):
+            raise CommandError(f"{path} est la base de l'application.")
+
+        size = SCALES[options["scale"]]
+        books = options["books"] if options["books"] is not None else size
+        students = options["students"] if options["students"] is not None else size
+        loans = options["loans"] if options["loans"] is not None else size
+        activities = options["activities"] if options["activities"] is not None else loans
+        if min(books, students, loans, activities) < 0 or (loans and not (books and students)):
+            raise CommandError("Des emprunts demandent au moins un livre et un étudiant.")
+
+        rng = random.Random(options["seed"])
+        start = time.monotonic()
+
+        if path.exists() and not options["clear"]:
+            raise CommandError(f"{path} existe déjà : relancer avec --clear pour le remplacer.")
+        for suffix in ("", "-wal", "-shm", "-journal"):
+            Path(f"{path}{suffix}").unlink(missing_ok=True)
+
+        # Tout est écrit dans le fichier dédié : rien à distinguer des données
+        # réelles, --clear recrée simplement le fichier
+        with bench.sqlite_file(path):
+            call_command("migrate", interactive=False, verbosity=0)
+            with transaction.atomic():
+                livres = self.seed_books(rng, books)
+                etudiants = self.seed_students(rng, students)
+                self.seed_loans(rng, loans, livres, etudiants)
+                self.seed_activities(rng, activities)
+
+            # Les insertions en masse ne passent pas par les signaux
+            call_command("reconcile_availability")
+            call_command("rebuild_search_index")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{books} livre(s), {students} étudiant(s), {loans} emprunt(s) et "
+            f"{activities} entrée(s) du journal générés dans {path} "
+            f"en {time.monotonic() - start:.1f}s."
+        ))
+
+    def seed_books(self, rng, count):
+        if not count:
+            return []
+        auteurs = Auteur.objects.bulk_create(
+            Auteur(nom_complet=f"{BENCH_NAME} Auteur {i}") for i in range(max(count // 10, 1))
+        )
+        editeurs = Editeur.objects.bulk_create(
+            Editeur(nom=f"{BENCH_NAME} Éditeur {i}") for i in range(max(count // 50, 1))
+        )
+        categories = Categorie.objects.bulk_create(
+            Categorie(
+                nom=f"{BENCH_NAME} {label}",
+                description=f"Catégorie synthétique « {label} »",
+                icone=icone,
+                couleur="#3b82f6",
+                slug_url=f"bench-{icone}",
+            )
+            for icone, label in ICONE_CHOICES
+        )
+        Livre.objects.bulk_create(
+            (
+                Livre(
+                    isbn=f"{ISBN_PREFIX}{i:09d}",
+                    titre=f"{rng.choice(TITRES)} {rng.choice(SUJETS)} {i}",
+                    langue=rng.choice(("fr", "en")),
+                    quantite=rng.randint(1, 5),
+                    nbre_pages=rng.randint(50, 900),
+                    annee_publication=rng.randint(1950, timezone.now().year),
+                    emplacement=f"Rayon {rng.randint(1, 40)}",
+                    auteur=rng.choice(auteurs),
+                    editeur=rng.choice(editeurs),
+                    categorie=rng.choice(categories),
+                )
+                for i in range(count)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        return list(Livre.objects.filter(isbn__startswith=ISBN_PREFIX).values_list("pk", flat=True))
+
+    def seed_students(self, rng, count):
+        if not count:
+            return []
+        ecoles = Ecole.objects.bulk_create(Ecole(nom=f"{BENCH_NAME} École {i}") for i in range(5))
+        etudiants = Etudiant.objects.bulk_create(
+            (
+                Etudiant(
+                    matricule=f"{MATRICULE_PREFIX}{i:07d}",
+                    nom=f"Nom{i}",
+                    prenoms=rng.choice(("Awa", "Koffi", "Mariam", "Yao", "Aïcha")),
+                    dateNaiss=timezone.now().date() - timedelta(days=rng.randint(18 * 365, 30 * 365)),
+                    telephone=f"07{rng.randint(0, 99_999_999):08d}",
+                    emailPers=f"etudiant{i}@example.com",
+                    emailInst=f"etudiant{i}@bench.example.com",
+                    numChambre=str(rng.randint(1, 999)),
+                    is_active=rng.random() > 0.1,
+                    ecole=rng.choice(ecoles),
+                )
+                for i in range(count)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        return [etudiant.pk for etudiant in etudiants]
+
+    def seed_loans(self, rng, count, livres, etudiants):
+        today = timezone.now().date()
+
+        def emprunt():
+            emprunte = today - timedelta(days=rng.randint(0, 365))
+            prevu = emprunte + timedelta(days=rng.choice((7, 14, 21, 30)))
+            # Les emprunts anciens sont presque tous rendus
+            if rng.random() < (0.95 if prevu < today else 0.3):
+                rendu = min(prevu + timedelta(days=rng.randint(-5, 10)), today)
+                status = "returned"
+            else:
+                rendu = None
+                status = "late" if prevu < today else "active"
+            return Emprunter(
+                dateEmprunt=emprunte,
+                dateRetourPrevu=prevu,
+                dateRetourEffectif=rendu,
+                etudiant_id=rng.choice(etudiants),
+                livre_id=rng.choice(livres),
+                status=status,
+                etat_livre="good" if rendu else None,
+                observation="",
+            )
+
+        Emprunter.objects.bulk_create((emprunt() for _ in range(count)), batch_size=BATCH_SIZE)
+
+    def seed_activities(self, rng, count):
+        if not count:
+            return
+        actions = [action for action, _ in ActivityLog.ACTION_CHOICES]
+        first = ActivityLog.objects.bulk_create(
+            (
+                ActivityLog(
+                    action_type=rng.choice(actions),
+                    title=f"Activité synthétique {i}",
+                    description="Générée par seed_bench",
+                    user=BENCH_NAME,
+                )
+                for i in range(count)
+            ),
+            batch_size=BATCH_SIZE,
+        )[0].pk
+        # timestamp est en auto_now_add : étalement sur un an, une mise à jour par jour
+        now = timezone.now()
+        bench = ActivityLog.objects.filter(user=BENCH_NAME, pk__gte=first)
+        per_day = max(count // 365, 1)
+        last = bench.order_by("-pk").values_list("pk", flat=True).first()
+        for day, low in enumerate(range(first, last + 1, per_day)):
+            bench.filter(pk__gte=low, pk__lt=low + per_day).update(timestamp=now - timedelta(days=day))
@@ -0,0 +1,134 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:28
+#
+# Schéma des migrations books 0001 à 0009, enregistrées comme appliquées
+# dans db.sqlite3 mais jamais versionnées. Une base qui les a déjà appliquées
+# considère celle-ci comme appliquée (replaces) ; une base neuve la joue.
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    replaces = [
+        ('books', '0001_initial'),
+        ('books', '0002_alter_categorie_nom'),
+        ('books', '0003_alter_categorie_description'),
+        ('books', '0004_etudiant_is_active'),
+        ('books', '0005_remove_emprunter_duree'),
+        ('books', '0006_alter_emprunter_dateretoureffectif'),
+        ('books', '0007_alter_emprunter_etat_livre_activitylog'),
+        ('books', '0008_alter_livre_annee_publication'),
+        ('books', '0009_auteur_datenaiss'),
+    ]
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Auteur',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom_complet', models.CharField(max_length=150)),
+                ('dateNaiss', models.DateField(default=None, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Categorie',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=40)),
+                ('description', models.TextField()),
+                ('icone', models.CharField(choices=[('book', 'Livre'), ('flask', 'Science'), ('hat-wizard', 'Fantastique'), ('landmark', 'Histoire'), ('brain', 'Philosophie'), ('feather-alt', 'Poésie'), ('rocket', 'Science-Fiction'), ('child', 'Jeunesse'), ('palette', 'Art'), ('music', 'Musique'), ('futbol', 'Sport'), ('utensils', 'Cuisine'), ('globe', 'Géographie'), ('user-tie', 'Biographie'), ('heart', 'Romance'), ('users', 'Social')], max_length=50)),
+                ('couleur', models.CharField(max_length=10)),
+                ('slug_url', models.SlugField(blank=True, max_length=100, unique=True)),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Ecole',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=50)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Editeur',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=200)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Filiere',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=50)),
+                ('domaine', models.CharField(max_length=150)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ActivityLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action_type', models.CharField(choices=[('loan', 'Emprunt'), ('return', 'Retour'), ('add_book', 'Ajout livre'), ('add_user', 'Ajout utilisateur'), ('update', 'Modification'), ('delete', 'Suppression')], max_length=20)),
+                ('title', models.CharField(max_length=150)),
+                ('description', models.TextField()),
+                ('user', models.CharField(blank=True, max_length=150, null=True)),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('performed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Etudiant',
+            fields=[
+                ('matricule', models.CharField(max_length=12, primary_key=True, serialize=False, unique=True)),
+                ('nom', models.CharField(max_length=50)),
+                ('prenoms', models.CharField(max_length=150)),
+                ('dateNaiss', models.DateField()),
+                ('telephone', models.CharField(max_length=20, validators=[django.core.validators.RegexValidator(message='Le numéro de téléphone doit contenir entre 8 et 15 chiffres, avec éventuellement un + au début.', regex='^\\+?\\d{8,15}$')])),
+                ('emailPers', models.CharField(max_length=50)),
+                ('emailInst', models.CharField(max_length=50)),
+                ('numChambre', models.CharField(max_length=5)),
+                ('is_active', models.BooleanField(default=True)),
+                ('ecole', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='books.ecole')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Livre',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('isbn', models.CharField(max_length=10)),
+                ('titre', models.CharField(max_length=100)),
+                ('langue', models.CharField(choices=[('ab', 'Abkhazian'), ('aa', 'Afar'), ('af', 'Afrikaans'), ('ak', 'Akan'), ('sq', 'Albanian'), ('am', 'Amharic'), ('ar', 'Arabic'), ('an', 'Aragonese'), ('hy', 'Armenian'), ('as', 'Assamese'), ('av', 'Avaric'), ('ae', 'Avestan'), ('ay', 'Aymara'), ('az', 'Azerbaijani'), ('bm', 'Bambara'), ('ba', 'Bashkir'), ('eu', 'Basque'), ('be', 'Belarusian'), ('bn', 'Bengali'), ('bi', 'Bislama'), ('bs', 'Bosnian'), ('br', 'Breton'), ('bg', 'Bulgarian'), ('my', 'Burmese'), ('ca', 'Catalan'), ('ch', 'Chamorro'), ('ce', 'Chechen'), ('ny', 'Chichewa'), ('zh', 'Chinese'), ('cu', 'Church Slavic'), ('cv', 'Chuvash'), ('kw', 'Cornish'), ('co', 'Corsican'), ('cr', 'Cree'), ('hr', 'Croatian'), ('cs', 'Czech'), ('da', 'Danish'), ('dv', 'Divehi'), ('nl', 'Dutch'), ('dz', 'Dzongkha'), ('en', 'English'), ('eo', 'Esperanto'), ('et', 'Estonian'), ('ee', 'Ewe'), ('fo', 'Faroese'), ('fj', 'Fijian'), ('fi', 'Finnish'), ('fr', 'French'), ('ff', 'Fulah'), ('gl', 'Galician'), ('lg', 'Ganda'), ('ka', 'Georgian'), ('de', 'German'), ('gn', 'Guarani'), ('gu', 'Gujarati'), ('ht', 'Haitian'), ('ha', 'Hausa'), ('he', 'Hebrew'), ('hz', 'Herero'), ('hi', 'Hindi'), ('ho', 'Hiri Motu'), ('hu', 'Hungarian'), ('is', 'Icelandic'), ('io', 'Ido'), ('ig', 'Igbo'), ('id', 'Indonesian'), ('ia', 'Interlingua (International Auxiliary Language Association)'), ('ie', 'Interlingue'), ('iu', 'Inuktitut'), ('ik', 'Inupiaq'), ('ga', 'Irish'), ('it', 'Italian'), ('ja', 'Japanese'), ('jv', 'Javanese'), ('kl', 'Kalaallisut'), ('kn', 'Kannada'), ('kr', 'Kanuri'), ('ks', 'Kashmiri'), ('kk', 'Kazakh'), ('km', 'Khmer'), ('ki', 'Kikuyu'), ('rw', 'Kinyarwanda'), ('ky', 'Kirghiz'), ('kv', 'Komi'), ('kg', 'Kongo'), ('ko', 'Korean'), ('kj', 'Kuanyama'), ('ku', 'Kurdish'), ('lo', 'Lao'), ('la', 'Latin'), ('lv', 'Latvian'), ('li', 'Limburgan'), ('ln', 'Lingala'), ('lt', 'Lithuanian'), ('lu', 'Luba-Katanga'), ('lb', 'Luxembourgish'), ('mk', 'Macedonian'), ('mg', 'Malagasy'), ('ms', 'Malay (macrolanguage)'), ('ml', 'Malayalam'), ('mt', 'Maltese'), ('gv', 'Manx'), ('mi', 'Maori'), ('mr', 'Marathi'), ('mh', 'Marshallese'), ('el', 'Modern Greek (1453-)'), ('mn', 'Mongolian'), ('na', 'Nauru'), ('nv', 'Navajo'), ('ng', 'Ndonga'), ('ne', 'Nepali (macrolanguage)'), ('nd', 'North Ndebele'), ('se', 'Northern Sami'), ('no', 'Norwegian'), ('nb', 'Norwegian Bokmål'), ('nn', 'Norwegian Nynorsk'), ('oc', 'Occitan (post 1500)'), ('oj', 'Ojibwa'), ('or', 'Oriya (macrolanguage)'), ('om', 'Oromo'), ('os', 'Ossetian'), ('pi', 'Pali'), ('pa', 'Panjabi'), ('fa', 'Persian'), ('pl', 'Polish'), ('pt', 'Portuguese'), ('ps', 'Pushto'), ('qu', 'Quechua'), ('ro', 'Romanian'), ('rm', 'Romansh'), ('rn', 'Rundi'), ('ru', 'Russian'), ('sm', 'Samoan'), ('sg', 'Sango'), ('sa', 'Sanskrit'), ('sc', 'Sardinian'), ('gd', 'Scottish Gaelic'), ('sr', 'Serbian'), ('sh', 'Serbo-Croatian'), ('sn', 'Shona'), ('ii', 'Sichuan Yi'), ('sd', 'Sindhi'), ('si', 'Sinhala'), ('sk', 'Slovak'), ('sl', 'Slovenian'), ('so', 'Somali'), ('nr', 'South Ndebele'), ('st', 'Southern Sotho'), ('es', 'Spanish'), ('su', 'Sundanese'), ('sw', 'Swahili (macrolanguage)'), ('ss', 'Swati'), ('sv', 'Swedish'), ('tl', 'Tagalog'), ('ty', 'Tahitian'), ('tg', 'Tajik'), ('ta', 'Tamil'), ('tt', 'Tatar'), ('te', 'Telugu'), ('th', 'Thai'), ('bo', 'Tibetan'), ('ti', 'Tigrinya'), ('to', 'Tonga (Tonga Islands)'), ('ts', 'Tsonga'), ('tn', 'Tswana'), ('tr', 'Turkish'), ('tk', 'Turkmen'), ('tw', 'Twi'), ('ug', 'Uighur'), ('uk', 'Ukrainian'), ('ur', 'Urdu'), ('uz', 'Uzbek'), ('ve', 'Venda'), ('vi', 'Vietnamese'), ('vo', 'Volapük'), ('wa', 'Walloon'), ('cy', 'Welsh'), ('fy', 'Western Frisian'), ('wo', 'Wolof'), ('xh', 'Xhosa'), ('yi', 'Yiddish'), ('yo', 'Yoruba'), ('za', 'Zhuang'), ('zu', 'Zulu')], max_length=2)),
+                ('quantite', models.SmallIntegerField(default=1)),
+                ('nbre_pages', models.SmallIntegerField()),
+                ('annee_publication', models.IntegerField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(1400), django.core.validators.MaxValueValidator(2026)])),
+                ('emplacement', models.CharField(blank=True, max_length=200, null=True)),
+                ('resume', models.TextField(blank=True, null=True)),
+                ('auteur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='books.auteur')),
+                ('categorie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='books.categorie')),
+                ('editeur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='books.editeur')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Emprunter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dateEmprunt', models.DateField()),
+                ('dateRetourPrevu', models.DateField()),
+                ('dateRetourEffectif', models.DateField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('active', 'En Cours'), ('late', 'En Retard'), ('returned', 'Retourné')], max_length=10)),
+                ('etat_livre', models.CharField(choices=[('neuf', 'Excellent - Comme neuf'), ('good', "Bon - Légère trace d'usage"), ('well', 'Acceptable - Quelques dégradations'), ('bad', 'Mauvais - Nécessite réparation'), ('damaged', 'Endommagé - Non utilisable')], max_length=50, null=True)),
+                ('observation', models.CharField(max_length=20, null=True)),
+                ('etudiant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='books.etudiant')),
+                ('livre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='books.livre')),
+            ],
+        ),
+    ]
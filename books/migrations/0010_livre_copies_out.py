@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:29
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def compter_emprunts_ouverts(apps, schema_editor):
+    # Même calcul que la commande reconcile_availability
+    Emprunter = apps.get_model("books", "Emprunter")
+    Livre = apps.get_model("books", "Livre")
+    emprunts_ouverts = Subquery(
+        Emprunter.objects.using(schema_editor.connection.alias)
+        .filter(livre=OuterRef("pk"), status__in=("active", "late"))
+        .order_by()
+        .values("livre")
+        .annotate(total=Count("id"))
+        .values("total"),
+        output_field=IntegerField(),
+    )
+    Livre.objects.using(schema_editor.connection.alias).update(copies_out=Coalesce(emprunts_ouverts, 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0001_squashed_0009_auteur_datenaiss'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='livre',
+            name='copies_out',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(compter_emprunts_ouverts, migrations.RunPython.noop),
+    ]
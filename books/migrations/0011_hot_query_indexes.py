@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0010_livre_copies_out'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['timestamp'], name='activity_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['action_type', 'timestamp'], name='activity_action_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emprunter',
+            index=models.Index(fields=['livre', 'status'], name='emprunt_livre_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emprunter',
+            index=models.Index(fields=['etudiant', 'status'], name='emprunt_etud_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emprunter',
+            index=models.Index(fields=['status', 'dateRetourPrevu', 'dateRetourEffectif'], name='emprunt_status_dates_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emprunter',
+            index=models.Index(fields=['dateEmprunt'], name='emprunt_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emprunter',
+            index=models.Index(condition=models.Q(('dateRetourEffectif__isnull', True)), fields=['dateRetourPrevu'], name='emprunt_non_rendu_idx'),
+        ),
+    ]
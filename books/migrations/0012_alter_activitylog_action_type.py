@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0011_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='activitylog',
+            name='action_type',
+            field=models.CharField(choices=[('loan', 'Emprunt'), ('return', 'Retour'), ('add_book', 'Ajout livre'), ('add_user', 'Ajout utilisateur'), ('update', 'Modification'), ('delete', 'Suppression'), ('overdue', 'Passage en retard')], max_length=20),
+        ),
+    ]
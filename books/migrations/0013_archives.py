@@ -0,0 +1,63 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0012_alter_activitylog_action_type'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityLogArchive',
+            fields=[
+                ('action_type', models.CharField(choices=[('loan', 'Emprunt'), ('return', 'Retour'), ('add_book', 'Ajout livre'), ('add_user', 'Ajout utilisateur'), ('update', 'Modification'), ('delete', 'Suppression'), ('overdue', 'Passage en retard')], max_length=20)),
+                ('title', models.CharField(max_length=150)),
+                ('description', models.TextField()),
+                ('user', models.CharField(blank=True, max_length=150, null=True)),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('timestamp', models.DateTimeField()),
+                ('performed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['timestamp'], name='activity_archive_ts_idx'),
+                    models.Index(fields=['action_type', 'timestamp'], name='activity_archive_action_idx'),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchiveRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table', models.CharField(max_length=50)),
+                ('before', models.DateField()),
+                ('moved', models.PositiveIntegerField(default=0)),
+                ('finished_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EmprunterArchive',
+            fields=[
+                ('dateEmprunt', models.DateField()),
+                ('dateRetourPrevu', models.DateField()),
+                ('dateRetourEffectif', models.DateField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('active', 'En Cours'), ('late', 'En Retard'), ('returned', 'Retourné')], max_length=10)),
+                ('etat_livre', models.CharField(choices=[('neuf', 'Excellent - Comme neuf'), ('good', "Bon - Légère trace d'usage"), ('well', 'Acceptable - Quelques dégradations'), ('bad', 'Mauvais - Nécessite réparation'), ('damaged', 'Endommagé - Non utilisable')], max_length=50, null=True)),
+                ('observation', models.CharField(max_length=20, null=True)),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('etudiant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='books.etudiant')),
+                ('livre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='books.livre')),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['dateEmprunt'], name='emprunt_archive_date_idx'),
+                ],
+            },
+        ),
+    ]
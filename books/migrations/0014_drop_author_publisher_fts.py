@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:12
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Les index FTS5 des auteurs et des éditeurs (créés hors migrations par
+    books.signals.create_search_index) ne servent plus : l'autocomplétion
+    passe par books.autocomplete. books_livre_fts est conservée.
+    """
+
+    dependencies = [
+        ('books', '0013_archives'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            [
+                "DROP TABLE IF EXISTS books_auteur_fts",
+                "DROP TABLE IF EXISTS books_editeur_fts",
+            ],
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -2,6 +2,8 @@ import pycountry
 import datetime
 
 from django.db import models
+from django.db.models import Exists, OuterRef
+from django.db.models.functions import Coalesce
 from django.utils.text import slugify
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.validators import RegexValidator
@@ -48,6 +50,9 @@ STATUS_CHOICES = [
     ("returned","Retourné"),
 ]
 
+# Statuts pour lesquels l'exemplaire est encore chez l'étudiant
+OPEN_LOAN_STATUSES = ("active", "late")
+
 ETAT_LIVRE_CHOICES = [
     ("neuf","Excellent - Comme neuf"),
     ("good","Bon - Légère trace d'usage"),
@@ -61,6 +66,42 @@ class Ecole(models.Model):
     nom = models.CharField(max_length=50,null=False)
 
     
+class EtudiantQuerySet(models.QuerySet):
+
+    def avec_emprunts(self):
+        # Sous-requêtes corrélées (COUNT ... GROUP BY etudiant_id) : avec un tri
+        # par matricule et un LIMIT, elles ne sont évaluées que pour la page lue
+        def compte(model, **filters):
+            emprunts = (
+                model.objects.filter(etudiant=OuterRef("pk"), **filters)
+                .order_by().values("etudiant").annotate(n=models.Count("id")).values("n")
+            )
+            return Coalesce(models.Subquery(emprunts), 0)
+
+        return self.annotate(
+            nb_emprunts_actifs=compte(Emprunter, status="active"),
+            nb_emprunts_en_retard=compte(Emprunter, status="late"),
+            # Les emprunts archivés (rendus) comptent dans le total
+            nb_emprunts_total=compte(Emprunter) + compte(EmprunterArchive),
+        )
+
+    def filtre_emprunts(self, loans):
+        """
+        Filtre de la liste des étudiants (open, late ou none) par EXISTS, sans
+        les compteurs : le total de la pagination reste une requête légère.
+        """
+        def existe(*statuses):
+            return Exists(Emprunter.objects.filter(etudiant=OuterRef("pk"), status__in=statuses))
+
+        if loans == "open":
+            return self.filter(existe(*OPEN_LOAN_STATUSES))
+        if loans == "late":
+            return self.filter(existe("late"))
+        if loans == "none":
+            return self.filter(~existe(*OPEN_LOAN_STATUSES))
+        return self
+
+
 class Etudiant(models.Model):
     matricule = models.CharField(max_length=12,primary_key=True,unique=True)
     nom = models.CharField(max_length=50,null=False)
@@ -73,11 +114,14 @@ class Etudiant(models.Model):
     is_active = models.BooleanField(default=True)
     ecole = models.ForeignKey(Ecole,on_delete=models.CASCADE)
 
+    objects = EtudiantQuerySet.as_manager()
+
     def active_loans(self):
-        emprunts = Emprunter.objects.filter(etudiant=self).count()
+        # Emprunts non rendus (pour une liste, préférer Etudiant.objects.avec_emprunts())
+        emprunts = Emprunter.objects.filter(etudiant=self, status__in=OPEN_LOAN_STATUSES).count()
 
         return emprunts
-    
+
     def __str__(self):
         return f"{self.nom} {self.prenoms} - {self.numChambre} - {self.matricule}"
 
@@ -88,6 +132,18 @@ class Auteur(models.Model):
 class Editeur(models.Model):
     nom = models.CharField(max_length=200,null=False)
 
+class CategorieQuerySet(models.QuerySet):
+
+    def avec_statistiques(self):
+        # Un seul GROUP BY sur la jointure catégorie / livres :
+        # emprunts en cours = somme du compteur copies_out (« active » + « late »)
+        return self.annotate(
+            nb_livres=models.Count("livre"),
+            nb_exemplaires=Coalesce(models.Sum("livre__quantite"), 0),
+            nb_empruntes=Coalesce(models.Sum("livre__copies_out"), 0),
+        )
+
+
 class Categorie(models.Model):
     nom = models.CharField(max_length=40,null=False)
     description = models.TextField()
@@ -104,11 +160,25 @@ class Categorie(models.Model):
 
     def __str__(self):
         return self.nom
-    
+
+    objects = CategorieQuerySet.as_manager()
+
     # ✅ Méthode pour récupérer les livres de cette catégorie
+    # (pour une liste, préférer Categorie.objects.avec_statistiques())
     def livres(self):
         return self.livre_set.count()
 
+class LivreQuerySet(models.QuerySet):
+
+    def avec_disponibilite(self):
+        # Exemplaires disponibles calculés en SQL (quantite - copies_out)
+        return self.annotate(disponible=models.F("quantite") - models.F("copies_out"))
+
+    def disponibles(self):
+        # QuerySet paresseux : reste chaînable (select_related, slicing, Paginator)
+        return self.avec_disponibilite().filter(disponible__gt=0)
+
+
 class Livre(models.Model):
     isbn = models.CharField(max_length=10, null=False)
     titre = models.CharField(max_length=100, null=False)
@@ -128,33 +198,19 @@ class Livre(models.Model):
     editeur = models.ForeignKey(Editeur,on_delete=models.CASCADE)
     auteur = models.ForeignKey(Auteur,on_delete=models.CASCADE)
     categorie = models.ForeignKey(Categorie,on_delete=models.CASCADE)
+    # Compteur dénormalisé des exemplaires empruntés (emprunts « active » / « late »).
+    # Mis à jour par F() à chaque emprunt, retour ou suppression d'emprunt,
+    # recalculé par la commande « reconcile_availability ».
+    copies_out = models.PositiveIntegerField(default=0, db_index=True)
 
     def is_available(self):
-        emprunts = Emprunter.objects.filter(
-            livre=self,
-            status="active"
-        ).count()
-
-        return (self.quantite - emprunts) > 0
+        return self.available_quantity() > 0
     
     def available_quantity(self):
-        emprunts = Emprunter.objects.filter(
-            livre=self,
-            status="active"
-        ).count()
+        return self.quantite - self.copies_out
 
-        return self.quantite - emprunts
+    objects = LivreQuerySet.as_manager()
 
-    @classmethod
-    def disponibles(cls):
-        livres_disponibles = []
-
-        for livre in cls.objects.all():
-            if livre.is_available():
-                livres_disponibles.append(livre)
-
-        return livres_disponibles
-    
     def __str__(self):
         return f"{self.isbn} - {self.titre} - {self.quantite} - {self.emplacement}"
 
@@ -162,7 +218,30 @@ class Filiere(models.Model):
     nom = models.CharField(max_length=50,null=False)
     domaine = models.CharField(max_length=150,null=False)
 
-class Emprunter(models.Model):
+class EmprunterQuerySet(models.QuerySet):
+
+    def ouverts(self, today=None):
+        # Emprunts non rendus, avec l'équivalent SQL de is_overdue() (« en_retard »)
+        today = today or timezone.now().date()
+        return self.filter(status__in=OPEN_LOAN_STATUSES).annotate(
+            en_retard=models.ExpressionWrapper(
+                models.Q(status="late") | models.Q(dateRetourPrevu__lt=today),
+                output_field=models.BooleanField(),
+            )
+        )
+
+    def a_passer_en_retard(self, today=None):
+        # Emprunts encore « active » dont la date de retour prévue est dépassée
+        today = today or timezone.now().date()
+        return self.filter(
+            status="active",
+            dateRetourEffectif__isnull=True,
+            dateRetourPrevu__lt=today,
+        )
+
+
+# Champs et méthodes communs à Emprunter et à son archive (EmprunterArchive)
+class EmprunterBase(models.Model):
     dateEmprunt = models.DateField()
     dateRetourPrevu = models.DateField()
     dateRetourEffectif = models.DateField(null=True,blank=True)
@@ -172,6 +251,11 @@ class Emprunter(models.Model):
     etat_livre = models.CharField(max_length=50, null=True, choices=ETAT_LIVRE_CHOICES)
     observation =  models.CharField(max_length=20, null=True)
 
+    is_archived = False
+
+    class Meta:
+        abstract = True
+
     def is_overdue(self):
         today = timezone.now().date()
 
@@ -188,9 +272,45 @@ class Emprunter(models.Model):
     
     def __str__(self):
         return f"Emprunt n°{self.id} | {self.etudiant.nom} {self.livre.titre}"
-    
 
-class ActivityLog(models.Model):
+
+class Emprunter(EmprunterBase):
+    objects = EmprunterQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Disponibilité d'un livre / recalcul de copies_out
+            models.Index(fields=["livre", "status"], name="emprunt_livre_status_idx"),
+            # Emprunts d'un étudiant par statut (liste des étudiants)
+            models.Index(fields=["etudiant", "status"], name="emprunt_etud_status_idx"),
+            # Compteurs du tableau de bord : index couvrant, pas de lecture de la table
+            models.Index(fields=["status", "dateRetourPrevu", "dateRetourEffectif"], name="emprunt_status_dates_idx"),
+            # Tri de la liste des emprunts et courbe des 7 derniers jours
+            models.Index(fields=["dateEmprunt"], name="emprunt_date_idx"),
+            # Filtres « en cours » / « en retard » de loans_list : index partiel
+            # limité aux emprunts non rendus (IS NULL est écrit en clair dans
+            # la requête, SQLite peut donc utiliser l'index partiel)
+            models.Index(
+                fields=["dateRetourPrevu"],
+                condition=models.Q(dateRetourEffectif__isnull=True),
+                name="emprunt_non_rendu_idx",
+            ),
+        ]
+
+
+class EmprunterArchive(EmprunterBase):
+    """Emprunts rendus déplacés par la commande « archive » (même id qu'à l'origine)."""
+    id = models.BigIntegerField(primary_key=True)
+
+    is_archived = True
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["dateEmprunt"], name="emprunt_archive_date_idx"),
+        ]
+
+
+class ActivityLogBase(models.Model):
     ACTION_CHOICES = [
         ("loan", "Emprunt"),
         ("return", "Retour"),
@@ -198,6 +318,7 @@ class ActivityLog(models.Model):
         ("add_user", "Ajout utilisateur"),
         ("update", "Modification"),
         ("delete", "Suppression"),
+        ("overdue", "Passage en retard"),
     ]
 
     action_type = models.CharField(max_length=20, choices=ACTION_CHOICES)
@@ -211,6 +332,9 @@ class ActivityLog(models.Model):
 
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        abstract = True
+
     def icon(self):
         return {
             "loan": "arrow-right",
@@ -219,8 +343,51 @@ class ActivityLog(models.Model):
             "add_user": "user-plus",
             "update": "edit",
             "delete": "trash",
+            "overdue": "exclamation-triangle",
         }.get(self.action_type, "info-circle")
 
     def __str__(self):
         return f"{self.action_type} - {self.title}"
 
+
+class ActivityLog(ActivityLogBase):
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["timestamp"], name="activity_timestamp_idx"),
+            models.Index(fields=["action_type", "timestamp"], name="activity_action_ts_idx"),
+        ]
+
+
+class ActivityLogArchive(ActivityLogBase):
+    """Entrées anciennes du journal déplacées par la commande « archive »."""
+    id = models.BigIntegerField(primary_key=True)
+    # Horodatage d'origine conservé (pas de auto_now_add)
+    timestamp = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["timestamp"], name="activity_archive_ts_idx"),
+            models.Index(fields=["action_type", "timestamp"], name="activity_archive_action_idx"),
+        ]
+
+
+class ArchiveRun(models.Model):
+    """
+    Passage de la commande « archive » : toutes les lignes archivées d'une
+    table sont antérieures à « before ». Les listes s'en servent pour ne
+    lire l'archive que lorsque la période demandée la recouvre.
+    """
+    table = models.CharField(max_length=50)
+    before = models.DateField()
+    moved = models.PositiveIntegerField(default=0)
+    finished_at = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def archived_before(cls, model):
+        """Date limite la plus récente des archives de model, None si rien n'a été archivé."""
+        return (
+            cls.objects.filter(table=model._meta.db_table, moved__gt=0)
+            .aggregate(before=models.Max("before"))["before"]
+        )
+
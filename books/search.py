@@ -0,0 +1,183 @@
+"""
+Index de recherche plein texte (SQLite FTS5) du catalogue.
+
+La table virtuelle books_livre_fts (rowid = Livre.id ; titre, isbn, auteur,
+editeur) est tenue à jour par les signaux de books.signals et par les
+imports en masse. L'autocomplétion des auteurs et des éditeurs n'en dépend
+pas (books.autocomplete).
+
+Le tokenizer unicode61 + remove_diacritics rend la recherche insensible aux
+accents (« eleve » trouve « Élève ») et l'option prefix accélère les
+recherches par préfixe. Hors SQLite (ou tant que l'index n'est pas créé),
+search_livres retombe sur les anciens filtres icontains.
+"""
+import re
+
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Livre
+
+TOKENIZE = "unicode61 remove_diacritics 2"
+
+FTS_TABLES = {
+    "books_livre_fts": ("titre", "isbn", "auteur", "editeur"),
+}
+
+# Contenu de chaque table : (colonnes, sources), rowid en premier
+FTS_SOURCES = {
+    "books_livre_fts": (
+        "l.id, l.titre, l.isbn, a.nom_complet, e.nom",
+        "books_livre l "
+        "JOIN books_auteur a ON a.id = l.auteur_id "
+        "JOIN books_editeur e ON e.id = l.editeur_id",
+    ),
+}
+
+# Nombre d'identifiants par requête lors des mises à jour groupées
+INDEX_BATCH_SIZE = 500
+
+_ready = set()
+
+
+def _alias(model):
+    return router.db_for_write(model)
+
+
+def fts_ready(using="default"):
+    """L'index existe-t-il sur cette base ? (mémorisé une fois trouvé)"""
+    if using in _ready:
+        return True
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN ({', '.join(['%s'] * len(FTS_TABLES))})",
+            list(FTS_TABLES),
+        )
+        if cursor.fetchone()[0] == len(FTS_TABLES):
+            _ready.add(using)
+            return True
+    return False
+
+
+def create_index(using="default"):
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        for table, columns in FTS_TABLES.items():
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+                f"{', '.join(columns)}, tokenize='{TOKENIZE}', prefix='2 3 4')"
+            )
+    return True
+
+
+def _target(table):
+    return f"{table}(rowid, {', '.join(FTS_TABLES[table])})"
+
+
+def rebuild_index(using="default"):
+    """Vide et reconstruit entièrement l'index."""
+    create_index(using)
+    with connections[using].cursor() as cursor:
+        for table, (columns, source) in FTS_SOURCES.items():
+            cursor.execute(f"DELETE FROM {table}")
+            cursor.execute(f"INSERT INTO {_target(table)} SELECT {columns} FROM {source}")
+
+
+def _reindex(table, column, pks, using):
+    """Réécrit les lignes de l'index dont la source vérifie column IN pks."""
+    columns, source = FTS_SOURCES[table]
+    key = columns.split(",")[0]
+    pks = list(pks)
+    with connections[using].cursor() as cursor:
+        for i in range(0, len(pks), INDEX_BATCH_SIZE):
+            chunk = pks[i:i + INDEX_BATCH_SIZE]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            if column == key:
+                cursor.execute(f"DELETE FROM {table} WHERE rowid IN ({placeholders})", chunk)
+            else:
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE rowid IN "
+                    f"(SELECT {key} FROM {source} WHERE {column} IN ({placeholders}))",
+                    chunk,
+                )
+            cursor.execute(
+                f"INSERT INTO {_target(table)} SELECT {columns} FROM {source} WHERE {column} IN ({placeholders})",
+                chunk,
+            )
+
+
+def index_livres(pks, using=None):
+    using = using or _alias(Livre)
+    if fts_ready(using):
+        _reindex("books_livre_fts", "l.id", pks, using)
+
+
+def index_auteurs(pks, using=None):
+    """Réindexe les livres de ces auteurs (le nom de l'auteur est indexé avec ses livres)."""
+    using = using or _alias(Livre)
+    if fts_ready(using):
+        _reindex("books_livre_fts", "l.auteur_id", pks, using)
+
+
+def index_editeurs(pks, using=None):
+    using = using or _alias(Livre)
+    if fts_ready(using):
+        _reindex("books_livre_fts", "l.editeur_id", pks, using)
+
+
+def unindex(table, pk, using="default"):
+    if fts_ready(using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {table} WHERE rowid = %s", [pk])
+
+
+def unindex_livres(livres):
+    """Retire de l'index les livres du queryset livres, en une requête."""
+    if fts_ready(livres.db):
+        sql, params = livres.values("pk").query.sql_with_params()
+        with connections[livres.db].cursor() as cursor:
+            cursor.execute(f"DELETE FROM books_livre_fts WHERE rowid IN ({sql})", params)
+
+
+def match_expression(query):
+    """
+    Transforme la saisie utilisateur en requête FTS5 sûre : chaque mot est
+    cité (pas d'opérateurs injectés) et recherché par préfixe.
+    """
+    words = re.findall(r"\w+", query)
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def _fts(queryset, table, query):
+    """Filtre et annote search_rank (bm25, plus petit = plus pertinent)."""
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    pk = f"{queryset.model._meta.db_table}.{queryset.model._meta.pk.column}"
+    return queryset.annotate(
+        search_rank=RawSQL(
+            f"SELECT bm25({table}) FROM {table} WHERE {table} MATCH %s AND rowid = {pk}",
+            (expression,),
+        )
+    ).filter(pk__in=RawSQL(
+        f"SELECT rowid FROM {table} WHERE {table} MATCH %s",
+        (expression,),
+    ))
+
+
+def search_livres(queryset, query):
+    if fts_ready(queryset.db):
+        return _fts(queryset, "books_livre_fts", query)
+    return queryset.filter(
+        Q(titre__icontains=query) |
+        Q(isbn__icontains=query) |
+        Q(auteur__nom_complet__icontains=query) |
+        Q(editeur__nom__icontains=query)
+    )
+
@@ -0,0 +1,75 @@
+from django.db import connections
+from django.db.models import F
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import fragments, search
+from .models import Auteur, Categorie, Editeur, Emprunter, Etudiant, Livre, OPEN_LOAN_STATUSES
+
+
+# --- Compteur Livre.copies_out ---
+
+@receiver(pre_delete, sender=Emprunter)
+def release_copy(sender, instance, using, **kwargs):
+    # Suppression d'un emprunt ouvert, directe ou en cascade (étudiant, livre, catégorie)
+    if instance.status in OPEN_LOAN_STATUSES:
+        Livre.objects.using(using).filter(pk=instance.livre_id, copies_out__gt=0).update(
+            copies_out=F("copies_out") - 1
+        )
+
+
+# --- Index de recherche plein texte ---
+
+@receiver(post_migrate)
+def create_search_index(sender, using="default", **kwargs):
+    if sender.name != "books":
+        return
+    connection = connections[using]
+    if connection.vendor != "sqlite" or Livre._meta.db_table not in connection.introspection.table_names():
+        return
+    # Première création : l'index est rempli à partir des tables existantes
+    if not search.fts_ready(using):
+        search.rebuild_index(using)
+
+
+@receiver(post_save, sender=Livre)
+def index_livre(sender, instance, using, **kwargs):
+    search.index_livres([instance.pk], using=using)
+
+
+# Les noms d'auteur et d'éditeur sont indexés avec les livres
+@receiver(post_save, sender=Auteur)
+def index_auteur(sender, instance, created, using, **kwargs):
+    if not created:
+        search.index_auteurs([instance.pk], using=using)
+
+
+@receiver(post_save, sender=Editeur)
+def index_editeur(sender, instance, created, using, **kwargs):
+    if not created:
+        search.index_editeurs([instance.pk], using=using)
+
+
+@receiver(post_delete, sender=Livre)
+def unindex_livre(sender, instance, using, **kwargs):
+    search.unindex("books_livre_fts", instance.pk, using=using)
+
+
+# --- Fragments de gabarits en cache et index d'autocomplétion ---
+# (books.autocomplete reconstruit ses index quand la version d'Auteur ou d'Editeur change)
+
+@receiver(post_save, sender=Livre)
+@receiver(post_delete, sender=Livre)
+@receiver(post_save, sender=Emprunter)
+@receiver(post_delete, sender=Emprunter)
+@receiver(post_save, sender=Categorie)
+@receiver(post_delete, sender=Categorie)
+@receiver(post_save, sender=Etudiant)
+@receiver(post_delete, sender=Etudiant)
+@receiver(post_save, sender=Auteur)
+@receiver(post_delete, sender=Auteur)
+@receiver(post_save, sender=Editeur)
+@receiver(post_delete, sender=Editeur)
+def invalidate_fragments(sender, using, **kwargs):
+    # Après le commit : avant, une autre requête remettrait l'ancien rendu en cache
+    fragments.invalidate_on_commit(sender, using=using)
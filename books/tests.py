@@ -1,3 +1,356 @@
-from django.test import TestCase
+import datetime
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import activity, archive, autocomplete, cascade, fragments, search
+from .models import (
+    ActivityLog, ActivityLogArchive, ArchiveRun, Auteur, Categorie, Ecole, Editeur, Emprunter, EmprunterArchive,
+    Etudiant, Livre,
+)
+
+# Cache en mémoire (pas de fichiers dans BASE_DIR/cache), journal écrit tout de suite
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tests"}}
+test_settings = override_settings(CACHES=LOCMEM_CACHE, ACTIVITY_LOG_ASYNC=False)
+
+
+class Catalogue:
+    """Petit jeu de données commun aux tests de books et de app (setUpTestData)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = timezone.now().date()
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "admin")
+        cls.ecole = Ecole.objects.create(nom="ESATIC")
+        cls.auteur = Auteur.objects.create(nom_complet="Aimé Césaire")
+        cls.editeur = Editeur.objects.create(nom="Présence Africaine")
+        cls.categorie = Categorie.objects.create(
+            nom="Poésie", description="Poèmes", icone="feather-alt", couleur="#123456"
+        )
+        cls.livres = [
+            cls.creer_livre(f"{i:010d}", f"Cahier d'un retour {i}", quantite=2)
+            for i in range(3)
+        ]
+        cls.etudiants = [
+            Etudiant.objects.create(
+                matricule=f"M{i:04d}", nom=f"Nom{i}", prenoms="Prénom", dateNaiss="2000-01-01",
+                telephone="0102030405", emailPers=f"p{i}@example.com", emailInst=f"i{i}@example.com",
+                numChambre="A1", ecole=cls.ecole,
+            )
+            for i in range(3)
+        ]
+        ActivityLog.objects.create(action_type="loan", title="Emprunt", description="-", user="admin")
+
+    @classmethod
+    def creer_livre(cls, isbn, titre, quantite=1, categorie=None):
+        return Livre.objects.create(
+            isbn=isbn, titre=titre, langue="fr", quantite=quantite, nbre_pages=100,
+            editeur=cls.editeur, auteur=cls.auteur, categorie=categorie or cls.categorie,
+        )
+
+    def emprunter(self, livre, etudiant, days_ago=0, status="active", **fields):
+        """Emprunt créé directement en base (sans passer par la vue)."""
+        date = self.today - datetime.timedelta(days=days_ago)
+        return Emprunter.objects.create(
+            livre=livre, etudiant=etudiant, status=status, dateEmprunt=date,
+            dateRetourPrevu=date + datetime.timedelta(days=7), **fields,
+        )
+
+
+@test_settings
+class CopiesOutTests(Catalogue, TestCase):
+    """Livre.copies_out suit les suppressions d'emprunts, y compris en cascade."""
+
+    def setUp(self):
+        self.livre = self.livres[0]
+        self.emprunter(self.livre, self.etudiants[0])
+        self.emprunter(self.livre, self.etudiants[1], days_ago=10, status="late")
+        self.emprunter(self.livre, self.etudiants[1], days_ago=20, status="returned", dateRetourEffectif=self.today)
+        Livre.objects.filter(pk=self.livre.pk).update(copies_out=2)
+
+    def copies_out(self):
+        return Livre.objects.get(pk=self.livre.pk).copies_out
+
+    def test_delete_open_loan(self):
+        Emprunter.objects.get(etudiant=self.etudiants[0]).delete()
+        self.assertEqual(self.copies_out(), 1)
+
+    def test_delete_returned_loan(self):
+        Emprunter.objects.get(status="returned").delete()
+        self.assertEqual(self.copies_out(), 2)
+
+    def test_cascade_from_student(self):
+        # Un emprunt en retard et un emprunt rendu : seul le premier libère un exemplaire
+        self.etudiants[1].delete()
+        self.assertEqual(self.copies_out(), 1)
+
+    def test_queryset_delete(self):
+        Emprunter.objects.filter(livre=self.livre).delete()
+        self.assertEqual(self.copies_out(), 0)
+
+
+@test_settings
+class CategorieDeleteTests(Catalogue, TestCase):
+    """cascade.delete_categorie : une requête par table, quel que soit le nombre de livres."""
+
+    def setUp(self):
+        self.autre = Categorie.objects.create(nom="Roman", description="-", icone="book", couleur="#654321")
+        self.garde = self.creer_livre("9999999999", "Cahier conservé", categorie=self.autre)
+        self.emprunter(self.garde, self.etudiants[0])
+        Livre.objects.filter(pk=self.garde.pk).update(copies_out=1)
+        for livre in self.livres:
+            self.emprunter(livre, self.etudiants[0])
+            self.emprunter(livre, self.etudiants[1], days_ago=20, status="returned", dateRetourEffectif=self.today)
+        EmprunterArchive.objects.create(
+            id=10_000, livre=self.livres[0], etudiant=self.etudiants[0], status="returned",
+            dateEmprunt=self.today, dateRetourPrevu=self.today, dateRetourEffectif=self.today,
+        )
+
+    def test_cascade(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            before = fragments.version(Livre, Emprunter)
+            cascade.delete_categorie(self.categorie)
+        self.assertFalse(Categorie.objects.filter(pk=self.categorie.pk).exists())
+        self.assertEqual(list(Livre.objects.all()), [self.garde])
+        self.assertEqual(list(Emprunter.objects.values_list("livre", flat=True)), [self.garde.pk])
+        self.assertFalse(EmprunterArchive.objects.exists())
+        self.assertEqual(Livre.objects.get().copies_out, 1)
+        self.assertEqual(list(search.search_livres(Livre.objects.all(), "cahier")), [self.garde])
+        self.assertEqual(search.search_livres(Livre.objects.filter(pk__in=[l.pk for l in self.livres]), "retour").count(), 0)
+        self.assertNotEqual(fragments.version(Livre, Emprunter), before)
+
+    def test_queries_independent_of_size(self):
+        search.fts_ready()
+        with self.assertNumQueries(8):
+            cascade.delete_categorie(self.autre)
+        with self.assertNumQueries(8):
+            cascade.delete_categorie(self.categorie)
+
+
+@test_settings
+class SearchIndexTests(Catalogue, TestCase):
+
+    def titres(self, query):
+        return sorted(search.search_livres(Livre.objects.all(), query).values_list("titre", flat=True))
+
+    def test_author_rename_reindexes_books(self):
+        self.auteur.nom_complet = "Léopold Sédar Senghor"
+        self.auteur.save()
+        self.assertEqual(len(self.titres("senghor")), len(self.livres))
+        self.assertEqual(self.titres("cesaire"), [])
+
+    def test_publisher_rename_reindexes_books(self):
+        self.editeur.nom = "Gallimard"
+        self.editeur.save()
+        self.assertEqual(len(self.titres("gallim")), len(self.livres))
+
+
+    def test_match_expression_quotes_each_word(self):
+        self.assertEqual(search.match_expression("Cahier d'un"), '"Cahier"* "d"* "un"*')
+        # Opérateurs et syntaxe FTS5 traités comme des mots ordinaires
+        self.assertEqual(search.match_expression('retour OR NEAR("x" -y)'), '"retour"* "OR"* "NEAR"* "x"* "y"*')
+        self.assertEqual(search.match_expression("Élève"), '"Élève"*')
+        self.assertEqual(search.match_expression(' "*-() '), "")
+
+    def test_fts_syntax_in_query(self):
+        self.assertEqual(self.titres('cahier" (retour*'), sorted(l.titre for l in self.livres))
+        self.assertEqual(self.titres("()"), [])
+
+
+@override_settings(ACTIVITY_LOG_ASYNC=True)
+class ActivityWriterTests(Catalogue, TestCase):
+    """Journal asynchrone : mis en file au commit, écrit par lots, vidé à l'arrêt du processus."""
+
+    def setUp(self):
+        # Pas de vrai thread : les écritures sont déclenchées par le test
+        self.writer = activity.ActivityWriter(batch_size=3)
+        for patcher in (
+            mock.patch.object(activity, "writer", self.writer),
+            mock.patch.object(activity.threading, "Thread"),
+            mock.patch.object(activity.atexit, "register"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def log(self, n=1):
+        for i in range(n):
+            activity.log(action_type="loan", title=f"Emprunt {i}", description="-", user="admin")
+
+    def titles(self):
+        return set(ActivityLog.objects.filter(title__startswith="Emprunt ").values_list("title", flat=True))
+
+    def test_queued_on_commit_only(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.log()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            self.assertEqual(self.writer.pending, [])
+            self.log(2)
+            self.assertEqual(self.writer.pending, [])
+        self.assertEqual(len(self.writer.pending), 2)
+        self.assertEqual(self.titles(), set())
+
+    def test_batch(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.log(2)
+        self.assertFalse(self.writer.wakeup.is_set())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.log(1)
+        # File pleine : le thread est réveillé sans attendre ACTIVITY_LOG_FLUSH_MS
+        self.assertTrue(self.writer.wakeup.is_set())
+        with self.assertNumQueries(1):
+            self.assertEqual(self.writer.flush(), 3)
+        self.assertEqual(ActivityLog.objects.filter(title__startswith="Emprunt ").count(), 3)
+
+    def test_drained_at_exit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.log(2)
+        activity.threading.Thread.return_value.start.assert_called_once()
+        activity.atexit.register.assert_called_once_with(self.writer.flush)
+        # Arrêt du processus avant le prochain passage du thread
+        activity.atexit.register.call_args.args[0]()
+        self.assertEqual(self.titles(), {"Emprunt 0", "Emprunt 1"})
+        self.assertEqual(self.writer.pending, [])
+
+    def test_failed_write_is_logged(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.log()
+        with mock.patch.object(ActivityLog.objects, "bulk_create", side_effect=RuntimeError), \
+                self.assertLogs("books.activity", "ERROR"):
+            self.assertEqual(self.writer.flush(), 0)
+
+
+@test_settings
+class ArchiveTests(Catalogue, TestCase):
+    """La commande « archive » déplace les lignes froides sans en perdre ni en dupliquer."""
+
+    def setUp(self):
+        self.before = self.today - datetime.timedelta(days=30)
+        livre, etudiant = self.livres[0], self.etudiants[0]
+        self.anciens = [
+            self.emprunter(livre, etudiant, days_ago=40 + i, status="returned", dateRetourEffectif=self.today)
+            for i in range(5)
+        ]
+        # Restent en place : emprunt ancien mais ouvert, emprunt rendu récent
+        self.ouvert = self.emprunter(livre, etudiant, days_ago=60, status="late")
+        self.recent = self.emprunter(livre, etudiant, days_ago=5, status="returned", dateRetourEffectif=self.today)
+        Livre.objects.filter(pk=livre.pk).update(copies_out=1)
+
+        self.vieux_log = ActivityLog.objects.create(action_type="return", title="Retour", description="-")
+        ActivityLog.objects.filter(pk=self.vieux_log.pk).update(timestamp=timezone.now() - datetime.timedelta(days=90))
+
+    def test_moves_cold_rows_in_batches(self):
+        result = archive.archive(self.before, batch_size=2)
+
+        self.assertEqual(result, {"books_activitylogarchive": 1, "books_emprunterarchive": 5})
+        self.assertEqual(
+            sorted(EmprunterArchive.objects.values_list("id", flat=True)), sorted(e.id for e in self.anciens)
+        )
+        self.assertEqual(
+            sorted(Emprunter.objects.values_list("id", flat=True)), sorted([self.ouvert.id, self.recent.id])
+        )
+        self.assertEqual(list(ActivityLogArchive.objects.values_list("id", flat=True)), [self.vieux_log.id])
+        self.assertFalse(ActivityLog.objects.filter(pk=self.vieux_log.pk).exists())
+        self.assertEqual(Livre.objects.get(pk=self.livres[0].pk).copies_out, 1)
+
+    def test_columns_copied(self):
+        archive.archive(self.before)
+        original = self.anciens[0]
+        copie = EmprunterArchive.objects.get(pk=original.pk)
+        for field in ("dateEmprunt", "dateRetourPrevu", "dateRetourEffectif", "etudiant_id", "livre_id", "status"):
+            self.assertEqual(getattr(copie, field), getattr(original, field), field)
+
+    def test_archive_run_bounds(self):
+        archive.archive(self.before)
+        self.assertEqual(ArchiveRun.archived_before(EmprunterArchive), self.before)
+        # Un second passage ne déplace rien et ne change pas la borne
+        self.assertEqual(archive.archive(self.before), {"books_activitylogarchive": 0, "books_emprunterarchive": 0})
+        self.assertEqual(ArchiveRun.objects.count(), 4)
+        self.assertEqual(ArchiveRun.archived_before(EmprunterArchive), self.before)
+
+    def test_failed_batch_is_rolled_back(self):
+        real_bulk_create = EmprunterArchive.objects.bulk_create
+        calls = []
+
+        def bulk_create(objs, *args, **kwargs):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError("interruption")
+            return real_bulk_create(objs, *args, **kwargs)
+
+        with mock.patch.object(EmprunterArchive.objects, "bulk_create", side_effect=bulk_create):
+            with self.assertRaises(RuntimeError):
+                archive.archive(self.before, batch_size=2)
+
+        # Premier lot validé, second annulé : chaque ligne est dans une seule table
+        self.assertEqual(EmprunterArchive.objects.count(), 2)
+        self.assertEqual(Emprunter.objects.filter(pk__in=[e.pk for e in self.anciens]).count(), 3)
+
+
+@test_settings
+class AutocompleteTests(Catalogue, TestCase):
+
+    def test_invalidation_reaches_other_processes(self):
+        # Deux index sur le même cache : l'index d'un autre processus
+        autre_processus = autocomplete.PrefixIndex(Auteur, autocomplete._load_auteurs)
+        self.assertEqual(autre_processus.search("sen"), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Auteur.objects.create(nom_complet="Léopold Sédar Senghor")
+
+        self.assertEqual([a["nom_complet"] for a in autre_processus.search("sen")], ["Léopold Sédar Senghor"])
+
+    def test_bulk_invalidate_after_commit(self):
+        autre_processus = autocomplete.PrefixIndex(Editeur, autocomplete._load_editeurs)
+        self.assertEqual(autre_processus.search("galli"), [])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            Editeur.objects.bulk_create([Editeur(nom="Gallimard")])
+            autocomplete.editeurs.invalidate()
+        # Pas encore validé : l'ancienne version est toujours servie
+        self.assertEqual(autre_processus.search("galli"), [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual([e["nom"] for e in autre_processus.search("galli")], ["Gallimard"])
+
+
+@test_settings
+class FragmentInvalidationTests(Catalogue, TestCase):
+
+    def test_one_cache_write_per_commit(self):
+        with mock.patch.object(fragments, "invalidate", wraps=fragments.invalidate) as invalidate:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                for livre in self.livres:
+                    livre.save()
+                for etudiant in self.etudiants:
+                    etudiant.delete()
+            self.assertEqual(len(callbacks), 1)
+            invalidate.assert_called_once()
+            self.assertEqual(set(invalidate.call_args.args), {Livre, Etudiant})
+
+    def test_next_transaction_registers_again(self):
+        versions = []
+        for _ in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.livres[0].save()
+            versions.append(fragments.version(Livre))
+        self.assertNotEqual(versions[0], versions[1])
+
+    def test_rolled_back_savepoint(self):
+        before = fragments.version(Livre)
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.livres[0].save()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            # Le rappel du point de sauvegarde annulé a disparu : un nouveau est enregistré
+            self.livres[1].save()
+        self.assertNotEqual(fragments.version(Livre), before)